@@ -0,0 +1,176 @@
+"""
+Android backend for wiping many phones at once.
+
+Every adb / fastboot call names its phone with `-s <serial>`, so any number
+of phones can be connected. `adb devices -l` enumerates them, and one
+`adb shell getprop` dump per phone replaces the per-property round trips.
+Fastboot erases run concurrently across phones but stay sequential on any
+one phone, because fastboot claims the USB interface exclusively. Waiting
+for phones to reappear in fastboot wakes on USB uevents from the hotplug
+watcher rather than polling once a second.
+
+Nothing here opens a dialog. Callers decide policy up front, such as
+whether a locked phone gets a recovery wipe.
+"""
+import asyncio
+import re
+from collections import namedtuple
+
+import cmdexec
+import hotplug
+
+ADB_TIMEOUT = 15
+FASTBOOT_WAIT = 300
+ERASE_TIMEOUT = 600
+# fallback re-check while waiting, in case a uevent was missed
+RECHECK = 5.0
+
+PROPS = {
+    'model': 'ro.product.model',
+    'manufacturer': 'ro.product.manufacturer',
+    'android_version': 'ro.build.version.release',
+    'bootloader_state': 'ro.boot.verifiedbootstate',
+    'device_name': 'ro.product.name',
+}
+# what `fastboot -w` clears. Only userdata is on every phone: A/B phones
+# have no cache, and metadata (the FBE key store) is newer than some phones.
+ERASE_PARTITIONS = ("userdata", "metadata", "cache")
+REQUIRED_PARTITIONS = ("userdata",)
+
+Phone = namedtuple("Phone", ["serial", "state", "usb", "product", "model", "device", "transport_id"])
+
+_PROP_RE = re.compile(r"^\[([^\]]+)\]: \[(.*)\]$", re.M)
+_ATTRS = ("usb", "product", "model", "device", "transport_id")
+# how bootloaders word "this phone has no such partition"
+_MISSING_RE = re.compile(r"(partition|table)[^\n]*(does not exist|doesn't exist|not found|unknown)"
+                         r"|no such partition|unknown partition", re.I)
+
+
+def parse_adb_devices(text):
+    """`adb devices -l` output -> [Phone]."""
+    phones = []
+    for line in text.splitlines():
+        parts = line.split()
+        if len(parts) < 2 or line.startswith(("List of devices", "*")):
+            continue
+        serial, state = parts[0], parts[1]
+        if state == "no":
+            state = "no permissions"
+        attrs = {}
+        for part in parts[2:]:
+            key, sep, value = part.partition(":")
+            if sep and key in _ATTRS:
+                attrs[key] = value
+        phones.append(Phone(serial, state, *(attrs.get(k, "") for k in _ATTRS)))
+    return phones
+
+
+def parse_getprop(text):
+    """`getprop` dump ('[key]: [value]' lines) -> dict."""
+    return dict(_PROP_RE.findall(text))
+
+
+def adb_devices():
+    res = cmdexec.run(["adb", "devices", "-l"], timeout=ADB_TIMEOUT)
+    return parse_adb_devices(res.stdout) if res.ok else []
+
+
+def fastboot_devices():
+    """Serials currently in fastboot mode."""
+    res = cmdexec.run(["fastboot", "devices"], timeout=ADB_TIMEOUT)
+    if not res.ok:
+        return set()
+    return {line.split()[0] for line in res.stdout.splitlines() if line.strip()}
+
+
+def metadata(serial, props):
+    meta = {'serial': serial}
+    for key, prop in PROPS.items():
+        meta[key] = props.get(prop, "").strip() or "unknown"
+    return meta
+
+
+def collect_metadata(serials):
+    """{serial: metadata} from one getprop dump per phone, all phones at once."""
+    serials = list(serials)
+    results = cmdexec.run_many([["adb", "-s", s, "shell", "getprop"] for s in serials],
+                               timeout=ADB_TIMEOUT)
+    return {s: metadata(s, parse_getprop(r.stdout) if r.ok else {}) for s, r in zip(serials, results)}
+
+
+def is_locked(meta):
+    # a green verified-boot state means a locked, verified bootloader
+    return meta.get('bootloader_state', "").strip() == "green"
+
+
+def adb_reboot(serials, target):
+    """Reboot every phone into `target` ('bootloader', 'recovery', ...)."""
+    serials = list(serials)
+    results = cmdexec.run_many([["adb", "-s", s, "reboot", target] for s in serials], timeout=ADB_TIMEOUT)
+    return dict(zip(serials, results))
+
+
+def fastboot_reboot(serials):
+    serials = list(serials)
+    results = cmdexec.run_many([["fastboot", "-s", s, "reboot"] for s in serials], timeout=ADB_TIMEOUT)
+    return dict(zip(serials, results))
+
+
+def wait_for_fastboot(serials, timeout=FASTBOOT_WAIT):
+    """
+    Wait until every serial shows up in `fastboot devices`; returns the set
+    that did. fastboot is only re-queried when a USB device comes or goes
+    (or every RECHECK seconds).
+    """
+    wanted = set(serials)
+    found = set()
+
+    def check():
+        found.update(fastboot_devices() & wanted)
+        return found >= wanted
+
+    hotplug.watcher().wait_until(check, timeout, recheck=RECHECK)
+    return found
+
+
+async def _erase_one(serial, partitions, semaphore):
+    results = []
+    async with semaphore:
+        for part in partitions:
+            results.append(await cmdexec.run_async(["fastboot", "-s", serial, "erase", part],
+                                                   timeout=ERASE_TIMEOUT))
+    return results
+
+
+async def _erase_many(serials, partitions, limit):
+    sem = asyncio.Semaphore(limit)
+    return await asyncio.gather(*(_erase_one(s, partitions, sem) for s in serials))
+
+
+def missing_partition(result):
+    """True when a fastboot erase failed only because the phone lacks the partition."""
+    return not result.ok and bool(_MISSING_RE.search(f"{result.stdout}\n{result.stderr}"))
+
+
+def erase_failures(outcome, partitions=ERASE_PARTITIONS):
+    """
+    (failed, absent) partition names for one phone's erase() results. An
+    optional partition the phone does not have counts as absent, not failed.
+    """
+    failed, absent = [], []
+    for part, res in zip(partitions, outcome):
+        if res.ok:
+            continue
+        if part not in REQUIRED_PARTITIONS and missing_partition(res):
+            absent.append(part)
+        else:
+            failed.append(part)
+    return failed, absent
+
+
+def erase(serials, partitions=ERASE_PARTITIONS, limit=cmdexec.DEFAULT_LIMIT):
+    """{serial: [CommandResult per partition]}; phones in parallel, partitions in order."""
+    serials = list(serials)
+    if not serials:
+        return {}
+    return dict(zip(serials, asyncio.run(_erase_many(serials, partitions, limit))))
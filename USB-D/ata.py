@@ -0,0 +1,246 @@
+"""
+ATA security erase backend.
+
+Capabilities are read from the raw IDENTIFY DEVICE words (`hdparm
+--Istdout`) rather than from substrings of `hdparm -I`. Word 128 holds the
+security state (supported / enabled / locked / frozen / enhanced erase).
+Words 89 and 90 hold the erase times the drive reports; they drive an
+estimated progress bar while the erase runs, because the drive reports
+nothing until it is done.
+
+Drive firmware usually freezes security at boot, and a suspend/resume
+cycle clears that. A frozen drive waits for the next resume instead of
+failing at once. The resume is detected through
+/sys/power/suspend_stats/success. With AUTO_SUSPEND set, the first
+frozen drive triggers one `rtcwake` cycle, shared by all frozen drives.
+The cycle waits until no job holds off suspend (suspend_hold()): a
+running security erase, overwrite, verification or phone wipe would not
+survive it. A thread waiting for its drive to unfreeze gives its own
+hold up for the wait.
+"""
+import contextlib
+import struct
+import subprocess
+import threading
+import time
+import uuid
+from collections import Counter, namedtuple
+
+import cmdexec
+from telemetry import ProgressTracker
+
+IDENTIFY_WORDS = 256
+SUSPEND_STATS = "/sys/power/suspend_stats/success"
+RESUME_POLL = 2.0
+FROZEN_WAIT = 600
+ERASE_POLL = 2.0
+# never show an estimate as finished before hdparm returns
+ESTIMATE_CAP = 0.99
+
+# set by callers that may put the host to sleep to unfreeze drives
+AUTO_SUSPEND = False
+SUSPEND_SECONDS = 5
+
+AtaInfo = namedtuple("AtaInfo", [
+    "model", "serial", "firmware", "sectors",
+    "security_supported", "security_enabled", "locked", "frozen", "count_expired",
+    "enhanced_supported", "erase_minutes", "enhanced_minutes",
+])
+
+# thread -> suspend holds; the host only sleeps when nothing holds one
+_holds = Counter()
+_state = threading.Condition()
+_suspend = None
+
+
+class AtaError(Exception):
+    pass
+
+
+def parse_identify(text):
+    """`hdparm --Istdout` hex dump -> list of 256 words."""
+    words = [int(tok, 16) for tok in text.split()
+             if len(tok) == 4 and all(c in "0123456789abcdefABCDEF" for c in tok)]
+    if len(words) < IDENTIFY_WORDS:
+        raise AtaError(f"IDENTIFY data too short ({len(words)} words)")
+    return words[:IDENTIFY_WORDS]
+
+
+def _ascii(words, first, last):
+    return b"".join(struct.pack(">H", w) for w in words[first:last + 1]).decode("ascii", "replace").strip()
+
+
+def erase_minutes(word):
+    """Erase time from IDENTIFY word 89/90: minutes, or None if not reported."""
+    if word & 0x8000:
+        # ACS-3 extended format: bits 14:0 in 2-minute units
+        value = word & 0x7FFF
+        return value * 2 if value else None
+    value = word & 0xFF
+    if value == 0:
+        return None
+    # 255 means "more than 508 minutes"
+    return 508 if value == 255 else value * 2
+
+
+def decode(words):
+    sec = words[128]
+    return AtaInfo(
+        model=_ascii(words, 27, 46),
+        serial=_ascii(words, 10, 19),
+        firmware=_ascii(words, 23, 26),
+        # LBA48 count, else the 28-bit one
+        sectors=(words[100] | words[101] << 16 | words[102] << 32 | words[103] << 48)
+        or (words[60] | words[61] << 16),
+        security_supported=bool(sec & 0x01),
+        security_enabled=bool(sec & 0x02),
+        locked=bool(sec & 0x04),
+        frozen=bool(sec & 0x08),
+        count_expired=bool(sec & 0x10),
+        enhanced_supported=bool(sec & 0x20),
+        erase_minutes=erase_minutes(words[89]),
+        enhanced_minutes=erase_minutes(words[90]),
+    )
+
+
+def identify(device):
+    res = cmdexec.run(["hdparm", "--Istdout", device], timeout=30)
+    if not res.ok:
+        raise AtaError(f"hdparm --Istdout failed: {(res.stderr or res.error or '').strip()}")
+    return decode(parse_identify(res.stdout))
+
+
+def describe(info):
+    state = [name for name, on in (("supported", info.security_supported), ("enabled", info.security_enabled),
+                                   ("locked", info.locked), ("frozen", info.frozen),
+                                   ("count expired", info.count_expired)) if on]
+    times = f"erase ~{info.erase_minutes or '?'}min"
+    if info.enhanced_supported:
+        times += f", enhanced ~{info.enhanced_minutes or '?'}min"
+    return f"{info.model} ({info.serial}, fw {info.firmware}): security {', '.join(state) or 'unsupported'}; {times}"
+
+
+def _resume_count():
+    try:
+        with open(SUSPEND_STATS) as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return None
+
+
+def _suspend_cycle():
+    global _suspend
+    with _state:
+        # suspending under running I/O would abort a security erase and
+        # fail overwrites and USB transfers
+        _state.wait_for(lambda: sum(_holds.values()) == 0)
+        cmdexec.run(["rtcwake", "-m", "mem", "-s", str(SUSPEND_SECONDS)], timeout=SUSPEND_SECONDS + 120)
+        _suspend = None
+
+
+@contextlib.contextmanager
+def suspend_hold():
+    """Keep AUTO_SUSPEND from putting the host to sleep while the block runs."""
+    me = threading.get_ident()
+    with _state:
+        _holds[me] += 1
+    try:
+        yield
+    finally:
+        with _state:
+            _holds[me] -= 1
+            if not _holds[me]:
+                del _holds[me]
+            _state.notify_all()
+
+
+@contextlib.contextmanager
+def _hold_released():
+    # this thread only waits for a resume; its holds must not block one
+    me = threading.get_ident()
+    with _state:
+        saved = _holds.pop(me, 0)
+        _state.notify_all()
+    try:
+        yield
+    finally:
+        if saved:
+            with _state:
+                _holds[me] += saved
+
+
+def request_suspend():
+    """Start (or join) one shared suspend/resume cycle."""
+    global _suspend
+    with _state:
+        if _suspend is None:
+            _suspend = threading.Thread(target=_suspend_cycle, daemon=True)
+            _suspend.start()
+
+
+def wait_unfrozen(device, timeout=FROZEN_WAIT, cancel=None, log=lambda text: None):
+    """
+    Wait for a resume to clear `device`'s frozen state. Returns the new
+    AtaInfo (which may still be frozen on timeout or cancel).
+    """
+    with _hold_released():
+        seen = _resume_count()
+        if AUTO_SUSPEND:
+            log("Drive is frozen; requesting a suspend/resume cycle to unfreeze it")
+            request_suspend()
+        else:
+            log(f"Drive is frozen; waiting up to {timeout}s for a suspend/resume cycle "
+                f"(e.g. rtcwake -m mem -s 5)")
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline and not (cancel is not None and cancel.is_set()):
+            count = _resume_count()
+            if count is None or count != seen:
+                info = identify(device)
+                if not info.frozen:
+                    return info
+                seen = count
+            time.sleep(RESUME_POLL)
+    return identify(device)
+
+
+def secure_erase(device, info, progress=None, total=0, log=lambda text: None, enhanced=True):
+    """
+    Set a temporary password and run SECURITY ERASE UNIT, enhanced when the
+    drive supports it and `enhanced` allows it. A normal erase leaves
+    zeros; an enhanced one leaves a vendor-defined pattern that nothing can
+    be verified against. Progress is estimated from the drive's own erase
+    time. Returns the mode used ('enhanced' / 'normal'); raises AtaError.
+    """
+    enhanced = enhanced and info.enhanced_supported
+    minutes = (info.enhanced_minutes if enhanced else info.erase_minutes) or None
+    mode = "enhanced" if enhanced else "normal"
+    passwd = "NullBytes" + uuid.uuid4().hex[:8]
+
+    res = cmdexec.run(["hdparm", "--user-master", "u", "--security-set-pass", passwd, device], timeout=30)
+    if not res.ok:
+        raise AtaError(f"setting the security password failed: {(res.stderr or res.error or '').strip()}")
+
+    flag = "--security-erase-enhanced" if enhanced else "--security-erase"
+    log(f"Issuing {mode} security erase; drive estimate {f'{minutes} min' if minutes else 'not reported'}")
+    total = total or info.sectors * 512
+    tracker = ProgressTracker(progress, device, total, pattern=f"{mode}_erase", phase="erase")
+    with suspend_hold():
+        try:
+            proc = subprocess.Popen(["hdparm", "--user-master", "u", flag, passwd, device],
+                                    stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+        except OSError as e:
+            raise AtaError(f"could not run hdparm: {e}")
+        started = time.monotonic()
+        while True:
+            try:
+                out, _ = proc.communicate(timeout=ERASE_POLL)
+                break
+            except subprocess.TimeoutExpired:
+                if minutes:
+                    fraction = min((time.monotonic() - started) / (minutes * 60), ESTIMATE_CAP)
+                    tracker.update(int(total * fraction))
+    log(out.strip())
+    if proc.returncode != 0:
+        raise AtaError(f"security erase failed, code={proc.returncode}")
+    tracker.finish(total)
+    return mode
@@ -0,0 +1,161 @@
+"""
+Per-range handling of media errors for the overwrite and verify engines.
+
+A media error (EIO and the like) on one large write or read no longer
+ends the pass. The failing range is retried with a short backoff, then
+split in half, recursively, down to one sector. Halves that succeed are
+done normally. Sectors that still fail after their own retries go into
+a BadRangeMap: a sorted list of merged [start, end) intervals that ends
+up in the log and the certificate. The pass then carries on. Only the
+top-level range and single sectors are retried, so one bad sector costs
+a few milliseconds of bisection instead of a whole pass.
+"""
+import bisect
+import errno
+import os
+import threading
+import time
+
+MEDIA_ERRORS = (errno.EIO, errno.ENODATA, errno.EREMOTEIO, errno.EILSEQ)
+SECTOR = 4096
+RETRIES = 2
+BACKOFF = 0.05
+# beyond this the drive is failing as a whole, not in spots
+MAX_BAD_BYTES = 1024 * 1024 * 1024
+
+
+class BadRangeMap:
+    """Thread-safe sorted list of disjoint [start, end) byte ranges."""
+
+    def __init__(self):
+        self._starts = []
+        self._ends = []
+        self._lock = threading.Lock()
+
+    def add(self, start, end):
+        with self._lock:
+            i = bisect.bisect_left(self._ends, start)
+            # absorb every range that touches [start, end)
+            j = i
+            while j < len(self._starts) and self._starts[j] <= end:
+                start = min(start, self._starts[j])
+                end = max(end, self._ends[j])
+                j += 1
+            self._starts[i:j] = [start]
+            self._ends[i:j] = [end]
+
+    def update(self, other):
+        for start, end in other:
+            self.add(start, end)
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(zip(self._starts, self._ends)))
+
+    def __len__(self):
+        return len(self._starts)
+
+    def __bool__(self):
+        return bool(self._starts)
+
+    @property
+    def total(self):
+        with self._lock:
+            return sum(e - s for s, e in zip(self._starts, self._ends))
+
+    def within(self, start, end):
+        """Bad ranges clipped to [start, end)."""
+        return [(max(s, start), min(e, end)) for s, e in self if s < end and e > start]
+
+    def as_list(self):
+        return [[s, e] for s, e in self]
+
+    def describe(self, limit=8):
+        ranges = list(self)
+        if not ranges:
+            return "none"
+        shown = ", ".join(f"{s}-{e}" for s, e in ranges[:limit])
+        more = f", ... {len(ranges) - limit} more" if len(ranges) > limit else ""
+        return f"{len(ranges)} range(s), {self.total} bytes: {shown}{more}"
+
+
+def is_media_error(e):
+    return isinstance(e, OSError) and e.errno in MEDIA_ERRORS
+
+
+def _attempt(op, offset, length, retries, backoff):
+    for attempt in range(retries + 1):
+        try:
+            op(offset, length)
+            return True
+        except OSError as e:
+            if not is_media_error(e):
+                raise
+            if attempt < retries:
+                time.sleep(backoff * (2 ** attempt))
+    return False
+
+
+def _bisect(op, offset, length, bad, unit, retries, backoff):
+    if length <= unit:
+        if not _attempt(op, offset, length, retries, backoff):
+            bad.add(offset, offset + length)
+        return
+    half = max(unit, length // 2 // unit * unit)
+    for off, n in ((offset, half), (offset + half, length - half)):
+        if not _attempt(op, off, n, 0, backoff):
+            _bisect(op, off, n, bad, unit, retries, backoff)
+
+
+def salvage(op, offset, length, bad, unit=SECTOR, retries=RETRIES, backoff=BACKOFF):
+    """
+    Run `op(offset, length)` over the range, bisecting around media errors.
+    Sectors that keep failing are added to `bad`. Other errors propagate,
+    and so does an OSError once `bad` exceeds MAX_BAD_BYTES.
+    """
+    if _attempt(op, offset, length, retries, backoff):
+        return
+    _bisect(op, offset, length, bad, unit, retries, backoff)
+    check_budget(bad)
+
+
+def check_budget(bad):
+    if bad.total > MAX_BAD_BYTES:
+        raise OSError(errno.EIO, f"more than {MAX_BAD_BYTES} bytes unreadable/unwritable; giving up")
+
+
+def read_segments(fd_for, view, offset, length, bad, unit=SECTOR):
+    """
+    Fill view[:length] from [offset, offset+length), reading around bad
+    sectors. `fd_for(offset, length)` picks the descriptor. Returns the
+    readable (start, end) segments relative to `view`.
+    """
+    def op(off, n):
+        got = os.preadv(fd_for(off, n), [view[off - offset:off - offset + n]], off)
+        if got < n:
+            raise OSError(errno.EIO, f"short read at offset {off + got}")
+
+    local = BadRangeMap()
+    salvage(op, offset, length, local, unit)
+    if not local:
+        return [(0, length)]
+    bad.update(local)
+    check_budget(bad)
+    segments = []
+    pos = offset
+    for s, e in local:
+        if s > pos:
+            segments.append((pos - offset, s - offset))
+        pos = e
+    if pos < offset + length:
+        segments.append((pos - offset, length))
+    return segments
+
+
+def check_segments(check, view, offset, segments):
+    """Run `check(view, offset)` over the readable segments; first bad index in `view` or -1."""
+    for a, b in segments:
+        bad = check(view[a:b], offset + a)
+        if bad >= 0:
+            return a + bad
+    return -1
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark for the wipe and verify paths.
+
+Runs each software method (zero, random, shred, quick) and each verifier
+(sampled, full) against a stand-in target. The target is a sparse file
+(on tmpfs when /dev/shm exists), optionally attached as a loop device
+(`--loop`, needs root and losetup). No real disks are touched, and the
+checkpoint journals and tuning cache go to a temporary state directory
+that is removed afterwards, never to /var/lib/NullBytes.
+
+Every case runs in its own child process, so peak RSS and CPU time
+belong to that case alone. The results file records wall time,
+MB/s, user and system CPU time, peak RSS, read/write syscall counts (from
+/proc/self/io) and context switches. `--baseline` compares against an
+earlier results file and exits non-zero on a regression.
+
+    python3 bench_wipe.py --size 1024 --out bench_results.json
+    python3 bench_wipe.py --save-baseline bench_baseline.json
+    python3 bench_wipe.py --baseline bench_baseline.json --tolerance 0.15
+    sudo python3 bench_wipe.py --loop --cases zero,quick,full
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+CASES = ("quick", "random", "shred", "zero", "sampled", "full")
+WIPE_CASES = {"zero": 1, "random": 1, "shred": 4}
+DEFAULT_SIZE_MIB = 1024
+TOLERANCE = 0.15
+CHILD_TIMEOUT = 3600
+
+# metric -> direction that counts as better
+COMPARED = {"mb_s": "higher", "cpu_s": "lower", "peak_rss_kib": "lower"}
+
+
+def proc_io():
+    """syscr/syscw/read_bytes/write_bytes of this process, {} where /proc is missing."""
+    try:
+        with open("/proc/self/io") as f:
+            return {k: int(v) for k, v in (line.split(":") for line in f)}
+    except (OSError, ValueError):
+        return {}
+
+
+# - Child side -
+def run_case(case, target):
+    """Run one case in this process; returns (ok, bytes processed, log text)."""
+    import driver
+    import tune
+    from overwrite import device_size
+
+    logf = io.StringIO()
+    size = device_size(target)
+    if case in WIPE_CASES:
+        ok, status = driver.overwrite_device(target, case, logf)
+        return ok, size * WIPE_CASES[case], logf.getvalue()
+    if case == "quick":
+        ok, status = driver.quick_wipe_usb(target, logf)
+        # wipefs, the first 10 MiB and the last MiB
+        return ok, 11 * 1024 * 1024, logf.getvalue()
+    if case == "sampled":
+        report = {}
+        ok = driver.verify_sampled(target, logf, depth=tune.read_settings(target, probe=False).queue_depth,
+                                   report=report)
+        return ok, report.get("bytes_read", 0), logf.getvalue()
+    if case == "full":
+        settings = tune.read_settings(target, log=lambda text: logf.write(text + "\n"))
+        ok = driver.verify_full(target, logf, block_size=settings.block_size, depth=settings.queue_depth)
+        return ok, size, logf.getvalue()
+    raise ValueError(f"unknown case {case}")
+
+
+def child_main(case, target, autotune, state_dir):
+    import checkpoint
+    import tune
+    tune.ENABLED = autotune
+    checkpoint.STATE_DIRS = (os.path.join(state_dir, "checkpoints"),)
+    tune.CACHE_FILES = (os.path.join(state_dir, "tuning.json"),)
+    io_before = proc_io()
+    usage_before = resource.getrusage(resource.RUSAGE_SELF)
+    started = time.monotonic()
+    try:
+        ok, nbytes, log = run_case(case, target)
+        error = None
+    except Exception as e:
+        ok, nbytes, log, error = False, 0, "", str(e)
+    elapsed = time.monotonic() - started
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    io_after = proc_io()
+    print(json.dumps({
+        "ok": ok,
+        "error": error,
+        "bytes": nbytes,
+        "elapsed": round(elapsed, 3),
+        "mb_s": round(nbytes / elapsed / (1024 ** 2), 1) if elapsed else 0.0,
+        "cpu_user_s": round(usage.ru_utime - usage_before.ru_utime, 3),
+        "cpu_sys_s": round(usage.ru_stime - usage_before.ru_stime, 3),
+        "cpu_s": round(usage.ru_utime + usage.ru_stime - usage_before.ru_utime - usage_before.ru_stime, 3),
+        # includes the interpreter and imports, which every case shares
+        "peak_rss_kib": usage.ru_maxrss,
+        "ctx_switches": (usage.ru_nvcsw - usage_before.ru_nvcsw) + (usage.ru_nivcsw - usage_before.ru_nivcsw),
+        "syscalls": {k: io_after[k] - io_before.get(k, 0) for k in ("syscr", "syscw") if k in io_after},
+        "log_tail": log[-2000:] if not ok else "",
+    }))
+    return 0
+
+
+# - Parent side -
+def measure(case, target, autotune, state_dir):
+    cmd = [sys.executable, os.path.abspath(__file__), "--child", case, target, "--state-dir", state_dir]
+    if autotune:
+        cmd.append("--autotune")
+    try:
+        res = subprocess.run(cmd, capture_output=True, text=True, timeout=CHILD_TIMEOUT,
+                             cwd=os.path.dirname(os.path.abspath(__file__)))
+        return json.loads(res.stdout.strip().splitlines()[-1])
+    except subprocess.TimeoutExpired:
+        error = f"timed out after {CHILD_TIMEOUT}s"
+    except (IndexError, ValueError):
+        error = (res.stderr or "no output").strip()[-2000:]
+    return {"ok": False, "error": error, "bytes": 0, "elapsed": 0.0, "mb_s": 0.0, "cpu_s": 0.0,
+            "peak_rss_kib": 0}
+
+
+def make_target(size, directory=None, loop=False):
+    """(path, cleanup) for a sparse file of `size` bytes, optionally behind a loop device."""
+    directory = directory or ("/dev/shm" if os.path.isdir("/dev/shm") else None)
+    fd, path = tempfile.mkstemp(prefix="nullbytes-bench-", suffix=".img", dir=directory)
+    os.ftruncate(fd, size)
+    os.close(fd)
+    if not loop:
+        return path, lambda: os.remove(path)
+    res = subprocess.run(["losetup", "--find", "--show", path], capture_output=True, text=True)
+    if res.returncode != 0:
+        os.remove(path)
+        raise OSError(f"losetup failed: {res.stderr.strip()}")
+    dev = res.stdout.strip()
+
+    def cleanup():
+        subprocess.run(["losetup", "-d", dev], capture_output=True)
+        os.remove(path)
+
+    return dev, cleanup
+
+
+def skipped(case, loop):
+    """Reason a case cannot run on this target, or None."""
+    if case == "quick":
+        if not loop:
+            return "needs a block device (--loop)"
+        missing = [t for t in ("wipefs", "parted", "mkfs.vfat", "blockdev") if not shutil.which(t)]
+        if missing:
+            return f"missing {', '.join(missing)}"
+    return None
+
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """Regressions of `results` against `baseline`, as readable lines."""
+    problems = []
+    for case, now in results["cases"].items():
+        then = baseline.get("cases", {}).get(case)
+        if not then or not now.get("ok") or not then.get("ok"):
+            continue
+        for metric, better in COMPARED.items():
+            old, new = then.get(metric), now.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if (better == "higher" and change < -tolerance) or (better == "lower" and change > tolerance):
+                problems.append(f"{case}: {metric} {old} -> {new} ({change:+.1%})")
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Wipe/verify throughput benchmark on stand-in targets")
+    parser.add_argument("--cases", default=",".join(CASES), help="Comma-separated subset of " + ", ".join(CASES))
+    parser.add_argument("--size", type=int, default=DEFAULT_SIZE_MIB, help="Target size in MiB")
+    parser.add_argument("--dir", help="Directory for the target file (default /dev/shm)")
+    parser.add_argument("--loop", action="store_true", help="Attach the file as a loop device (root)")
+    parser.add_argument("--autotune", action="store_true", help="Let tune.py calibrate (off for stable numbers)")
+    parser.add_argument("--out", default="bench_results.json", help="Results file")
+    parser.add_argument("--baseline", help="Earlier results file to compare against")
+    parser.add_argument("--save-baseline", help="Also write the results here as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE, help="Allowed relative regression")
+    parser.add_argument("--child", nargs=2, metavar=("CASE", "TARGET"), help=argparse.SUPPRESS)
+    parser.add_argument("--state-dir", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        return child_main(*args.child, autotune=args.autotune, state_dir=args.state_dir)
+
+    cases = [c for c in args.cases.split(",") if c]
+    unknown = set(cases) - set(CASES)
+    if unknown:
+        parser.error(f"unknown case(s): {', '.join(sorted(unknown))}")
+
+    target, cleanup = make_target(args.size * 1024 * 1024, args.dir, args.loop)
+    # shared by the cases of this run (the verifiers reuse what the wipes tuned), then dropped
+    state_dir = tempfile.mkdtemp(prefix="nullbytes-bench-state-")
+    results = {
+        "meta": {
+            "timestamp": time.time(),
+            "host": platform.node(),
+            "kernel": platform.release(),
+            "python": platform.python_version(),
+            "target": "loop" if args.loop else "file",
+            "target_dir": os.path.dirname(target) if not args.loop else None,
+            "size_bytes": args.size * 1024 * 1024,
+            "autotune": args.autotune,
+        },
+        "cases": {},
+    }
+    try:
+        # verifiers need a wiped target; run them after the wipes
+        for case in sorted(cases, key=CASES.index):
+            reason = skipped(case, args.loop)
+            if reason:
+                results["cases"][case] = {"ok": False, "skipped": reason}
+                print(f"{case:8s} skipped: {reason}")
+                continue
+            r = results["cases"][case] = measure(case, target, args.autotune, state_dir)
+            print(f"{case:8s} {'ok  ' if r['ok'] else 'FAIL'} {r['mb_s']:9.1f} MB/s  cpu {r['cpu_s']:7.2f}s  "
+                  f"rss {r['peak_rss_kib'] / 1024:7.1f} MiB  syscalls {sum(r.get('syscalls', {}).values())}"
+                  + (f"  {r['error']}" if r.get("error") else ""))
+    finally:
+        cleanup()
+        shutil.rmtree(state_dir, ignore_errors=True)
+
+    for path in filter(None, (args.out, args.save_baseline)):
+        with open(path, "w") as f:
+            json.dump(results, f, indent=2)
+    print(f"Results written to {args.out}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            problems = compare(results, json.load(f), args.tolerance)
+        for line in problems:
+            print(f"REGRESSION {line}")
+        if problems:
+            return 1
+        print(f"No regressions beyond {args.tolerance:.0%} against {args.baseline}")
+    return 0 if all(r.get("ok") or r.get("skipped") for r in results["cases"].values()) else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,129 @@
+"""
+Checkpoint journal for resumable overwrites.
+
+One small JSON file per drive, keyed by its WWN / serial number and size
+(discovery.stable_id), records
+the plan (method and pass patterns), the keystream seed of every random
+pass, and for each pass the offset below which everything is on stable
+storage. The engine fsyncs the device before reporting such an offset, so
+the journal never claims more than the media holds. The journal itself
+is replaced atomically (write, fsync, rename).
+
+After a crash the same job reopens the journal and resumes the
+interrupted pass at that offset with the same seed. Before that, the last
+BOUNDARY bytes before the checkpoint are read back to confirm them.
+
+A drive without a WWN or serial number is not journalled: its /dev name
+is reused by whatever drive is plugged in next, which would then inherit
+the journal and skip passes it never received. Such a wipe always starts
+from the beginning.
+"""
+import json
+import os
+import re
+import time
+
+STATE_DIRS = ("/var/lib/NullBytes/checkpoints", "/tmp/NullBytes/checkpoints")
+# bytes before the checkpoint that are re-verified on resume
+BOUNDARY = 64 * 1024 * 1024
+
+
+def state_dir():
+    for path in STATE_DIRS:
+        try:
+            os.makedirs(path, exist_ok=True)
+            return path
+        except OSError:
+            continue
+    raise OSError("no writable checkpoint directory")
+
+
+def journal_path(ident, size):
+    """Journal file for the drive `ident` (discovery.stable_id); None without one."""
+    if not ident:
+        return None
+    return os.path.join(state_dir(), f"{re.sub(r'[^A-Za-z0-9._-]', '_', ident)}_{size}.json")
+
+
+class Journal:
+    def __init__(self, path, data, resumed=False):
+        self.path = path
+        self.data = data
+        self.resumed = resumed
+
+    @property
+    def persistent(self):
+        return self.path is not None
+
+    @classmethod
+    def open(cls, device, ident, size, method, plan):
+        """
+        Existing journal for the same drive, size and plan, or a fresh one.
+        Without an `ident` the journal only lives in memory and never resumes.
+        """
+        path = journal_path(ident, size)
+        try:
+            if path is not None:
+                with open(path) as f:
+                    data = json.load(f)
+                if data.get("size") == size and data.get("method") == method and data.get("plan") == list(plan):
+                    return cls(path, data, resumed=True)
+        except (OSError, ValueError):
+            pass
+        data = {
+            "device": device,
+            "ident": ident,
+            "size": size,
+            "method": method,
+            "plan": list(plan),
+            "passes": [{"pattern": kind, "seed": None, "done": 0} for kind in plan],
+            "started": time.time(),
+        }
+        return cls(path, data)
+
+    def resume_point(self):
+        """(pass_no, offset) to continue from; pass_no is past the plan if every pass is done."""
+        for i, p in enumerate(self.data["passes"], 1):
+            if p["done"] < self.data["size"]:
+                return i, p["done"]
+        return len(self.data["passes"]) + 1, 0
+
+    def seed(self, pass_no):
+        seed = self.data["passes"][pass_no - 1]["seed"]
+        return bytes.fromhex(seed) if seed else None
+
+    def begin_pass(self, pass_no, seed):
+        p = self.data["passes"][pass_no - 1]
+        p["seed"] = seed.hex() if seed else None
+        p["done"] = 0
+        self.save()
+
+    def commit(self, pass_no, offset):
+        """Everything in pass `pass_no` below `offset` is durable."""
+        self.data["passes"][pass_no - 1]["done"] = offset
+        self.save()
+
+    def save(self):
+        self.data["updated"] = time.time()
+        if self.path is None:
+            return
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        dirfd = os.open(os.path.dirname(self.path), os.O_RDONLY)
+        try:
+            os.fsync(dirfd)
+        finally:
+            os.close(dirfd)
+
+    def finish(self):
+        """The wipe is complete; nothing left to resume."""
+        if self.path is None:
+            return
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
@@ -0,0 +1,98 @@
+"""
+Bounded, shell-free command execution.
+
+Every external tool is run from an argument vector (never through a shell)
+with a timeout, and the caller gets a CommandResult with rc, stdout, stderr
+and duration instead of None. Independent probes can be started together
+with run_many(), which runs them concurrently on an asyncio loop with a cap
+on how many processes are alive at once. Every command is recorded as a
+"cmd:<tool>" span (see timing.py).
+"""
+import asyncio
+import os
+import shlex
+import time
+
+import timing
+
+DEFAULT_TIMEOUT = 30
+DEFAULT_LIMIT = 8
+
+
+class CommandResult:
+    __slots__ = ("argv", "rc", "stdout", "stderr", "duration", "timed_out", "error")
+
+    def __init__(self, argv, rc=None, stdout="", stderr="", duration=0.0, timed_out=False, error=None):
+        self.argv = argv
+        self.rc = rc
+        self.stdout = stdout
+        self.stderr = stderr
+        self.duration = duration
+        self.timed_out = timed_out
+        self.error = error
+
+    def __repr__(self):
+        return f"<CommandResult {' '.join(self.argv)!r} rc={self.rc} {self.duration:.2f}s>"
+
+    @property
+    def ok(self):
+        return self.rc == 0 and not self.timed_out
+
+    def as_dict(self):
+        return {k: getattr(self, k) for k in self.__slots__}
+
+
+def argv_of(cmd):
+    """Commands may be given as a list or as a plain string (split, never shell-interpreted)."""
+    return list(cmd) if isinstance(cmd, (list, tuple)) else shlex.split(cmd)
+
+
+async def run_async(cmd, timeout=DEFAULT_TIMEOUT, input=None, semaphore=None):
+    argv = argv_of(cmd)
+    result = CommandResult(argv)
+    started = time.monotonic()
+    if semaphore is not None:
+        await semaphore.acquire()
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            *argv,
+            stdin=asyncio.subprocess.PIPE if input is not None else asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+        try:
+            out, err = await asyncio.wait_for(
+                proc.communicate(input.encode() if isinstance(input, str) else input), timeout)
+        except asyncio.TimeoutError:
+            result.timed_out = True
+            proc.kill()
+            out, err = await proc.communicate()
+        result.rc = proc.returncode
+        result.stdout = out.decode(errors="replace")
+        result.stderr = err.decode(errors="replace")
+    except OSError as e:
+        # missing binary, permission denied...
+        result.error = str(e)
+        result.rc = 127
+    finally:
+        if semaphore is not None:
+            semaphore.release()
+        result.duration = time.monotonic() - started
+        timing.record(f"cmd:{os.path.basename(argv[0]) if argv else '?'}", started, result.duration)
+    return result
+
+
+async def gather(cmds, timeout=DEFAULT_TIMEOUT, limit=DEFAULT_LIMIT):
+    sem = asyncio.Semaphore(limit)
+    return await asyncio.gather(*(run_async(c, timeout, semaphore=sem) for c in cmds))
+
+
+def run(cmd, timeout=DEFAULT_TIMEOUT, input=None):
+    """Run one command to completion from synchronous code."""
+    return asyncio.run(run_async(cmd, timeout, input))
+
+
+def run_many(cmds, timeout=DEFAULT_TIMEOUT, limit=DEFAULT_LIMIT):
+    """Run independent commands concurrently; results come back in input order."""
+    cmds = list(cmds)
+    if not cmds:
+        return []
+    return asyncio.run(gather(cmds, timeout, limit))
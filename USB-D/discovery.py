@@ -0,0 +1,216 @@
+"""
+Block device discovery from sysfs and the udev database.
+
+One pass over /sys/block builds an immutable DeviceRecord per disk
+(transport, model, serial, size, rotational, sector sizes) without forking
+lsblk or smartctl. Records are cached until invalidate() is called (the
+hotplug watcher does that); smartctl is only an optional enrichment for
+fields sysfs and udev could not provide.
+"""
+import os
+import shutil
+import threading
+from collections import namedtuple
+
+import cmdexec
+
+SYS_BLOCK = "/sys/block"
+UDEV_DATA = "/run/udev/data"
+
+# lsblk -d used to hide these
+SKIP_PREFIXES = ("loop", "sr", "ram", "zram", "fd")
+# disks that are built on other storage (device mapper, md, network block devices)
+VIRTUAL_PREFIXES = ("dm-", "md", "nbd")
+PHYSICAL_TRANSPORTS = ("ata", "nvme", "usb")
+
+DeviceRecord = namedtuple("DeviceRecord", [
+    "path", "name", "devnum", "transport", "vendor", "model", "serial", "wwn", "firmware",
+    "size", "rotational", "removable", "logical_sector", "physical_sector", "sysfs_path",
+])
+
+_cache = {}
+_lock = threading.Lock()
+
+
+def _read(path, default=None):
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return default
+
+
+def _read_int(path, default=0):
+    value = _read(path)
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def udev_properties(devnum):
+    """E: lines of the udev database entry for block device 'major:minor'."""
+    props = {}
+    data = _read(os.path.join(UDEV_DATA, f"b{devnum}"), "")
+    for line in data.splitlines():
+        if line.startswith("E:") and "=" in line:
+            key, _, value = line[2:].partition("=")
+            props[key] = value
+    return props
+
+
+def _transport(name, sysfs_path, udev):
+    if name.startswith("nvme"):
+        return "nvme"
+    bus = udev.get("ID_BUS", "").lower()
+    if bus == "usb" or "/usb" in sysfs_path:
+        return "usb"
+    if bus == "ata" or udev.get("ID_ATA") == "1" or "/ata" in sysfs_path:
+        return "ata"
+    if name.startswith("sd"):
+        return "ata"
+    return "unknown"
+
+
+def read_record(name):
+    base = os.path.join(SYS_BLOCK, name)
+    if not os.path.isdir(base):
+        return None
+    sysfs_path = os.path.realpath(base)
+    devnum = _read(os.path.join(base, "dev"), "")
+    udev = udev_properties(devnum) if devnum else {}
+    dev = os.path.join(base, "device")
+
+    model = udev.get("ID_MODEL_FROM_DATABASE") or _read(os.path.join(dev, "model")) or \
+        udev.get("ID_MODEL", "").replace("_", " ")
+    serial = udev.get("ID_SERIAL_SHORT") or _read(os.path.join(dev, "serial")) or \
+        _read(os.path.join(base, "serial"), "")
+    wwn = udev.get("ID_WWN_WITH_EXTENSION") or udev.get("ID_WWN") or \
+        _read(os.path.join(base, "wwid")) or _read(os.path.join(dev, "wwid"), "")
+    firmware = udev.get("ID_REVISION") or _read(os.path.join(dev, "firmware_rev")) or \
+        _read(os.path.join(dev, "rev"), "")
+
+    return DeviceRecord(
+        path=f"/dev/{name}",
+        name=name,
+        devnum=devnum,
+        transport=_transport(name, sysfs_path, udev),
+        vendor=udev.get("ID_VENDOR") or _read(os.path.join(dev, "vendor"), ""),
+        model=(model or "").strip(),
+        serial=(serial or "").strip(),
+        wwn=(wwn or "").strip(),
+        firmware=(firmware or "").strip(),
+        # /sys/block/*/size is always in 512-byte units
+        size=_read_int(os.path.join(base, "size")) * 512,
+        rotational=_read_int(os.path.join(base, "queue", "rotational")) == 1,
+        removable=_read_int(os.path.join(base, "removable")) == 1,
+        logical_sector=_read_int(os.path.join(base, "queue", "logical_block_size"), 512),
+        physical_sector=_read_int(os.path.join(base, "queue", "physical_block_size"), 512),
+        sysfs_path=sysfs_path,
+    )
+
+
+def is_stacked(name):
+    """True if block device `name` sits on top of other block devices."""
+    try:
+        return bool(os.listdir(os.path.join(SYS_BLOCK, name, "slaves")))
+    except OSError:
+        return False
+
+
+def scan(refresh=False):
+    """
+    All disks under /sys/block, sorted by name. Devices built on other
+    block devices (dm, md, nbd, anything with slaves/) are left out, as
+    `lsblk -d` did: wiping one would race the job on the disk below it.
+    """
+    try:
+        names = sorted(os.listdir(SYS_BLOCK))
+    except OSError:
+        return []
+    records = []
+    with _lock:
+        for name in names:
+            if name.startswith(SKIP_PREFIXES + VIRTUAL_PREFIXES) or is_stacked(name):
+                continue
+            rec = None if refresh else _cache.get(name)
+            if rec is None:
+                rec = read_record(name)
+                if rec is None:
+                    continue
+                _cache[name] = rec
+            records.append(rec)
+        for gone in set(_cache) - set(names):
+            del _cache[gone]
+    return records
+
+
+def get(device):
+    """Cached record for '/dev/sdX' (or 'sdX'); None if it is not a disk."""
+    name = os.path.basename(device)
+    with _lock:
+        rec = _cache.get(name)
+    if rec is None:
+        rec = read_record(name)
+        if rec is not None:
+            with _lock:
+                _cache[name] = rec
+    return rec
+
+
+def is_physical(rec):
+    """A real drive on a known transport, not a loop, dm, md, zram or nbd device."""
+    return (not rec.name.startswith(SKIP_PREFIXES + VIRTUAL_PREFIXES)
+            and rec.transport in PHYSICAL_TRANSPORTS)
+
+
+def stable_id(rec):
+    """
+    Identity that follows the drive rather than its /dev name: WWN and
+    serial number, whichever are known. Empty when the drive reports
+    neither (many USB bridges), so it cannot be told apart from the next.
+    """
+    if rec is None:
+        return ""
+    return "_".join(v for v in (rec.wwn, rec.serial) if v)
+
+
+def invalidate(device=None):
+    with _lock:
+        if device is None:
+            _cache.clear()
+        else:
+            _cache.pop(os.path.basename(device), None)
+
+
+def enrich(rec, timeout=10):
+    """Fill model/serial/firmware gaps from `smartctl -i`; returns a new record."""
+    if (rec.model and rec.serial and rec.firmware) or not shutil.which("smartctl"):
+        return rec
+    out = cmdexec.run(["smartctl", "-i", rec.path], timeout=timeout).stdout
+    found = {}
+    for line in out.splitlines():
+        key, _, value = line.partition(":")
+        value = value.strip()
+        if key in ("Model Number", "Device Model", "Product"):
+            found.setdefault("model", value)
+        elif key == "Serial Number":
+            found.setdefault("serial", value)
+        elif key in ("Firmware Version", "Revision"):
+            found.setdefault("firmware", value)
+    updates = {k: v for k, v in found.items() if v and not getattr(rec, k)}
+    if not updates:
+        return rec
+    rec = rec._replace(**updates)
+    with _lock:
+        _cache[rec.name] = rec
+    return rec
+
+
+def human_size(size):
+    """lsblk-style size string (1024-based, one decimal)."""
+    value = float(size)
+    for unit in ("B", "K", "M", "G", "T", "P"):
+        if value < 1024 or unit == "P":
+            return f"{value:.0f}{unit}" if unit == "B" else f"{value:.1f}{unit}".replace(".0", "")
+        value /= 1024
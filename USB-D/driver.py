@@ -1,17 +1,44 @@
 from certgen import save_certificates
+from overwrite import OverwriteEngine, ZeroPattern, ALIGN, device_size
+from patterns import random_pattern, Keystream
+from verify import verify_sampled, verify_full, verify_pipelined, make_check, check_zero, keystream_check
+from telemetry import Coalescer, UI_INTERVAL
+import android
+import ata
+import checkpoint
+import cmdexec
+import discovery
+import hotplug
+import mounts
+import nvme
+import sanitize
+import scheduler
+import timing
+import tune
 import os
 import subprocess
+import sys
 import threading
+import queue
 import time
-import uuid
 import json
+import contextlib
 import shutil
 import hashlib
+import traceback
+from collections import namedtuple
 from datetime import datetime
-import tkinter as tk
-from tkinter import ttk, messagebox, filedialog
 import platform, getpass, socket
 
+# tkinter is only imported once the GUI starts (load_tk), so headless
+# callers such as wipe_cli.py never load Tk.
+tk = ttk = messagebox = filedialog = None
+
+def load_tk():
+    global tk, ttk, messagebox, filedialog
+    import tkinter as tk
+    from tkinter import ttk, messagebox, filedialog
+
 # - Utilities -
 def is_root():
     try:
@@ -19,22 +46,21 @@ def is_root():
     except AttributeError:
         return False
 
-def run_cmd(cmd, capture_output=True):
-    try:
-        res = subprocess.run(
-            cmd, shell=True,
-            stdout=subprocess.PIPE if capture_output else None,
-            stderr=subprocess.PIPE if capture_output else None, text=True
-        )
-        if res.returncode != 0:
-            return None
-        return res.stdout.strip() if capture_output else ""
-    except Exception:
+def run_cmd(cmd, capture_output=True, timeout=cmdexec.DEFAULT_TIMEOUT):
+    """Run an argv (or a plain string, split without a shell); stdout on success, else None."""
+    res = cmdexec.run(cmd, timeout=timeout)
+    if not res.ok:
         return None
+    return res.stdout.strip() if capture_output else ""
 
 def check_dependency(cmd):
     return shutil.which(cmd) is not None
 
+def run_tool(argv, **kwargs):
+    """subprocess.run for tools whose exit status the caller checks, timed like cmdexec commands."""
+    with timing.span(f"cmd:{os.path.basename(argv[0])}"):
+        return subprocess.run(argv, **kwargs)
+
 def sha256_of_file(path):
     if not os.path.exists(path):
         return None
@@ -52,24 +78,32 @@ def collect_system_metadata():
         "operator": getpass.getuser()
     }
 
-def collect_device_metadata(device):
+def collect_device_metadata(device, enrich=True):
     meta = {"device": device}
-    try:
-        if check_dependency("smartctl"):
-            info = run_cmd(f"smartctl -i {device}")
-            if info:
-                for line in info.splitlines():
-                    if "Model Number" in line: meta["model"] = line.split(":")[-1].strip()
-                    if "Serial Number" in line: meta["serial"] = line.split(":")[-1].strip()
-                    if "Firmware Version" in line: meta["firmware"] = line.split(":")[-1].strip()
-    except: pass
-    try:
-        size = run_cmd(f"blockdev --getsize64 {device}")
-        if size:
-            meta["capacity_bytes"] = size
-            meta["capacity_human"] = f"{int(size)//(1024**3)} GB"
-    except: pass
-    meta["interface"] = detect_device_type(device)
+    rec = discovery.get(device)
+    if rec is None:
+        # not a disk under /sys/block (image file, partition...)
+        try:
+            size = os.path.getsize(device) if os.path.isfile(device) else None
+            if size is None:
+                with open(device, 'rb') as f:
+                    size = f.seek(0, os.SEEK_END)
+            meta["capacity_bytes"] = str(size)
+            meta["capacity_human"] = f"{size//(1024**3)} GB"
+        except OSError: pass
+        meta["interface"] = "unknown"
+        return meta
+    if enrich:
+        rec = discovery.enrich(rec)
+    if rec.model: meta["model"] = rec.model
+    if rec.serial: meta["serial"] = rec.serial
+    if rec.firmware: meta["firmware"] = rec.firmware
+    meta["capacity_bytes"] = str(rec.size)
+    meta["capacity_human"] = f"{rec.size//(1024**3)} GB"
+    meta["rotational"] = rec.rotational
+    meta["logical_sector_size"] = rec.logical_sector
+    meta["physical_sector_size"] = rec.physical_sector
+    meta["interface"] = rec.transport
     return meta
 
 VERSION = "1.0.0"
@@ -82,93 +116,35 @@ def script_sha256():
 
 
 # - Device Detection -
-def list_block_devices():
+def list_block_devices(refresh=False):
     devices = []
-    try:
-        out = subprocess.check_output("lsblk -dpno NAME,SIZE,MODEL | grep -v 'loop\\|sr0'", shell=True, text=True)
-        for line in out.splitlines():
-            parts = line.split(None, 2)
-            if len(parts) >= 2:
-                dev = parts[0]
-                info = ' '.join(parts[1:])
-                devices.append((dev, info))
-    except Exception:
-        pass
+    for rec in discovery.scan(refresh=refresh):
+        devices.append((rec.path, f"{discovery.human_size(rec.size)} {rec.model}".strip()))
     return devices
 
 def detect_device_type(device):
-    base = os.path.basename(device)
-
-    # NVMe is reliable
-    if base.startswith('nvme'):
-        return 'nvme'
-
-    # Try lsblk TRAN column first
-    try:
-        tran = run_cmd(f"lsblk -ndo TRAN {device}")
-        if tran:
-            tran = tran.strip().lower()
-            if tran == "nvme":
-                return "nvme"
-            if tran == "usb":
-                return "usb"
-            if tran in ("sata", "ata"):
-                return "ata"
-    except Exception:
-        pass
-
-    # Fallback: smartctl
-    if check_dependency("smartctl"):
-        try:
-            info = run_cmd(f"smartctl -i {device}")
-            if info:
-                if "NVMe" in info:
-                    return "nvme"
-                if "USB" in info or "Transport protocol:  USB" in info:
-                    return "usb"
-                if "ATA" in info or "SATA" in info:
-                    return "ata"
-        except Exception:
-            pass
-
-    # Final heuristic
-    if base.startswith("sd"):
-        return "ata"
-    return "unknown"
+    rec = discovery.get(device)
+    if rec is not None:
+        return rec.transport
+    return 'nvme' if os.path.basename(device).startswith('nvme') else 'unknown'
 
 
 # - Unmount the device -
 def unmount_device(device, logf):
+    """Release every mount, swap and holder on `device`; True once the kernel reports it free."""
     try:
-        partitions = []
-        base = os.path.basename(device)
-        for p in os.listdir("/dev"):
-            if p.startswith(base) and p != base:
-                partitions.append("/dev/" + p)
-        for part in partitions:
-            try:
-                logf.write(f"Unmounting {part}\n")
-                subprocess.run(["umount", "-f", part], check=True, timeout=10)
-            except subprocess.TimeoutExpired:
-                subprocess.run(["umount", "-l", part], check=True)
-            except Exception as e:
-                logf.write(f"Could not unmount {part}: {e}\n")
-        time.sleep(2)
-        return True
+        problems = mounts.release(device, log=lambda text: logf.write(text + "\n"))
     except Exception as e:
         logf.write(f"Unmount error: {e}\n")
         return False
+    for problem in problems:
+        logf.write(f"Could not release: {problem}\n")
+    return not problems
 
 # - Quick Wipe the USB -
 def find_partition(device, retries=10, delay=1):
-    """Poll /dev until a child partition appears (e.g., /dev/sdb1)"""
-    base = os.path.basename(device)
-    for _ in range(retries):
-        for p in os.listdir("/dev"):
-            if p.startswith(base) and p != base:
-                return "/dev/" + p
-        time.sleep(delay)
-    return None
+    """Wait up to retries*delay seconds for a child partition (e.g., /dev/sdb1) to appear"""
+    return hotplug.wait_for_partition(device, timeout=retries * delay)
 
 
 def quick_wipe_usb(device, logf):
@@ -176,31 +152,33 @@ def quick_wipe_usb(device, logf):
     try:
         # --- Unmount ---
         if not unmount_device(device, logf):
-            logf.write("Warning: could not fully unmount, continuing anyway...\n")
+            logf.write("Quick wipe aborted: the device is still in use.\n")
+            return False, "unmount_failed"
 
         # --- Wipe filesystem signatures ---
         logf.write("Removing filesystem signatures...\n")
-        subprocess.run(["wipefs", "-a", device], check=True, timeout=30)
+        run_tool(["wipefs", "-a", device], check=True, timeout=30)
 
         # --- Zero out start/end ---
-        size = int(subprocess.check_output(["blockdev", "--getsize64", device], text=True).strip())
+        size = int(run_tool(["blockdev", "--getsize64", device], capture_output=True, text=True,
+                            check=True).stdout.strip())
 
         logf.write("Zeroing first 10MB...\n")
-        subprocess.run(["dd", "if=/dev/zero", f"of={device}", "bs=1M", "count=10"],
-                       check=True, timeout=30)
+        run_tool(["dd", "if=/dev/zero", f"of={device}", "bs=1M", "count=10"],
+                 check=True, timeout=30)
 
         if size > 1048576:
             seek = (size - 1048576) // 1048576
             logf.write("Zeroing last MB...\n")
-            subprocess.run(["dd", "if=/dev/zero", f"of={device}", "bs=1M",
-                            f"seek={seek}", "count=1"],
-                           check=True, timeout=30)
+            run_tool(["dd", "if=/dev/zero", f"of={device}", "bs=1M",
+                      f"seek={seek}", "count=1"],
+                     check=True, timeout=30)
 
         # --- Partition table ---
         logf.write("Creating new partition table...\n")
-        subprocess.run(["parted", "-s", device, "mklabel", "msdos"], check=True, timeout=10)
-        subprocess.run(["parted", "-s", device, "mkpart", "primary", "fat32", "0%", "100%"],
-                       check=True, timeout=10)
+        run_tool(["parted", "-s", device, "mklabel", "msdos"], check=True, timeout=10)
+        run_tool(["parted", "-s", device, "mkpart", "primary", "fat32", "0%", "100%"],
+                 check=True, timeout=10)
 
         # --- Find partition ---
         logf.write("Waiting for new partition...\n")
@@ -211,9 +189,9 @@ def quick_wipe_usb(device, logf):
 
         # --- Format FAT32 ---
         logf.write(f"Formatting {part} as FAT32...\n")
-        subprocess.run(["mkfs.vfat", "-F", "32", "-n", "USBDRIVE", part],
-                       check=True, timeout=30,
-                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        run_tool(["mkfs.vfat", "-F", "32", "-n", "USBDRIVE", part],
+                 check=True, timeout=30,
+                 stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
 
         logf.write(f"Quick wipe complete. Partition: {part}\n")
         return True, f"usb_quick_wipe_ok:{part}"
@@ -232,26 +210,25 @@ def format_device(device, logf):
     print("Entered the device format function")
     try:
         # Unmount any existing mounts
-        subprocess.run(f"umount {device}* 2>/dev/null", shell=True)
+        if not unmount_device(device, logf):
+            logf.write("Format aborted: the device is still in use.\n")
+            return False
 
         logf.write("Creating new partition table...\n")
-        subprocess.run(["parted", "-s", device, "mklabel", "msdos"], check=True, timeout=10)
-        subprocess.run(["parted", "-s", device, "mkpart", "primary", "fat32", "0%", "100%"], check=True, timeout=10)
+        run_tool(["parted", "-s", device, "mklabel", "msdos"], check=True, timeout=10)
+        run_tool(["parted", "-s", device, "mkpart", "primary", "fat32", "0%", "100%"], check=True, timeout=10)
 
         # Tell the kernel to re-read the partition table
-        subprocess.run(["partprobe", device], check=True)
+        run_tool(["partprobe", device], check=True)
         logf.write("Partition table updated. Waiting for partition to appear...\n")
-        time.sleep(2)  # small delay for kernel
-
-        # Retry finding the partition
         part = find_partition(device, retries=20, delay=1)
         if not part:
             logf.write("Partition not found after creating table.\n")
             return False
 
         logf.write(f"Formatting {part} as FAT32...\n")
-        subprocess.run(["mkfs.vfat", "-F", "32", "-n", "USBDRIVE", part],
-                       check=True, timeout=30)
+        run_tool(["mkfs.vfat", "-F", "32", "-n", "USBDRIVE", part],
+                 check=True, timeout=30)
         logf.write(f"Format complete on {part}\n")
         return True
 
@@ -264,76 +241,100 @@ def format_device(device, logf):
 
 
 # - ATA/NVMe Wipes -
-def ata_secure_erase(device, logf):
+def ata_secure_erase(device, logf, progress=None, cancel=None, record=None, verify='none',
+                     idle=contextlib.nullcontext):
+    """
+    ATA security erase, or an overwrite where the drive has none. With
+    verification requested the normal erase is used: it writes zeros,
+    while the enhanced erase's vendor pattern cannot be checked. A frozen
+    drive waits for a resume inside `idle()` (WipeJob.waiting, which frees
+    the job's bus slot meanwhile).
+    """
     logf.write(f"[{datetime.now().isoformat()}] Starting ATA secure erase on {device}\n")
     if not check_dependency("hdparm"):
         logf.write("hdparm not installed.\n")
         return False, "hdparm_missing"
 
-    # Check device info
-    info = run_cmd(f"hdparm -I {device}")
-    if not info:
-        logf.write("Failed to run hdparm -I\n")
-        return False, "hdparm_info_fail"
-
-    logf.write(info + "\n")
-
-    # Check frozen state
-    if "frozen" in info.lower():
-        logf.write("Device is frozen. Power cycle required.\n")
-        return False, "frozen"
-
-    # Check support
-    if "supported" in info.lower() and ("security erase" in info.lower() or "security erase unit" in info.lower()):
-        logf.write("Secure erase supported.\n")
-        # Generate temp password
-        passwd = "P@ssw0rd" + uuid.uuid4().hex[:8]
-        logf.write(f"Setting security password...\n")
-        out = run_cmd(f"hdparm --user-master u --security-set-pass {passwd} {device}")
-        if out is None:
-            logf.write("Failed to set security password.\n")
-            return False, "security_set_fail"
-
-        logf.write("Issuing secure erase...\n")
-        proc = subprocess.Popen(
-            f"hdparm --user-master u --security-erase {passwd} {device}",
-            shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True
-        )
-        for line in proc.stdout:
-            logf.write(line)
-        proc.wait()
+    def log(text):
+        logf.write(text + "\n")
 
-        if proc.returncode == 0:
-            logf.write("Secure erase completed successfully.\n")
-            return True, "secure_erase_ok"
-        else:
-            logf.write(f"Secure erase failed, code={proc.returncode}\n")
+    try:
+        info = ata.identify(device)
+    except ata.AtaError as e:
+        logf.write(f"{e}\n")
+        return False, "hdparm_info_fail"
+    log(ata.describe(info))
+
+    if info.security_supported:
+        if info.frozen:
+            with idle():
+                info = ata.wait_unfrozen(device, cancel=cancel, log=log)
+            if cancel is not None and cancel.is_set():
+                logf.write("Cancelled while waiting for the drive to unfreeze.\n")
+                return False, "cancelled"
+            if info.frozen:
+                logf.write("Device is still frozen. Suspend/resume or power cycle required.\n")
+                return False, "frozen"
+            log("Drive unfrozen.")
+        if info.count_expired:
+            logf.write("Security attempt counter expired. Power cycle required.\n")
+            return False, "security_count_expired"
+        if info.security_enabled or info.locked:
+            logf.write("Security is already enabled with an unknown password.\n")
+            return False, "security_enabled"
+
+        rec = discovery.get(device)
+        if info.enhanced_supported and verify != 'none':
+            log("Using the normal erase: the enhanced erase's vendor pattern cannot be verified.")
+        try:
+            mode = ata.secure_erase(device, info, progress=progress, total=rec.size if rec else 0, log=log,
+                                    enhanced=verify == 'none')
+        except ata.AtaError as e:
+            logf.write(f"{e}\n")
             return False, "secure_erase_failed"
+        if record is not None:
+            record["final_pattern"] = "vendor" if mode == "enhanced" else "zero"
+            record["seed"] = None
+        logf.write(f"Secure erase ({mode}) completed successfully.\n")
+        return True, "enhanced_secure_erase_ok" if mode == "enhanced" else "secure_erase_ok"
     else:
+        rec = discovery.get(device)
+        if rec is not None and not rec.rotational:
+            # extra random passes buy nothing on flash; discard + zero fill does
+            logf.write("Secure erase not supported. Falling back to discard + zero fill.\n")
+            return offload_clear(device, logf, progress=progress, cancel=cancel, record=record,
+                                 discard_first=True)
         logf.write("Secure erase not supported. Falling back to multi-pass random overwrite.\n")
-        success = random_overwrite(device, passes=3, block_size=1024*1024, logf=logf)
+        success = random_overwrite(device, passes=3, logf=logf, cancel=cancel, progress=progress, record=record)
         return (success, "random_overwrite_ok" if success else "random_overwrite_failed")
 
 
-def random_overwrite(device, passes=3, block_size=1024*1024, logf=None):
+def random_overwrite(device, passes=3, block_size=None, logf=None, cancel=None, progress=None, record=None):
+    """
+    `passes` random passes; like overwrite_device, `record` receives the
+    final pass's seed (and any skipped sectors) for verification.
+    """
     try:
-        size_output = run_cmd(f"blockdev --getsize64 {device}")
-        if not size_output:
-            if logf: logf.write("Could not get device size.\n")
-            return False
-        size = int(size_output)
-        if logf: logf.write(f"Device size: {size} bytes\n")
-
-        with open(device, "wb") as f:
-            for p in range(passes):
-                if logf: logf.write(f"Pass {p+1}/{passes}\n")
-                written = 0
-                while written < size:
-                    data = os.urandom(min(block_size, size - written))
-                    f.write(data)
-                    written += len(data)
-                f.flush()
-                os.fsync(f.fileno())
+        settings = tune.write_settings(device, log=lambda text: logf and logf.write(text + "\n"))
+        with OverwriteEngine(device, block_size=block_size or settings.block_size,
+                             queue_depth=settings.queue_depth, progress=progress, cancel=cancel) as engine:
+            if logf: logf.write(f"Device size: {engine.size} bytes, {passes} pass(es)\n")
+            pool = engine.buffer_pool(passes)
+            # fresh seed per pass
+            patterns = [random_pattern(engine.block_size, engine.queue_depth, pool=pool) for _ in range(passes)]
+            try:
+                if not engine.run_plan(patterns, overlap=can_overlap(device)):
+                    if logf: logf.write("Random overwrite cancelled.\n")
+                    return False
+                if engine.bad and logf:
+                    logf.write(f"Unwritable sectors skipped: {engine.bad.describe()}\n")
+                if record is not None:
+                    record["bad_ranges"] = engine.bad.as_list()
+                    record["final_pattern"] = "random"
+                    record["seed"] = getattr(patterns[-1], "seed", None)
+            finally:
+                for pattern in patterns:
+                    pattern.close()
 
         if logf: logf.write("Random overwrite complete.\n")
         return True
@@ -345,91 +346,266 @@ def random_overwrite(device, passes=3, block_size=1024*1024, logf=None):
         return False
 
 
-def nvme_sanitize(device, logf):
+def nvme_sanitize(device, logf, progress=None):
     logf.write(f"[{datetime.now().isoformat()}] Starting NVMe sanitize on {device}\n")
     if not check_dependency('nvme'):
         logf.write("nvme tool missing\n")
         return False, 'nvme_missing'
 
+    def log(text):
+        logf.write(text + "\n")
+
     try:
-        logf.write("Running sanitize (sanact=1)...\n")
-        res = subprocess.run(
-            ["nvme", "sanitize", device, "--sanact=1"],
-            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True
-        )
-        logf.write(res.stdout + '\n')
-        if res.returncode != 0:
-            logf.write("Sanitize command failed.\n")
-            return False, 'nvme_sanitize_failed'
-
-        logf.write("Running format (ses=1)...\n")
-        res2 = subprocess.run(
-            ["nvme", "format", device, "--ses=1"],
-            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True
-        )
-        logf.write(res2.stdout + '\n')
-        if res2.returncode != 0:
+        rec = discovery.get(device)
+        ctrl = nvme.controller_of(device)
+        # a sanitize erases every namespace on the controller, not just this one
+        busy = [f"{d} ({'; '.join(use)})" for d in nvme.namespaces(ctrl) if d != device
+                for use in [mounts.in_use(d)] if use]
+        if busy:
+            logf.write(f"{ctrl}: other namespaces are in use: {', '.join(busy)}; "
+                       f"not sanitizing the controller, formatting {device} alone.\n")
+            if nvme.format_is_controller_wide(ctrl):
+                logf.write(f"{ctrl}: a format would erase every namespace as well; refusing.\n")
+                return False, 'nvme_namespaces_in_use'
+        else:
+            action = nvme.sanitize(device, rec.size if rec else 0, progress=progress, log=log)
+            if action:
+                # a sanitize already covers every namespace; no format afterwards
+                logf.write(f"NVMe sanitize ({action}) completed successfully.\n")
+                return True, f'nvme_sanitize_{action}_ok'
+            logf.write(f"{ctrl} does not support sanitize; formatting {device}.\n")
+
+        if not nvme.format_namespace(device, log=log):
             logf.write("Format command failed.\n")
             return False, 'nvme_format_failed'
+        logf.write("NVMe format completed successfully.\n")
+        return True, 'nvme_format_ok'
 
-        logf.write("NVMe sanitize+format completed successfully.\n")
-        return True, 'nvme_sanitize_format_ok'
-
+    except nvme.SanitizeError as e:
+        logf.write(f"{e}\n")
+        return False, 'nvme_sanitize_failed'
     except Exception as e:
         logf.write(f"nvme sanitize exception: {e}\n")
         return False, 'nvme_exception'
 
 
-# - Fallback -
-def dd_zero_cmd(device):
-    return f"dd if=/dev/zero of={device} bs=4M status=progress conv=fsync"
-
-def dd_random_cmd(device):
-    return f"dd if=/dev/urandom of={device} bs=4M status=progress conv=fsync"
-
-def shred_zero_cmd(device):
-    return f"shred -v -n 3 {device} && dd if=/dev/zero of={device} bs=4M status=progress conv=fsync"
+# - Software overwrite -
+# A pass plan is the ordered list of patterns one method writes, plus the
+# NIST SP 800-88 category it counts as. One engine runs the whole plan.
+PassPlan = namedtuple("PassPlan", ["passes", "category"])
+
+OVERWRITE_PLANS = {
+    'zero': PassPlan(('zero',), 'Clear'),
+    'random': PassPlan(('random',), 'Clear'),
+    'shred': PassPlan(('random', 'random', 'random', 'zero'), 'Clear'),
+}
+
+def make_pattern(kind, engine, seed=None, pool=None):
+    if kind == 'zero':
+        return ZeroPattern(engine.block_size)
+    return random_pattern(engine.block_size, engine.queue_depth, seed=seed, pool=pool)
+
+def can_overlap(device):
+    """Passes may overlap where seeks are free; on spinning disks they would thrash the heads."""
+    rec = discovery.get(device)
+    return rec is not None and not rec.rotational
+
+def resume_offset(device, journal, pass_no, offset, logf):
+    """
+    Read back the last checkpoint.BOUNDARY bytes before a resume point and
+    return where writing has to pick up: the checkpoint itself, or the
+    first block that does not hold the expected data.
+    """
+    kind = journal.data["plan"][pass_no - 1]
+    seed = journal.seed(pass_no)
+    if offset == 0 or (kind == 'random' and seed is None):
+        return offset
+    low = max(0, offset - checkpoint.BOUNDARY) // ALIGN * ALIGN
+    expected = Keystream(seed) if kind == 'random' else None
+    res = verify_pipelined(device, make_check(expected), start=low, end=offset)
+    if res.error is not None:
+        logf.write(f"Boundary check failed ({res.error}); rewriting from {low}\n")
+        return low
+    if res.first_mismatch is not None:
+        logf.write(f"Boundary check: mismatch at {res.first_mismatch}, resuming there\n")
+        return res.first_mismatch // ALIGN * ALIGN
+    logf.write(f"Boundary check: {offset - low} bytes before the checkpoint verified\n")
+    return offset
+
+def offload_clear(device, logf, progress=None, cancel=None, record=None, discard_first=False, readback=False):
+    """
+    Zero `device` through the kernel (BLKZEROOUT, optionally after a
+    discard); the software zero pass only runs where write-zeroes is not
+    offloaded.
+    """
+    status = 'offload_clear' if discard_first else 'zero'
+    try:
+        done = sanitize.offload_zero(device, log=lambda text: logf.write(text + "\n"),
+                                     progress=progress, cancel=cancel, discard_first=discard_first)
+    except OSError as e:
+        logf.write(f"Offloaded clear failed: {e}\n")
+        done = None
+    if done is None:
+        logf.write("Falling back to software zero fill.\n")
+        ok, _ = overwrite_device(device, 'zero', logf, progress=progress, cancel=cancel,
+                                 record=record, offload=False, readback=readback)
+        return ok, f"{status}_{'ok' if ok else 'failed'}"
+    if not done:
+        logf.write("Offloaded clear cancelled.\n")
+        return False, f"{status}_cancelled"
+    if record is not None:
+        record["final_pattern"] = "zero"
+        record["seed"] = None
+    return True, f"{status}_ok"
+
+def readback_check(pattern, engine):
+    """Write-and-verify check for the pattern of a final pass, or None if it cannot be regenerated."""
+    if pattern.name == 'zero':
+        return check_zero
+    stream = getattr(pattern, "stream", None)
+    return keystream_check(stream, engine.block_size) if stream is not None else None
+
+def overwrite_device(device, method, logf, progress=None, cancel=None, record=None, offload=True,
+                     readback=False):
+    """
+    Run the software overwrite for 'zero', 'random' or 'shred' in-process.
+    A 'zero' wipe goes to the device's write-zeroes offload when it has one
+    (unless `offload` is False). If `record` is a dict, the final pass's
+    pattern and keystream seed (for random passes) are stored in it so
+    verification can regenerate the data.
+
+    The method's PassPlan runs on one engine with a shared buffer pool; on
+    non-rotational media its passes overlap (see OverwriteEngine.run_plan).
+
+    Progress is journalled (see checkpoint.py); running the same wipe again
+    after a crash resumes every pass from its last durable checkpoint.
+
+    With `readback`, the final pass is written and verified in one sweep;
+    the outcome is stored as record["readback"]. Sectors that could not be
+    written are skipped and listed in record["bad_ranges"].
+    """
+    if method == 'zero' and offload:
+        return offload_clear(device, logf, progress=progress, cancel=cancel, record=record,
+                             readback=readback)
+    kinds = OVERWRITE_PLANS[method].passes
+
+    # Only pass boundaries go to the log; live progress goes to `progress`.
+    def on_progress(ev):
+        if ev.final:
+            logf.write(f"Pass {ev.pass_no}/{ev.passes} ({ev.pattern}) complete: {ev.bytes_done} bytes "
+                       f"in {ev.elapsed:.1f}s, avg {ev.avg_rate / (1024**2):.1f} MB/s\n")
+        if progress:
+            progress(ev)
 
-# - Verification -
-def verify_sampled(device, logf, samples=16):
-    logf.write(f"[{datetime.now().isoformat()}] Sampled verification: {samples} samples\n")
     try:
-        size_bytes = int(subprocess.check_output(f"blockdev --getsize64 {device}", shell=True, text=True).strip())
-    except Exception as e:
-        logf.write(f"blockdev failed: {e}\n")
+        rec = discovery.get(device)
+        journal = checkpoint.Journal.open(device, discovery.stable_id(rec), device_size(device), method, kinds)
+        if not journal.persistent:
+            logf.write("Drive reports no WWN or serial number; progress is not journalled "
+                       "and an interrupted wipe restarts from the beginning.\n")
+        # probes write to the start of the device; a resumed wipe must not lose what is there
+        settings = tune.write_settings(device, probe=not journal.resumed, log=lambda text: logf.write(text + "\n"))
+        with OverwriteEngine(device, block_size=settings.block_size, queue_depth=settings.queue_depth,
+                             progress=on_progress, cancel=cancel) as engine:
+            patterns = []
+            try:
+                overlap = len(kinds) > 1 and can_overlap(device)
+                logf.write(f"Overwriting {engine.size} bytes, {len(kinds)} pass(es), "
+                           f"bs={engine.block_size} qd={engine.queue_depth} ({settings.source}) "
+                           f"direct={engine.using_direct}{' overlapped' if overlap else ''}\n")
+                if journal.resumed:
+                    first, offset = journal.resume_point()
+                    logf.write(f"Resuming from checkpoint: pass {first}/{len(kinds)} at offset {offset}\n")
+                pool = engine.buffer_pool(len(kinds))
+                starts = []
+                for i, kind in enumerate(kinds, 1):
+                    done = journal.data["passes"][i - 1]["done"]
+                    if journal.resumed and done:
+                        start = resume_offset(device, journal, i, done, logf) if done < engine.size else done
+                        patterns.append(make_pattern(kind, engine, seed=journal.seed(i), pool=pool))
+                    else:
+                        start = 0
+                        patterns.append(make_pattern(kind, engine, pool=pool))
+                        journal.begin_pass(i, getattr(patterns[-1], "seed", None))
+                    starts.append(start)
+                    if start < engine.size:
+                        logf.write(f"Pass {i}/{len(kinds)} ({kind}) queued"
+                                   + (f" from offset {start}" if start else "") + "\n")
+                check = None
+                if readback:
+                    check = readback_check(patterns[-1], engine)
+                    if check is None:
+                        logf.write("Final pass is not reproducible; no read-back verification.\n")
+                if not engine.run_plan(patterns, starts=starts, overlap=overlap,
+                                       checkpoint=journal.commit, readback=check):
+                    logf.write("Overwrite cancelled.\n")
+                    return False, f"{method}_cancelled"
+                if check is not None and record is not None:
+                    record["readback"] = engine.readback
+                if engine.bad:
+                    logf.write(f"Unwritable sectors skipped: {engine.bad.describe()}\n")
+                if record is not None:
+                    record["bad_ranges"] = engine.bad.as_list()
+                    record["final_pattern"] = kinds[-1]
+                    record["seed"] = journal.seed(len(kinds))
+                journal.finish()
+            finally:
+                for pattern in patterns:
+                    pattern.close()
+    except PermissionError:
+        logf.write("Permission denied. Run as root!\n")
+        return False, f"{method}_failed"
+    except OSError as e:
+        logf.write(f"Overwrite error: {e}\n")
+        return False, f"{method}_failed"
+    logf.write("Overwrite complete.\n")
+    return True, f"{method}_ok"
+
+def expected_pattern(record, logf):
+    """
+    What verification should compare against: (None, label) for zeros,
+    (Keystream, label) for a reproducible random pass, or (False, label)
+    when the last pass cannot be regenerated.
+    """
+    if record.get("final_pattern") == "vendor":
+        logf.write("Enhanced secure erase leaves a vendor-defined pattern; it cannot be verified.\n")
+        return False, "vendor-pattern"
+    if record.get("final_pattern") != "random":
+        return None, "zero"
+    if record.get("seed"):
+        return Keystream(record["seed"]), "keystream"
+    logf.write("Final random pass was not seeded; it cannot be verified.\n")
+    return False, "unverifiable"
+
+def verify_readback(device, record, expected, logf, cancel=None):
+    """Outcome of a write-and-verify pass, plus a full read of anything it did not cover."""
+    rb = record.get("readback")
+    if rb is None:
+        logf.write("No read-back data from the wipe; running a full verification.\n")
+        return verify_full(device, logf, cancel=cancel, expected=expected)
+    if rb["error"] is not None:
+        logf.write(f"Read-back verification failed: {rb['error']}\n")
         return False
-    import random
-    offsets = [0, max(0, size_bytes-4096)]
-    for _ in range(max(0, samples-2)):
-        offsets.append(random.randrange(0, max(1, size_bytes-4096)))
-    try:
-        with open(device, 'rb') as f:
-            for off in offsets:
-                f.seek(off)
-                data = f.read(4096)
-                if any(b != 0 for b in data):
-                    logf.write(f"Non-zero data at {off}\n")
-                    return False
-        return True
-    except Exception as e:
-        logf.write(f"Sampled verify exception: {e}\n")
+    if rb["first_mismatch"] is not None:
+        logf.write(f"Unexpected data found during read-back at offset {rb['first_mismatch']}\n")
         return False
-
-def verify_full(device, logf):
-    logf.write(f"[{datetime.now().isoformat()}] Full verification started.\n")
-    block_size = 1024*1024
-    try:
-        with open(device,'rb') as f:
-            while True:
-                data = f.read(block_size)
-                if not data: break
-                if any(b!=0 for b in data):
-                    logf.write("Non-zero found during full verification\n")
-                    return False
-        return True
-    except Exception as e:
-        logf.write(f"Full verify failed: {e}\n")
+    logf.write(f"Read-back verification: {rb['bytes_checked']} bytes checked while writing\n")
+    if rb["unreadable"]:
+        logf.write(f"Unreadable sectors during read-back: {rb['unreadable'].describe()}\n")
+        record["unreadable"] = rb["unreadable"].as_list()
+    if rb["bytes_checked"] + rb["unreadable"].total < rb["end"] - rb["start"]:
+        logf.write("Read-back did not cover the whole pass.\n")
         return False
+    if rb["start"] > 0:
+        # a resumed pass only read back what it wrote itself
+        res = verify_pipelined(device, make_check(expected), start=0, end=rb["start"], cancel=cancel)
+        logf.write(f"Verification of the region before the resume point: "
+                   f"{'PASSED' if res.ok else 'FAILED'} ({res.bytes_checked} bytes)\n")
+        if res.unreadable:
+            logf.write(f"Unreadable sectors before the resume point: {res.unreadable.describe()}\n")
+            record["unreadable"] = record.get("unreadable", []) + res.unreadable.as_list()
+        return res.ok and not rb["unreadable"]
+    return not rb["unreadable"]
 
 # - Certificates -
 def write_certificate(device, method, log_file, status, verified_clean, extra):
@@ -452,9 +628,10 @@ def write_certificate(device, method, log_file, status, verified_clean, extra):
             "DataBackedUp": "Yes"
         },
         "SanitizationDetails": {
-            "MethodType": "Purge" if method == "auto" else "Clear",
+            "MethodType": (OVERWRITE_PLANS[method].category if method in OVERWRITE_PLANS
+                           else "Purge" if method == "auto" else "Clear"),
             "MethodUsed": method,
-            "NumberOfPasses": "3" if method == "shred" else "1",
+            "NumberOfPasses": str(len(OVERWRITE_PLANS[method].passes)) if method in OVERWRITE_PLANS else "1",
             "ToolUsed": f"NIST-Aware Wiper v{extra.get('execution_metadata', {}).get('version', VERSION)}",
             "VerificationMethod": extra.get("verification_method", "none"),
             "PostSanitizationClassification": "Unclassified" if verified_clean else "Failed"
@@ -464,40 +641,33 @@ def write_certificate(device, method, log_file, status, verified_clean, extra):
             "Details": f"Log file: {log_file}"
         }
     }
+    bad = extra.get("bad_ranges")
+    if bad:
+        # what is left in sectors that failed cannot be ruled out; only destruction sanitizes them
+        cert["SanitizationDetails"]["PostSanitizationClassification"] = "Failed (bad sectors)"
+        cert["MediaDestination"]["Option"] = "Destroy"
+        cert["MediaDestination"]["Details"] += (f"; {len(bad['unwritable'])} unwritable and "
+                                                f"{len(bad['unreadable'])} unreadable range(s) left unsanitized")
+    execution = extra.get("execution_metadata")
+    if execution:
+        cert["ExecutionMetadata"] = {
+            "Version": execution.get("version", VERSION),
+            "ScriptHash": execution.get("script_hash", ""),
+            "PhaseTimings": execution.get("phase_timings", {}),
+        }
+    if bad:
+        # [start, end) byte ranges that were skipped after repeated media errors
+        cert["SanitizationDetails"]["BadRanges"] = {
+            "Unwritable": bad["unwritable"],
+            "Unreadable": bad["unreadable"],
+        }
 
     return save_certificates(cert)
 
 
 # - Android -
-def collect_android_metadata():
-    meta = {}
-    meta['serial'] = run_cmd("adb get-serialno") or "unknown"
-    meta['model'] = run_cmd("adb shell getprop ro.product.model") or "unknown"
-    meta['manufacturer'] = run_cmd("adb shell getprop ro.product.manufacturer") or "unknown"
-    meta['android_version'] = run_cmd("adb shell getprop ro.build.version.release") or "unknown"
-    meta['bootloader_state'] = run_cmd("adb shell getprop ro.boot.verifiedbootstate") or "unknown"
-    meta['device_name'] = run_cmd("adb shell getprop ro.product.name") or "unknown"
-    return meta
-
-def wipe_android():
-    required = ["adb", "fastboot"]
-    for t in required:
-        if not check_dependency(t):
-            messagebox.showerror("Missing Tool", f"{t} not installed.")
-            return "failed", False, {}
-
-    run_cmd("adb start-server")
-    time.sleep(1)
-
-    serial = run_cmd("adb get-serialno")
-    if serial in [None, "unknown", ""]:
-        messagebox.showerror("No device", "Connect Android with USB debugging and authorize it.")
-        return "failed", False, {}
-
-    meta = collect_android_metadata()
-
-    sysmeta = collect_system_metadata()
-    extra_data = {
+def android_certificate(serial, meta, method, status, verified_clean, sysmeta):
+    extra = {
         "system_metadata": sysmeta,
         "device_metadata": meta,
         "verification_method": "none",
@@ -506,105 +676,299 @@ def wipe_android():
             "script_hash": script_sha256()
         }
     }
-    # --- END OF FIX ---
-
-    if meta['bootloader_state'].strip() == "green":
-        status = "bootloader_locked"
-
-        # --- START OF NEW FEATURE: ADB RECOVERY WIPE ---
-        try_recovery = messagebox.askyesno(
-            "Bootloader Locked",
-            f"{meta['manufacturer']} {meta['model']}\nBootloader is LOCKED. Fastboot wipe is not possible.\n\n"
-            "Do you want to attempt a non-Fastboot 'Recovery Mode' wipe?\n\n"
-            "WARNING: This is a standard factory reset and is less secure than a Fastboot erase. "
-            "It may not work on all devices."
-        )
-
-        if not try_recovery:
-            cert_path = write_certificate(
-                device="android",
-                method="none",
-                log_file="/tmp/wipe_android.log",
-                status=status,
-                verified_clean=False,
-                extra=extra_data
-            )
-            messagebox.showerror(
-                "Wipe Cancelled",
-                f"Bootloader is locked and recovery wipe was declined.\nMetadata saved at {cert_path}"
-            )
-            return status, False, meta
-
-        messagebox.showinfo("Recovery Wipe", "Attempting to reboot to recovery and trigger wipe...\nYour device will restart.")
-        run_cmd("adb reboot recovery")
-        time.sleep(5)
-
-        status = "android_recovery_wipe_attempted"
-        cert_path = write_certificate(
-            device="android",
-            method="adb_recovery_wipe",
-            log_file="/tmp/wipe_android.log",
-            status=status,
-            verified_clean=True,
-            extra=extra_data
-        )
-
-        messagebox.showinfo("Recovery Wipe Sent",
-                                  f"The command to factory reset via recovery has been sent.\n"
-                                  f"The device will now restart and should wipe itself.\n"
-                                  f"Certificate saved at {cert_path}")
-        return status, True, meta
-        # --- END OF NEW FEATURE ---
-
-    messagebox.showinfo("Rebooting", "Device will reboot to fastboot mode...")
-    run_cmd("adb reboot bootloader")
-
-    fastboot_id = None
-    for _ in range(300):
-        out = run_cmd("fastboot devices")
-        if out:
-            fastboot_id = out.split()[0]
-            break
-        time.sleep(1)
-
-    if not fastboot_id:
-        status = "fastboot_timeout"
-        cert_path = write_certificate(
-            device="android",
-            method="auto",
-            log_file="/tmp/wipe_android.log",
-            status=status,
-            verified_clean=False,
-            extra=extra_data
-        )
-        messagebox.showerror("Timeout", f"Device did not enter fastboot mode.\nMetadata saved at {cert_path}")
-        return status, False, meta
-
-    messagebox.showinfo("Wiping", "Wiping userdata + cache...")
-    run_cmd(f"fastboot -s {fastboot_id} erase userdata")
-    run_cmd(f"fastboot -s {fastboot_id} erase cache")
-    status = "android_wipe_done"
-
-    cert_path = write_certificate(
-        device="android",
-        method="auto",
+    return write_certificate(
+        device=f"android:{serial}",
+        method=method,
         log_file="/tmp/wipe_android.log",
         status=status,
-        verified_clean=True,
-        extra=extra_data
+        verified_clean=verified_clean,
+        extra=extra
     )
 
-    reboot = messagebox.askyesno("Done", f"Wipe complete.\nCertificate saved at:\n{cert_path}\nReboot now?")
-    if reboot:
-        run_cmd(f"fastboot -s {fastboot_id} reboot")
+@ata.suspend_hold()
+def wipe_android(serials=None, allow_recovery=False, reboot=True, log=print):
+    """
+    Wipe every connected, authorized phone (or only `serials`) and write one
+    certificate each. Never prompts: `allow_recovery` decides whether phones
+    with a locked bootloader get a recovery-mode reset instead of being
+    skipped, `reboot` whether erased phones leave fastboot afterwards.
+    Returns one summary dict per phone.
+    """
+    for t in ("adb", "fastboot"):
+        if not check_dependency(t):
+            log(f"{t} not installed.")
+            return []
+
+    # returns once the server is up
+    run_cmd(["adb", "start-server"])
+    phones = android.adb_devices()
+    for p in phones:
+        if p.state != "device":
+            log(f"Skipping {p.serial}: {p.state} (enable USB debugging and authorize this host)")
+    targets = [p.serial for p in phones if p.state == "device" and (not serials or p.serial in serials)]
+    if not targets:
+        log("No authorized Android device found.")
+        return []
+
+    metas = android.collect_metadata(targets)
+    sysmeta = collect_system_metadata()
+    results = {}
+
+    def finish(serial, method, status, verified_clean):
+        meta = metas[serial]
+        cert_path = android_certificate(serial, meta, method, status, verified_clean, sysmeta)
+        log(f"[{serial}] {meta['manufacturer']} {meta['model']}: {status} — {cert_path}")
+        results[serial] = {"serial": serial, "status": status, "verified_clean": verified_clean,
+                           "certificate": cert_path, "metadata": meta}
+
+    locked = [s for s in targets if android.is_locked(metas[s])]
+    unlocked = [s for s in targets if s not in locked]
+
+    if locked and allow_recovery:
+        # standard factory reset through recovery; weaker than a fastboot erase
+        log(f"Bootloader locked on {', '.join(locked)}: rebooting to recovery for a factory reset")
+        for serial, res in android.adb_reboot(locked, "recovery").items():
+            if res.ok:
+                finish(serial, "adb_recovery_wipe", "android_recovery_wipe_attempted", True)
+            else:
+                finish(serial, "none", "recovery_reboot_failed", False)
     else:
-        messagebox.showinfo("Manual Reboot", "Device left in fastboot. Use 'fastboot reboot'.")
+        for serial in locked:
+            finish(serial, "none", "bootloader_locked", False)
+
+    if unlocked:
+        log(f"Rebooting {len(unlocked)} phone(s) to fastboot...")
+        android.adb_reboot(unlocked, "bootloader")
+        ready = android.wait_for_fastboot(unlocked)
+        for serial in unlocked:
+            if serial not in ready:
+                finish(serial, "auto", "fastboot_timeout", False)
+
+        log(f"Erasing {', '.join(android.ERASE_PARTITIONS)} on {len(ready)} phone(s)...")
+        erased = []
+        for serial, outcome in android.erase(sorted(ready)).items():
+            failed, absent = android.erase_failures(outcome)
+            ok = not failed
+            if absent:
+                log(f"[{serial}] no {', '.join(absent)} partition on this phone; skipped")
+            for r in outcome:
+                if not r.ok and r.argv[-1] in failed:
+                    log(f"[{serial}] {' '.join(r.argv[3:])} failed: {(r.stderr or r.error or '').strip()}")
+            finish(serial, "auto", "android_wipe_done" if ok else "android_wipe_failed", ok)
+            if ok:
+                erased.append(serial)
+
+        if reboot:
+            android.fastboot_reboot(erased)
+        elif erased:
+            log("Phones left in fastboot. Use 'fastboot -s <serial> reboot'.")
+
+    return [results[s] for s in targets]
+
+# - Wipe pipeline -
+def open_wipe_log(device):
+    log_dir = '/var/log/NullBytes'
+    try:
+        os.makedirs(log_dir, exist_ok=True)
+    except PermissionError:
+        log_dir = '/tmp/NullBytes'
+        os.makedirs(log_dir, exist_ok=True)
+    return open(os.path.join(log_dir, f"wipe_{os.path.basename(device)}_{int(time.time())}.log"), 'w')
+
+
+def run_cert_tool(cert_path, log):
+    try:
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        cert_tool_path = os.path.join(script_dir, "..", "Cert_Tool", "main.py")
+
+        if os.path.exists(cert_tool_path):
+            log("Attempting to generate PDF/QR code...")
+            res = cmdexec.run([
+                sys.executable, cert_tool_path,
+                "--json", cert_path,
+                "--pdf-out", f"{cert_path}.pdf",
+                "--qr-out", f"{cert_path}.qr.png",
+                "--no-upload"
+            ], timeout=120)
+            if res.ok:
+                log("PDF/QR generation complete.")
+            else:
+                log(f"PDF/QR generation failed (rc={res.rc}): {(res.stderr or res.error or '').strip()}")
+        else:
+            log(f"Cert_Tool not found at {cert_tool_path}, skipping PDF/QR.")
+    except Exception as e:
+        log(f"Failed to generate PDF/QR: {e}")
+
+
+def run_wipe_job(job, log=print, progress=None):
+    """
+    Full pipeline for one scheduler.WipeJob: unmount, wipe, verify, write
+    the certificate and run Cert_Tool. `log` receives human-readable state
+    transitions; `progress`, if given, receives telemetry.ProgressEvents.
+    Phase timings end up in job.timings and the certificate; devices in
+    timing.PROFILE_DEVICES are profiled into <wipe log>.prof.
+    """
+    device, method, verify = job.device, job.method, job.verify
+    logf = open_wipe_log(device)
+    status = 'unknown'
+    verified_clean = False
+    timeline = timing.Timeline()
+    scope = contextlib.ExitStack()
+    try:
+        # a suspend/resume for a frozen ATA drive must wait for this job
+        scope.enter_context(ata.suspend_hold())
+        scope.enter_context(timing.bind(timeline))
+        if timing.should_profile(device):
+            if scope.enter_context(timing.profiled(logf.name + ".prof")) is not None:
+                log(f"Profiling this job into {logf.name}.prof")
+            else:
+                log("Another profiler is active; this job runs unprofiled")
+        log(f"Starting wipe on {device} with method '{method}' and verification '{verify}'")
+        logf.write(f"Wipe initiated at {datetime.now().isoformat()} on {device}\n")
+        timeline.phase("metadata")
+        sysmeta = collect_system_metadata()
+        devmeta = collect_device_metadata(device)
+        success = False
+
+        timeline.phase("unmount")
+        job.advance(scheduler.UNMOUNTING)
+        if not unmount_device(device, logf):
+            # a filesystem still in use would keep writing underneath the wipe
+            log("✗ Device is still in use; not wiping it (details in the wipe log)")
+            logf.write("Wipe aborted: the device could not be released.\n")
+            status = 'unmount_failed'
+            return job
+
+        timeline.phase("wipe")
+        job.advance(scheduler.WIPING)
+        wipe_record = {}
+        expected_label = 'zero'
+        sample_report = {}
+        if method == 'auto':
+            dtype = detect_device_type(device)
+            if dtype == 'ata':
+                success, status = ata_secure_erase(device, logf, progress=progress, cancel=job.cancel,
+                                                   record=wipe_record, verify=verify, idle=job.waiting)
+            elif dtype == 'nvme':
+                success, status = nvme_sanitize(device, logf, progress=progress)
+            else:
+                log("Auto method not applicable, falling back to Zero Fill")
+                logf.write("Auto method not applicable, falling back to Zero Fill.\n")
+                method = 'zero'
+        if method in ('zero', 'random', 'shred'):
+            success, status = overwrite_device(
+                device, method, logf,
+                progress=progress,
+                cancel=job.cancel, record=wipe_record, readback=verify == 'inline')
+
+        elif method == 'quick':
+            success, status = quick_wipe_usb(device, logf)
+
+        if job.cancel.is_set():
+            status = "cancelled_by_user"
+            success = False
+
+        if success:
+            log("✓ Wipe process completed successfully")
+            log(f"Starting verification: {verify}")
+            logf.write(f"Wipe successful. Starting verification: {verify}.\n")
+            timeline.phase("verify")
+            job.advance(scheduler.VERIFYING)
+            expected, expected_label = expected_pattern(wipe_record, logf)
+            if verify == 'none':
+                verified_clean = False
+                log("Verification skipped")
+            elif expected is False:
+                verified_clean = False
+                log(f"Final pattern ({expected_label}) is not reproducible; verification not possible")
+            elif verify == 'sampled':
+                # too short to be worth a calibration; use what an earlier one found
+                settings = tune.read_settings(device, probe=False)
+                verified_clean = verify_sampled(device, logf, expected=expected, report=sample_report,
+                                                depth=settings.queue_depth)
+                if "unreadable" in sample_report:
+                    wipe_record["unreadable"] = sample_report["unreadable"]
+                if "samples" in sample_report:
+                    expected_label += (f", {sample_report['samples']} samples, "
+                                       f"{sample_report['confidence']:.2%} confidence residual "
+                                       f"< {sample_report['residual_fraction']:.3%}")
+            elif verify == 'full':
+                settings = tune.read_settings(device, log=lambda text: logf.write(text + "\n"))
+                verified_clean = verify_full(device, logf, block_size=settings.block_size,
+                                             depth=settings.queue_depth, cancel=job.cancel,
+                                             expected=expected, report=wipe_record)
+            elif verify == 'inline':
+                verified_clean = verify_readback(device, wipe_record, expected, logf, cancel=job.cancel)
+                expected_label += ", read back while writing" if wipe_record.get("readback") else ""
+
+            bad_bytes = sum(e - b for b, e in
+                            wipe_record.get("bad_ranges", []) + wipe_record.get("unreadable", []))
+            if verified_clean and bad_bytes:
+                # sectors that could not be written or read back may still hold data
+                verified_clean = False
+                logf.write(f"{bad_bytes} bytes in bad sectors could not be sanitized; the drive cannot be reused.\n")
+            if verify != 'none':
+                result_text = "✓ PASSED" if verified_clean else "✗ FAILED"
+                log(f"Verification result: {result_text}")
+                logf.write(f"Verification result: {'PASSED' if verified_clean else 'FAILED'}\n")
+
+                if verified_clean and method in ('zero', 'random', 'shred'):
+                    log("Verification passed. Formatting device for reuse...")
+                    logf.write("Verification passed. Formatting device for reuse...\n")
+
+        else:
+            log(f"✗ Wipe failed. Status: {status}")
+            logf.write(f"Wipe failed with status: {status}\n")
+
+        timeline.phase("certificate")
+        job.advance(scheduler.CERTIFYING)
+        extra = {
+            "system_metadata": sysmeta,
+            "device_metadata": devmeta,
+            "verification_method": verify if verify == 'none' else f"{verify} ({expected_label})",
+            "execution_metadata": {
+                "version": VERSION,
+                "script_hash": script_sha256(),
+                # phases up to here; writing the certificate and Cert_Tool come after
+                "phase_timings": timeline.totals(),
+            }
+        }
+        if wipe_record.get("bad_ranges") or wipe_record.get("unreadable"):
+            extra["bad_ranges"] = {
+                "unwritable": wipe_record.get("bad_ranges", []),
+                "unreadable": wipe_record.get("unreadable", []),
+            }
+        cert_path = write_certificate(device, method, logf.name, status, verified_clean, extra)
+        job.cert_path = cert_path
+        log(f"─── Process Finished ───")
+        log(f"Certificate written to: {cert_path}")
+        timeline.phase("cert_tool")
+        run_cert_tool(cert_path, log)
+        job.success = success
 
-    return status, True, meta
+    except Exception as e:
+        log(f"✗ Unexpected error: {e}")
+        logf.write(f"FATAL ERROR: {e}\n")
+        job.error = e
+    finally:
+        timeline.finish()
+        scope.close()
+        job.status = status
+        job.verified_clean = verified_clean
+        job.timings = timeline.as_dict()
+        logf.write("Phase timings: " + ", ".join(f"{name} {seconds:.2f}s"
+                                                 for name, seconds in job.timings["phases"].items()) + "\n")
+        logf.close()
+    return job
 
 # - GUI -
+UI_POLL_MS = 16  # ~60 fps
+UI_FRAME_BUDGET = 0.008
+MAX_LOG_LINES = 5000
+
 class WipeApp:
     def __init__(self):
+        load_tk()
         self.root = tk.Tk()
 
         BG_COLOR = "#0f0f0f"  # Pure dark
@@ -628,8 +992,11 @@ class WipeApp:
         self.root.update_idletasks()
         self.root.wm_aspect(16, 9, 16, 9)
 
-        self.cancel_flag = threading.Event()
-        self.current_process = None
+        # Worker threads never touch widgets; they post callables here and
+        # drain_ui_queue runs them on the Tk thread in batches.
+        self.ui_queue = queue.Queue()
+        self.scheduler = scheduler.WipeScheduler(self.run_job)
+        self.scheduler.on_change(lambda job: self.post(self.on_job_change, job, job.state))
 
         style = ttk.Style(self.root)
         style.theme_use("clam")
@@ -927,6 +1294,10 @@ class WipeApp:
                                      command=self.cancel, state='disabled', style='Secondary.TButton')
         self.cancel_btn.pack(side='left', padx=(0, 15))
 
+        self.batch_btn = ttk.Button(right_actions, text="Wipe All Drives",
+                                    command=self.start_batch, style='Secondary.TButton')
+        self.batch_btn.pack(side='left', padx=(0, 15))
+
         self.start_btn = ttk.Button(right_actions, text="Start Wipe",
                                     command=self.start, style='Danger.TButton')
         self.start_btn.pack(side='left')
@@ -947,6 +1318,14 @@ class WipeApp:
         tk.Label(log_header, text="REAL-TIME OUTPUT", bg=CARD_BG, fg='#666666',
                 font=('Inter', 9, 'bold')).pack(side='right')
 
+        # Live per-device progress; redrawn in place instead of appended to the log
+        self.progress_lines = {}
+        self.progress_label = tk.Label(log_inner, text="", bg=CARD_BG, fg=ACCENT_PRIMARY,
+                                       justify='left', anchor='w', font=("JetBrains Mono", 9))
+        self.progress_label.pack(fill='x', pady=(0, 10))
+        self.progress_coalescer = Coalescer(lambda ev: self.post(self.show_progress, ev),
+                                            interval=UI_INTERVAL)
+
         log_container = tk.Frame(log_inner, bg=TEXT_BG)
         log_container.pack(fill='both', expand=True)
 
@@ -977,6 +1356,42 @@ class WipeApp:
         self.refresh_devices()
         self.startup_loader.stop()
         self.startup_loader.destroy()
+        self.root.after(UI_POLL_MS, self.drain_ui_queue)
+        hotplug.watcher().subscribe(self.on_hotplug)
+
+    # - Main-thread dispatch -
+    def post(self, fn, *args):
+        """Run fn(*args) on the Tk thread. Safe to call from any thread."""
+        self.ui_queue.put((fn, args))
+
+    def drain_ui_queue(self):
+        """Apply queued UI work in one batch per frame; log lines are inserted together."""
+        lines = []
+        deadline = time.monotonic() + UI_FRAME_BUDGET
+        try:
+            while time.monotonic() < deadline:
+                try:
+                    fn, args = self.ui_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if fn is None:
+                    lines.append(args[0])
+                    continue
+                if lines:
+                    self.insert_log_lines(lines)
+                    lines = []
+                fn(*args)
+        finally:
+            if lines:
+                self.insert_log_lines(lines)
+            self.root.after(UI_POLL_MS, self.drain_ui_queue)
+
+    def insert_log_lines(self, lines):
+        self.log.insert(tk.END, "".join(lines))
+        excess = int(self.log.index('end-1c').split('.')[0]) - MAX_LOG_LINES
+        if excess > 0:
+            self.log.delete('1.0', f'{excess + 1}.0')
+        self.log.see(tk.END)
 
     def update_methods_for_device(self, device_label):
         for btn in self.method_buttons:
@@ -1039,7 +1454,8 @@ class WipeApp:
         else:
             options = [('None', 'none'),
                        ('Sampled — Fast random block check', 'sampled'),
-                       ('Full — Complete verification (slow)', 'full')]
+                       ('Full — Complete verification (slow)', 'full'),
+                       ('Inline — Read back while writing (overwrite methods)', 'inline')]
 
         self.verify_var.set(options[0][1])
         for text, val in options:
@@ -1051,22 +1467,27 @@ class WipeApp:
 
     def append_log(self, text):
         ts = datetime.now().strftime("%H:%M:%S")
-        self.log.insert(tk.END, f"[{ts}] {text}\n")
-        self.log.see(tk.END)
+        self.ui_queue.put((None, (f"[{ts}] {text}\n",)))
 
     def refresh_devices(self):
-        self.devices = list_block_devices()
+        self.devices = list_block_devices(refresh=True)
         labels = []
         for d, info in self.devices:
             dtype = detect_device_type(d)
             labels.append(f"{d} ({dtype.upper()}) — {info}")
         labels.append('Android (ADB)')
+        current = self.device_combo.get()
         self.device_combo['values'] = labels
-        if labels:
+        if labels and current not in labels:
             self.device_combo.set(labels[0])
             self.on_device_selected(None)
         self.device_combo.bind("<<ComboboxSelected>>", self.on_device_selected)
 
+    def on_hotplug(self, event):
+        # runs on the watcher thread; partitions churn during wipes, only disks matter
+        if event.devtype == 'disk' and event.action in ('add', 'remove'):
+            self.post(self.refresh_devices)
+
     def on_device_selected(self, event):
         sel = self.device_combo.get()
         if sel:
@@ -1182,12 +1603,7 @@ class WipeApp:
         self.cancel_btn.configure(state='disabled')
 
     def cancel(self):
-        self.cancel_flag.set()
-        if self.current_process:
-            try:
-                self.current_process.terminate()
-            except ProcessLookupError:
-                pass
+        self.scheduler.cancel_all()
         self.append_log('User requested cancel. Operation terminating...')
 
     def start(self):
@@ -1202,185 +1618,105 @@ class WipeApp:
                 return
         else:
              if not messagebox.askyesno("Confirm Wipe",
-                f"Are you absolutely sure you want to wipe:\n\n{sel}\n\n⚠️  This will attempt to factory reset the connected Android device."):
+                f"Are you absolutely sure you want to wipe:\n\n{sel}\n\n⚠️  This will attempt to factory reset every connected Android device."):
                 return
 
         method = self.method_var.get()
         verify = self.verify_var.get()
 
-        self.log.delete('1.0', tk.END)
-        self.cancel_flag.clear()
+        if not self.scheduler.active():
+            self.log.delete('1.0', tk.END)
 
         if sel == 'Android (ADB)':
-            threading.Thread(target=self.run_android, daemon=True).start()
+            # every decision is taken here, so the worker never opens a dialog
+            allow_recovery = messagebox.askyesno(
+                "Locked Bootloaders",
+                "Phones with a LOCKED bootloader cannot be erased through Fastboot.\n\n"
+                "Attempt a non-Fastboot 'Recovery Mode' wipe on them instead?\n\n"
+                "WARNING: This is a standard factory reset and is less secure than a Fastboot erase. "
+                "It may not work on all devices.")
+            reboot = messagebox.askyesno("Reboot", "Reboot the phones once the wipe is complete?")
+            threading.Thread(target=self.run_android, args=(allow_recovery, reboot), daemon=True).start()
         else:
-            device = sel.split()[0]
-            threading.Thread(target=self.run_wipe, args=(device, method, verify), daemon=True).start()
-
-    def run_android(self):
-        self.lock_ui()
-        self.append_log("Starting Android wipe process...")
-        try:
-            status, verified, meta = wipe_android()
-            self.append_log(f"Android wipe finished: {status}, verified: {verified}")
-        except Exception as e:
-            self.append_log(f"✗ UNHANDLED ANDROID ERROR: {e}")
-            self.append_log(f"Traceback: {traceback.format_exc()}")
-            messagebox.showerror("Fatal Error", f"An unexpected error occurred during the Android wipe: {e}")
-        finally:
-            self.unlock_ui()
+            self.submit_job(sel.split()[0], method, verify)
+
+    def start_batch(self):
+        # never the disks the running system lives on (root, boot, swap)
+        devices, excluded = [], []
+        for d, _ in self.devices:
+            in_use = mounts.system_use(d)
+            if in_use:
+                excluded.append(f"{d} ({', '.join(in_use)})")
+            else:
+                devices.append(d)
+        if not devices:
+            messagebox.showwarning('No devices', 'No block devices found that are safe to wipe')
+            return
+        note = ("\n\nExcluded, in use by this system:\n" + "\n".join(excluded)) if excluded else ""
+        if not messagebox.askyesno("Confirm Batch Wipe",
+            "Are you absolutely sure you want to wipe ALL of these drives:\n\n" + "\n".join(devices) + note +
+            "\n\n⚠️  This action is IRREVERSIBLE and will destroy all data."):
+            return
+        # Device-specific methods (quick) don't apply across a batch
+        method = self.method_var.get()
+        if method not in ('zero', 'random', 'shred'):
+            method = 'auto'
+        for device in devices:
+            self.submit_job(device, method, self.verify_var.get())
 
-    def run_wipe(self, device, method, verify):
-        self.lock_ui()
-        log_dir = '/var/log/NullBytes'
-        try:
-            os.makedirs(log_dir, exist_ok=True)
-        except PermissionError:
-            log_dir = '/tmp/NullBytes'
-            os.makedirs(log_dir, exist_ok=True)
-
-        logf = open(os.path.join(log_dir, f"wipe_{os.path.basename(device)}_{int(time.time())}.log"), 'w')
-        status = 'unknown'
-        verified_clean = False
+    def submit_job(self, device, method, verify):
         try:
-            self.append_log(f"Starting wipe on {device} with method '{method}' and verification '{verify}'")
-            logf.write(f"Wipe initiated at {datetime.now().isoformat()} on {device}\n")
-            sysmeta = collect_system_metadata()
-            devmeta = collect_device_metadata(device)
-            success = False
+            self.scheduler.submit(device, method, verify)
+        except ValueError as e:
+            messagebox.showwarning('Busy', str(e))
+            return
+        self.cancel_btn.configure(state='normal')
 
-            unmount_success = unmount_device(device, logf)
-            if not unmount_success:
-                self.append_log("WARNING: Could not unmount all partitions. Continuing anyway.")
-                logf.write("WARNING: Could not unmount all partitions. Continuing anyway.\n")
-
-            if method == 'auto':
-                dtype = detect_device_type(device)
-                if dtype == 'ata':
-                    success, status = ata_secure_erase(device, logf)
-                elif dtype == 'nvme':
-                    success, status = nvme_sanitize(device, logf)
-                else:
-                    self.append_log("Auto method not applicable, falling back to Zero Fill")
-                    logf.write("Auto method not applicable, falling back to Zero Fill.\n")
-                    method = 'zero'
-            if method in ('zero', 'random', 'shred'):
-                cmd = {
-                    'zero': dd_zero_cmd(device),
-                    'random': dd_random_cmd(device),
-                    'shred': shred_zero_cmd(device)
-                }[method]
-
-                self.current_process = subprocess.Popen(cmd, shell=True,
-                                                        stdout=subprocess.PIPE,
-                                                        stderr=subprocess.STDOUT,
-                                                        text=True)
-
-                success = True
-                for line in self.current_process.stdout:
-                    logf.write(line)
-                    self.append_log(line.strip())
-
-                    if "No space left on device" in line:
-                        self.append_log("Reached end of device (normal for dd)")
-                        success = True
-                        try:
-                            self.current_process.kill()
-                        except Exception:
-                            pass
-                        break
-
-                    if self.cancel_flag.is_set():
-                        success = False
-                        break
-
-                self.current_process.wait()
-                if not success:
-                    success = (self.current_process.returncode == 0) and not self.cancel_flag.is_set()
-                status = {
-                    'zero': 'dd_zero_ok',
-                    'random': 'dd_random_ok',
-                    'shred': 'shred_ok'
-                }[method] if success else {
-                    'zero': 'dd_zero_failed',
-                    'random': 'dd_random_failed',
-                    'shred': 'shred_failed'
-                }[method]
-
-            elif method == 'quick':
-                success, status = quick_wipe_usb(device, logf)
-
-            if self.cancel_flag.is_set():
-                status = "cancelled_by_user"
-                success = False
-
-            if success:
-                self.append_log("✓ Wipe process completed successfully")
-                self.append_log(f"Starting verification: {verify}")
-                logf.write(f"Wipe successful. Starting verification: {verify}.\n")
-                if verify == 'none':
-                    verified_clean = False
-                    self.append_log("Verification skipped")
-                elif verify == 'sampled':
-                    verified_clean = verify_sampled(device, logf)
-                elif verify == 'full':
-                    verified_clean = verify_full(device, logf)
-
-                if verify != 'none':
-                    result_text = "✓ PASSED" if verified_clean else "✗ FAILED"
-                    self.append_log(f"Verification result: {result_text}")
-                    logf.write(f"Verification result: {'PASSED' if verified_clean else 'FAILED'}\n")
-
-                    if verified_clean and method in ('zero', 'random', 'shred'):
-                        self.append_log("Verification passed. Formatting device for reuse...")
-                        logf.write("Verification passed. Formatting device for reuse...\n")
+    def run_job(self, job):
+        name = os.path.basename(job.device)
+        run_wipe_job(job, log=lambda text: self.append_log(f"[{name}] {text}"),
+                     progress=self.progress_coalescer.push)
 
-            else:
-                self.append_log(f"✗ Wipe failed. Status: {status}")
-                logf.write(f"Wipe failed with status: {status}\n")
-
-            extra = {
-                "system_metadata": sysmeta,
-                "device_metadata": devmeta,
-                "verification_method": verify,
-                "execution_metadata": {
-                    "version": VERSION,
-                    "script_hash": script_sha256()
-                }
-            }
-            cert_path = write_certificate(device, method, logf.name, status, verified_clean, extra)
-            self.append_log(f"─── Process Finished ───")
-            self.append_log(f"Certificate written to: {cert_path}")
-            messagebox.showinfo("Operation Complete", f"Operation on {device} has finished.\n\nCertificate saved to:\n{cert_path}")
+    def show_progress(self, event):
+        # one line per running pass; overlapped passes of a device show side by side
+        if event.final:
+            self.progress_lines.pop(event.key, None)
+        else:
+            self.progress_lines[event.key] = f"[{os.path.basename(event.device)}] {event.describe()}"
+        self.progress_label.configure(text="\n".join(self.progress_lines.values()))
 
-            try:
-                script_dir = os.path.dirname(os.path.abspath(__file__))
-                cert_tool_path = os.path.join(script_dir, "..", "Cert_Tool", "main.py")
-
-                if os.path.exists(cert_tool_path):
-                    self.append_log("Attempting to generate PDF/QR code...")
-                    subprocess.run([
-                        "python3", cert_tool_path,
-                        "--json", cert_path,
-                        "--pdf-out", f"{cert_path}.pdf",
-                        "--qr-out", f"{cert_path}.qr.png",
-                        "--no-upload"
-                    ], capture_output=True)
-                    self.append_log("PDF/QR generation complete.")
-                else:
-                    self.append_log(f"Cert_Tool not found at {cert_tool_path}, skipping PDF/QR.")
-            except Exception as e:
-                self.append_log(f"Failed to generate PDF/QR: {e}")
+    def on_job_change(self, job, state):
+        self.append_log(f"[{os.path.basename(job.device)}] state: {state}")
+        if not job.finished:
+            return
+        for key in [k for k in self.progress_lines if k[0] == job.device]:
+            del self.progress_lines[key]
+        self.progress_label.configure(text="\n".join(self.progress_lines.values()))
+        if self.scheduler.active():
+            return
+        self.cancel_btn.configure(state='disabled')
+        finished = [j for j in self.scheduler.jobs if j.cert_path]
+        lines = "\n".join(f"{j.device}: {j.state} — {j.cert_path}" for j in finished)
+        self.scheduler.forget_finished()
+        messagebox.showinfo("Operation Complete", f"All queued operations have finished.\n\nCertificates:\n{lines}")
 
+    def run_android(self, allow_recovery, reboot):
+        self.post(self.lock_ui)
+        self.append_log("Starting Android wipe process...")
+        try:
+            results = wipe_android(allow_recovery=allow_recovery, reboot=reboot, log=self.append_log)
+            lines = "\n".join(f"{r['serial']}: {r['status']}" for r in results) or "No phones were wiped."
+            self.post(messagebox.showinfo, "Android Wipe Complete", lines)
         except Exception as e:
-            self.append_log(f"✗ Unexpected error: {e}")
-            logf.write(f"FATAL ERROR: {e}\n")
+            self.append_log(f"✗ UNHANDLED ANDROID ERROR: {e}")
+            self.append_log(f"Traceback: {traceback.format_exc()}")
+            self.post(messagebox.showerror, "Fatal Error",
+                      f"An unexpected error occurred during the Android wipe: {e}")
         finally:
-            logf.close()
-            self.unlock_ui()
-            self.current_process = None
+            self.post(self.unlock_ui)
 
 if __name__=='__main__':
+    load_tk()
     if not is_root():
         try:
             root = tk.Tk()
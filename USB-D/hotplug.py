@@ -0,0 +1,194 @@
+"""
+Block device hotplug watcher.
+
+Listens for kernel uevents on a NETLINK_KOBJECT_UEVENT socket and turns
+them into DeviceEvents (add / remove / change) for subscribers. Waits such
+as "until sdb1 exists" block on the watcher instead of polling /dev, so
+they return as soon as the kernel announces the node. Where netlink is not
+available the watcher falls back to diffing /sys/class/block periodically.
+"""
+import os
+import socket
+import threading
+import time
+from collections import namedtuple
+
+import discovery
+
+NETLINK_KOBJECT_UEVENT = 15
+SYS_CLASS_BLOCK = "/sys/class/block"
+POLL_INTERVAL = 0.5
+
+DeviceEvent = namedtuple("DeviceEvent", ["action", "name", "devtype", "parent"])
+
+
+def parse_uevent(data):
+    """Kernel uevent datagram -> dict of its KEY=value fields (None if not a uevent)."""
+    parts = data.split(b"\0")
+    if not parts or b"@" not in parts[0]:
+        return None
+    fields = {}
+    for part in parts[1:]:
+        key, sep, value = part.partition(b"=")
+        if sep:
+            fields[key.decode(errors="replace")] = value.decode(errors="replace")
+    return fields
+
+
+def parent_disk(name):
+    """'sdb1' -> 'sdb', 'nvme0n1p2' -> 'nvme0n1'; disks return themselves."""
+    path = os.path.join(SYS_CLASS_BLOCK, name)
+    if os.path.exists(os.path.join(path, "partition")):
+        return os.path.basename(os.path.dirname(os.path.realpath(path)))
+    return name
+
+
+def partitions(disk):
+    """Partition device nodes of `disk`, from sysfs (so 'sda' never matches 'sdaa')."""
+    base = os.path.join(discovery.SYS_BLOCK, os.path.basename(disk))
+    try:
+        names = sorted(os.listdir(base))
+    except OSError:
+        return []
+    return ["/dev/" + n for n in names
+            if os.path.exists(os.path.join(base, n, "partition")) and os.path.exists("/dev/" + n)]
+
+
+class DeviceWatcher:
+    def __init__(self, poll_interval=POLL_INTERVAL):
+        self.poll_interval = poll_interval
+        self._subscribers = []
+        self._cond = threading.Condition()
+        self._seq = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self.mode = None
+
+    def subscribe(self, fn):
+        """fn(DeviceEvent) is called on the watcher thread for every event."""
+        self._subscribers.append(fn)
+        return fn
+
+    def unsubscribe(self, fn):
+        if fn in self._subscribers:
+            self._subscribers.remove(fn)
+
+    def start(self):
+        if self._thread is not None:
+            return self
+        try:
+            sock = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM, NETLINK_KOBJECT_UEVENT)
+            sock.bind((0, 1))
+            sock.settimeout(1.0)
+            self.mode = "netlink"
+            target, args = self._netlink_loop, (sock,)
+        except (OSError, AttributeError):
+            self.mode = "poll"
+            target, args = self._poll_loop, ()
+        self._thread = threading.Thread(target=target, args=args, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _notify(self):
+        with self._cond:
+            self._seq += 1
+            self._cond.notify_all()
+
+    def _dispatch(self, event):
+        discovery.invalidate(event.parent)
+        self._notify()
+        for fn in list(self._subscribers):
+            try:
+                fn(event)
+            except Exception:
+                pass
+
+    def _netlink_loop(self, sock):
+        with sock:
+            while not self._stop.is_set():
+                try:
+                    data = sock.recv(65536)
+                except socket.timeout:
+                    continue
+                except OSError:
+                    # e.g. ENOBUFS after an event storm: resync everything
+                    discovery.invalidate()
+                    continue
+                fields = parse_uevent(data)
+                if fields and fields.get("SUBSYSTEM") == "usb":
+                    # phones re-enumerating (adb -> fastboot); only wakes waiters
+                    self._notify()
+                    continue
+                if not fields or fields.get("SUBSYSTEM") != "block" or "DEVNAME" not in fields:
+                    continue
+                name = os.path.basename(fields["DEVNAME"])
+                devtype = fields.get("DEVTYPE", "disk")
+                parent = name if devtype == "disk" else os.path.basename(
+                    os.path.dirname(fields.get("DEVPATH", "")))
+                self._dispatch(DeviceEvent(fields.get("ACTION", "change"), name, devtype, parent))
+
+    def _poll_loop(self):
+        try:
+            known = set(os.listdir(SYS_CLASS_BLOCK))
+        except OSError:
+            # no baseline yet; the first listing that works becomes it, so
+            # disks that were already there are not reported as inserted
+            known = None
+        while not self._stop.wait(self.poll_interval):
+            try:
+                now = set(os.listdir(SYS_CLASS_BLOCK))
+            except OSError:
+                continue
+            if known is None:
+                known = now
+                continue
+            for name in sorted(now - known):
+                devtype = "partition" if parent_disk(name) != name else "disk"
+                self._dispatch(DeviceEvent("add", name, devtype, parent_disk(name)))
+            for name in sorted(known - now):
+                self._dispatch(DeviceEvent("remove", name, "unknown", name))
+            known = now
+
+    def wait_until(self, predicate, timeout, recheck=None):
+        """
+        Re-evaluate `predicate()` after every event until it returns something
+        truthy or `timeout` seconds pass; returns the last value. Without an
+        event the predicate is re-checked every `recheck` seconds (default:
+        the poll interval).
+        """
+        recheck = recheck or self.poll_interval
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                seq = self._seq
+                value = predicate()
+                remaining = deadline - time.monotonic()
+                if value or remaining <= 0:
+                    return value
+                # bounded wait in case an event raced the check
+                self._cond.wait_for(lambda: self._seq != seq, min(remaining, recheck))
+
+
+_watcher = None
+_watcher_lock = threading.Lock()
+
+
+def watcher():
+    """Process-wide watcher, started on first use."""
+    global _watcher
+    with _watcher_lock:
+        if _watcher is None:
+            _watcher = DeviceWatcher().start()
+        return _watcher
+
+
+def wait_for_partition(disk, timeout):
+    """First partition node of `disk`, waiting up to `timeout` seconds for one to appear."""
+    found = watcher().wait_until(lambda: partitions(disk), timeout)
+    return found[0] if found else None
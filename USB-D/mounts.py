@@ -0,0 +1,273 @@
+"""
+Mount and holder resolution for a disk that is about to be wiped.
+
+The set of block devices that depend on a disk is read from sysfs: its
+partitions, then whatever sits on top of them through holders/ (device
+mapper for LVM and dm-crypt, md arrays), recursively. The mounts to
+release come from /proc/self/mountinfo, matched by major:minor, plus any
+mounts nested under them. They are unmounted children-first, with each
+level in parallel, and then the holders are torn down top-down. Completion
+is read back from the kernel: mountinfo is re-read after every step
+(waiting on its change notification), and holders/ must end up empty.
+Nothing sleeps for a fixed time.
+"""
+import os
+import select
+import time
+from collections import namedtuple
+
+import cmdexec
+
+SYS_CLASS_BLOCK = "/sys/class/block"
+MOUNTINFO = "/proc/self/mountinfo"
+SWAPS = "/proc/swaps"
+UMOUNT_TIMEOUT = 30
+SETTLE_TIMEOUT = 5.0
+# a disk backing one of these runs the host; never queue it for a wipe
+SYSTEM_MOUNTS = ("/", "/boot", "/boot/efi", "/efi", "/usr", "/var")
+
+Mount = namedtuple("Mount", ["mount_id", "parent_id", "devnum", "root", "mountpoint", "fstype", "source"])
+
+
+def _unescape(field):
+    # mountinfo escapes space, tab, newline and backslash as \ooo
+    if "\\" not in field:
+        return field
+    return field.encode().decode("unicode_escape").encode("latin-1").decode(errors="replace")
+
+
+def parse_mountinfo(text):
+    mounts = []
+    for line in text.splitlines():
+        left, sep, right = line.partition(" - ")
+        fields = left.split()
+        if not sep or len(fields) < 5:
+            continue
+        tail = right.split()
+        mounts.append(Mount(int(fields[0]), int(fields[1]), fields[2], _unescape(fields[3]),
+                            _unescape(fields[4]), tail[0] if tail else "",
+                            _unescape(tail[1]) if len(tail) > 1 else ""))
+    return mounts
+
+
+def read_mountinfo():
+    with open(MOUNTINFO) as f:
+        return parse_mountinfo(f.read())
+
+
+def _sysfs(name, *parts):
+    return os.path.join(SYS_CLASS_BLOCK, name, *parts)
+
+
+def _listdir(path):
+    try:
+        return sorted(os.listdir(path))
+    except OSError:
+        return []
+
+
+def devnum(name):
+    try:
+        with open(_sysfs(name, "dev")) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def partitions(name):
+    return [n for n in _listdir(os.path.join(SYS_CLASS_BLOCK, name))
+            if os.path.exists(_sysfs(n, "partition"))]
+
+
+def holders(name):
+    return _listdir(_sysfs(name, "holders"))
+
+
+def stack(disk):
+    """
+    Block device names built on `disk`, the disk itself included, ordered so
+    that every device comes after everything it sits on (disk first, the
+    topmost dm / md device last).
+    """
+    below = {}
+    pending = [os.path.basename(disk)]
+    below[pending[0]] = set()
+    while pending:
+        name = pending.pop()
+        for child in partitions(name) + holders(name):
+            if child not in below:
+                below[child] = set()
+                pending.append(child)
+            below[child].add(name)
+
+    depth = {}
+
+    def level(name):
+        # a holder built on two of our devices (md over sdb1+sdb2) sits above both
+        if name not in depth:
+            depth[name] = 0
+            depth[name] = max([level(n) + 1 for n in below[name]] or [0])
+        return depth[name]
+
+    return sorted(below, key=lambda n: (level(n), n))
+
+
+def swaps():
+    """Active swap device paths."""
+    try:
+        with open(SWAPS) as f:
+            return [line.split()[0] for line in f.read().splitlines()[1:] if line.strip()]
+    except OSError:
+        return []
+
+
+def mounts_on(names, mounts=None):
+    """Mounts of the given block devices plus everything mounted beneath them."""
+    mounts = read_mountinfo() if mounts is None else mounts
+    nums = {devnum(n) for n in names} - {None}
+    found = {m.mount_id: m for m in mounts if m.devnum in nums}
+    grew = True
+    while grew:
+        grew = False
+        for m in mounts:
+            if m.mount_id not in found and m.parent_id in found:
+                found[m.mount_id] = m
+                grew = True
+    return list(found.values())
+
+
+def system_use(disk, mounts=None):
+    """
+    What on `disk` (or on anything built on it) the running host depends on:
+    root, boot and other SYSTEM_MOUNTS, and active swap. Empty if nothing.
+    """
+    names = stack(disk)
+    mounts = read_mountinfo() if mounts is None else mounts
+    nums = {devnum(n): n for n in names}
+    nums.pop(None, None)
+    found = [f"{m.mountpoint} on {nums[m.devnum]}" for m in mounts
+             if m.devnum in nums and m.mountpoint in SYSTEM_MOUNTS]
+    found += [f"swap on {s}" for s in swaps() if os.path.basename(os.path.realpath(s)) in names]
+    return found
+
+
+def in_use(disk, mounts=None):
+    """Mounts, active swap and holders on `disk` or its partitions; empty if it is idle."""
+    names = stack(disk)
+    found = [f"{m.source or m.devnum} mounted on {m.mountpoint}" for m in mounts_on(names, mounts)]
+    found += [f"swap on {s}" for s in swaps() if os.path.basename(os.path.realpath(s)) in names]
+    disk_name = os.path.basename(disk)
+    for name in (disk_name, *partitions(disk_name)):
+        found += [f"{name} held by {h}" for h in holders(name)]
+    return found
+
+
+def unmount_levels(targets):
+    """Split `targets` into batches; each batch only holds mounts with no target mounted beneath."""
+    remaining = {m.mount_id: m for m in targets}
+    levels = []
+    while remaining:
+        parents = {m.parent_id for m in remaining.values()}
+        level = [m for m in remaining.values() if m.mount_id not in parents]
+        if not level:
+            # shadowed/looping entries: fall back to deepest path first
+            level = [max(remaining.values(), key=lambda m: m.mountpoint.count("/"))]
+        levels.append(level)
+        for m in level:
+            del remaining[m.mount_id]
+    return levels
+
+
+def wait_mountinfo_change(timeout):
+    """Block until the mount table changes (POLLPRI on mountinfo) or `timeout` passes."""
+    try:
+        with open(MOUNTINFO) as f:
+            f.read()
+            poller = select.poll()
+            poller.register(f, select.POLLPRI | select.POLLERR)
+            return bool(poller.poll(timeout * 1000))
+    except (OSError, ValueError):
+        time.sleep(min(timeout, 0.1))
+        return False
+
+
+def _wait_gone(mount_ids, timeout=SETTLE_TIMEOUT):
+    deadline = time.monotonic() + timeout
+    while True:
+        left = [m for m in read_mountinfo() if m.mount_id in mount_ids]
+        remaining = deadline - time.monotonic()
+        if not left or remaining <= 0:
+            return left
+        wait_mountinfo_change(remaining)
+
+
+def users_of(mountpoint, timeout=UMOUNT_TIMEOUT):
+    """PIDs with files open on the filesystem at `mountpoint` (fuser -m); empty if unknown."""
+    return cmdexec.run(["fuser", "-m", mountpoint], timeout=timeout).stdout.split()
+
+
+def _holder_cmd(name):
+    if name.startswith("dm-"):
+        try:
+            with open(_sysfs(name, "dm", "name")) as f:
+                return ["dmsetup", "remove", f.read().strip()]
+        except OSError:
+            return ["dmsetup", "remove", "/dev/" + name]
+    if name.startswith("md"):
+        return ["mdadm", "--stop", "/dev/" + name]
+    return None
+
+
+def release(disk, log=lambda text: None, timeout=UMOUNT_TIMEOUT):
+    """
+    Unmount everything on `disk` (partitions, LVM / dm-crypt / md on top of
+    it, nested mounts), turn off swap on it, and deactivate its holders.
+    Returns the list of problems left over; empty means the disk is free.
+    """
+    names = stack(disk)
+    problems = []
+
+    active_swaps = {os.path.realpath(s) for s in swaps()}
+    swap_on = [f"/dev/{n}" for n in names if f"/dev/{n}" in active_swaps]
+    for dev, res in zip(swap_on, cmdexec.run_many([["swapoff", d] for d in swap_on], timeout=timeout)):
+        log(f"swapoff {dev}: {'ok' if res.ok else res.stderr.strip() or res.error}")
+        if not res.ok:
+            problems.append(f"swap still active on {dev}")
+
+    targets = mounts_on(names)
+    for level in unmount_levels(targets):
+        cmds = [["umount", m.mountpoint] for m in level]
+        unmounted = set()
+        for m, res in zip(level, cmdexec.run_many(cmds, timeout=timeout)):
+            log(f"Unmounting {m.source} from {m.mountpoint}")
+            if res.ok:
+                unmounted.add(m.mount_id)
+                continue
+            # never detach lazily: the filesystem would stay live, with its
+            # writers, underneath the wipe
+            users = users_of(m.mountpoint, timeout)
+            log(f"umount {m.mountpoint} failed: {res.stderr.strip() or res.error}"
+                + (f" (in use by PIDs {' '.join(users)})" if users else ""))
+            problems.append(f"{m.mountpoint} busy")
+        left = _wait_gone(unmounted)
+        problems += [f"{m.mountpoint} still mounted" for m in left]
+        if problems:
+            # the mounts below stay pinned by what is still mounted on them
+            return problems
+
+    # holders top-down; a disk's own partitions need no teardown
+    disk_name = os.path.basename(disk)
+    plain = {disk_name, *partitions(disk_name)}
+    for name in reversed(names):
+        if name in plain:
+            continue
+        cmd = _holder_cmd(name)
+        if cmd is None:
+            problems.append(f"unknown holder {name}")
+            continue
+        res = cmdexec.run(cmd, timeout=timeout)
+        log(f"{' '.join(cmd)}: {'ok' if res.ok else res.stderr.strip() or res.error}")
+
+    for name in plain:
+        problems += [f"{name} held by {h}" for h in holders(name)]
+    return problems
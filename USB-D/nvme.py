@@ -0,0 +1,233 @@
+"""
+NVMe sanitize backend.
+
+The sanitize action is taken from the controller's SANICAP field (from
+`nvme id-ctrl`). The preference order is crypto erase, block erase, then
+overwrite. After starting the sanitize, the backend polls the sanitize
+status log at a fixed interval. SPROG (progress out of 65536) becomes
+ordinary ProgressEvents, so callers see the same telemetry as for a
+software wipe.
+
+A sanitize always covers the whole controller, i.e. every namespace on
+it, so callers must make sure none of the other namespaces is in use
+before choosing it. Concurrent jobs for namespaces of one controller
+share a single operation instead of starting it twice. `nvme format` is only
+used when the controller has no sanitize support. It formats the target
+namespace alone, unless the controller's FNA field says a format (or its
+secure erase) always applies to every namespace.
+"""
+import json
+import os
+import re
+import threading
+import time
+
+import cmdexec
+from telemetry import ProgressTracker
+
+POLL_INTERVAL = 2.0
+# upper bound when the controller reports no estimate
+DEFAULT_LIMIT = 24 * 3600
+CMD_TIMEOUT = 60
+FORMAT_TIMEOUT = 3600
+
+# SANICAP bits -> (name, SANACT value); best first
+ACTIONS = (
+    ("crypto_erase", 0x1, 4),
+    ("block_erase", 0x2, 2),
+    ("overwrite", 0x4, 3),
+)
+# sanitize log estimate field per action
+ESTIMATE_FIELD = {
+    "crypto_erase": "time_crypto_erase",
+    "block_erase": "time_block_erase",
+    "overwrite": "time_over_write",
+}
+NO_ESTIMATE = 0xFFFFFFFF
+
+# SSTAT[2:0]
+SSTAT_NEVER = 0
+SSTAT_OK = 1
+SSTAT_IN_PROGRESS = 2
+SSTAT_FAILED = 3
+SSTAT_OK_NO_DEALLOC = 4
+
+_active = {}
+_active_lock = threading.Lock()
+
+
+class SanitizeError(Exception):
+    pass
+
+
+def controller_of(device):
+    """'/dev/nvme0n1' -> 'nvme0' (from sysfs, falling back to the name)."""
+    name = os.path.basename(device)
+    link = os.path.join("/sys/class/block", name, "device")
+    if os.path.exists(link):
+        ctrl = os.path.basename(os.path.realpath(link))
+        if ctrl.startswith("nvme"):
+            return ctrl
+    m = re.match(r"(nvme\d+)", name)
+    return m.group(1) if m else name
+
+
+def namespaces(ctrl):
+    """Block devices of every namespace on controller `ctrl`."""
+    base = os.path.join("/sys/class/nvme", ctrl)
+    try:
+        names = sorted(n for n in os.listdir(base) if re.fullmatch(rf"{ctrl}n\d+", n))
+    except OSError:
+        return []
+    return ["/dev/" + n for n in names if os.path.exists("/dev/" + n)]
+
+
+def _json(cmd):
+    res = cmdexec.run(cmd, timeout=CMD_TIMEOUT)
+    if not res.ok:
+        raise SanitizeError(f"{' '.join(cmd)} failed: {(res.stderr or res.error or '').strip()}")
+    data = json.loads(res.stdout)
+    # some nvme-cli versions key the log by device name
+    if isinstance(data, dict) and len(data) == 1:
+        inner = next(iter(data.values()))
+        if isinstance(inner, dict):
+            return inner
+    return data
+
+
+def id_ctrl(ctrl):
+    return _json(["nvme", "id-ctrl", f"/dev/{ctrl}", "-o", "json"])
+
+
+def sanitize_log(ctrl):
+    return _json(["nvme", "sanitize-log", f"/dev/{ctrl}", "-o", "json"])
+
+
+def choose_action(ctrl_info):
+    """(name, sanact) of the best supported action, or None."""
+    sanicap = int(ctrl_info.get("sanicap", 0))
+    for name, bit, sanact in ACTIONS:
+        if sanicap & bit:
+            return name, sanact
+    return None
+
+
+def estimate(log, action):
+    """Seconds the controller expects `action` to take, or None."""
+    value = int(log.get(ESTIMATE_FIELD[action], NO_ESTIMATE))
+    return None if value in (0, NO_ESTIMATE) else value
+
+
+def start_sanitize(ctrl, sanact):
+    cmd = ["nvme", "sanitize", f"/dev/{ctrl}", f"--sanact={sanact}"]
+    if sanact == 3:
+        # one pass of zeros; the default OWPASS of 0 means sixteen
+        cmd += ["--owpass=1", "--ovrpat=0"]
+    res = cmdexec.run(cmd, timeout=CMD_TIMEOUT)
+    if not res.ok:
+        raise SanitizeError(f"sanitize start failed: {(res.stderr or res.error or '').strip()}")
+
+
+def wait_sanitize(ctrl, tracker, total, limit, interval=POLL_INTERVAL):
+    """Poll the sanitize log until the operation ends; returns the final SSTAT status."""
+    deadline = time.monotonic() + limit
+    while True:
+        entry = sanitize_log(ctrl)
+        status = int(entry.get("sstat", 0)) & 0x7
+        if status == SSTAT_IN_PROGRESS:
+            tracker.update(total * int(entry.get("sprog", 0)) // 65536)
+        elif status in (SSTAT_OK, SSTAT_OK_NO_DEALLOC, SSTAT_FAILED):
+            # the log describes this operation once the sanitize command has returned
+            if status != SSTAT_FAILED:
+                tracker.finish(total)
+            return status
+        if time.monotonic() > deadline:
+            raise SanitizeError(f"sanitize did not finish within {limit}s")
+        time.sleep(interval)
+
+
+def _run_sanitize(ctrl, device, total, progress, log):
+    info = id_ctrl(ctrl)
+    choice = choose_action(info)
+    if choice is None:
+        return None
+    action, sanact = choice
+    eta = estimate(sanitize_log(ctrl), action)
+    log(f"{ctrl}: sanitize {action} (sanact={sanact}), "
+        f"controller estimate {f'{eta}s' if eta else 'not reported'}")
+    start_sanitize(ctrl, sanact)
+    tracker = ProgressTracker(progress, device, total, pattern=action, phase="sanitize")
+    status = wait_sanitize(ctrl, tracker, total, limit=max(DEFAULT_LIMIT, 2 * (eta or 0)))
+    if status == SSTAT_FAILED:
+        raise SanitizeError(f"{ctrl}: sanitize reported failure")
+    return action
+
+
+def sanitize(device, total, progress=None, log=lambda text: None):
+    """
+    Sanitize the controller behind `device`. Returns the action used, or
+    None if the controller has no sanitize support. Raises SanitizeError.
+    A job for another namespace of the same controller that arrives while
+    the sanitize runs waits for it and gets the same result.
+    """
+    ctrl = controller_of(device)
+    # size unknown: report progress in SPROG units
+    total = total or 65536
+    with _active_lock:
+        shared = _active.get(ctrl)
+        owner = shared is None
+        if owner:
+            shared = _active[ctrl] = {"done": threading.Event(), "action": None, "error": None}
+    if not owner:
+        log(f"{ctrl}: sanitize already running for another namespace, waiting for it")
+        shared["done"].wait()
+    else:
+        others = [d for d in namespaces(ctrl) if d != device]
+        if others:
+            log(f"{ctrl}: sanitize covers the whole controller; {', '.join(others)} will be erased as well")
+        try:
+            shared["action"] = _run_sanitize(ctrl, device, total, progress, log)
+        except (SanitizeError, ValueError) as e:
+            shared["error"] = e
+        except Exception as e:
+            # waiters must not mistake this for "no sanitize support"
+            shared["error"] = e
+            raise
+        finally:
+            shared["done"].set()
+            with _active_lock:
+                _active.pop(ctrl, None)
+    if shared["error"] is not None:
+        raise SanitizeError(str(shared["error"]))
+    return shared["action"]
+
+
+# FNA bits
+FNA_FORMAT_ALL = 0x1
+FNA_ERASE_ALL = 0x2
+FNA_CRYPTO = 0x4
+
+
+def format_is_controller_wide(ctrl, fna=None):
+    """True if a format (or its secure erase) on `ctrl` erases every namespace."""
+    fna = int(id_ctrl(ctrl).get("fna", 0)) if fna is None else fna
+    return bool(fna & (FNA_FORMAT_ALL | FNA_ERASE_ALL))
+
+
+def format_namespace(device, log=lambda text: None):
+    """
+    `nvme format` of `device` with a cryptographic erase if FNA says the
+    controller supports one (user data erase otherwise). Where FNA makes
+    the format or the erase controller-wide, that is logged: every other
+    namespace is erased with it. True on success.
+    """
+    ctrl = controller_of(device)
+    fna = int(id_ctrl(ctrl).get("fna", 0))
+    ses = "--ses=2" if fna & FNA_CRYPTO else "--ses=1"
+    if format_is_controller_wide(ctrl, fna):
+        others = [d for d in namespaces(ctrl) if d != device]
+        log(f"{ctrl}: FNA={fna:#x}, the format applies to every namespace"
+            + (f"; {', '.join(others)} will be erased as well" if others else ""))
+    res = cmdexec.run(["nvme", "format", device, ses], timeout=FORMAT_TIMEOUT)
+    log(f"nvme format {device} {ses}: {'ok' if res.ok else (res.stderr or res.error or '').strip()}")
+    return res.ok
@@ -0,0 +1,522 @@
+"""
+In-process overwrite engine.
+
+Replaces the dd/shred shell-outs: the device is opened once (O_DIRECT where
+the kernel allows it), a dispatcher walks the LBA range in large aligned
+chunks and a pool of writer threads keeps `queue_depth` writes in flight.
+Pattern buffers come from a fixed pool and are recycled after every write.
+
+A multi-pass plan runs on one engine, one set of descriptors and one
+buffer pool. On media where seeking is free the passes can overlap, each
+following the previous one down the device (see run_plan).
+"""
+import ctypes
+import os
+import mmap
+import queue
+import threading
+import time
+
+import badranges
+from telemetry import ProgressTracker
+
+ALIGN = 4096
+DEFAULT_BLOCK_SIZE = 4 * 1024 * 1024
+DEFAULT_QUEUE_DEPTH = 8
+# seconds between durable checkpoints (device flush + journal write)
+CHECKPOINT_INTERVAL = 30.0
+# write-and-verify: bytes written before a window is flushed and read back
+READBACK_WINDOW = 64 * 1024 * 1024
+# overlapped plans: minimum distance between a pass and the one after it
+STAGGER = 256 * 1024 * 1024
+# buffers a pattern may fill ahead of the dispatcher
+PRODUCE_AHEAD = 4
+# pooled buffers carry one cipher block of slack for update_into()
+POOL_SLACK = 16
+
+SYNC_FILE_RANGE_WAIT_BEFORE = 1
+SYNC_FILE_RANGE_WRITE = 2
+SYNC_FILE_RANGE_WAIT_AFTER = 4
+
+try:
+    _sync_file_range = ctypes.CDLL(None, use_errno=True).sync_file_range
+    _sync_file_range.argtypes = (ctypes.c_int, ctypes.c_int64, ctypes.c_int64, ctypes.c_uint)
+except (OSError, AttributeError):
+    _sync_file_range = None
+
+
+def sync_range(fd, offset, length):
+    """Write back and wait for [offset, offset+length) of `fd`; whole-file fdatasync if unavailable."""
+    flags = SYNC_FILE_RANGE_WAIT_BEFORE | SYNC_FILE_RANGE_WRITE | SYNC_FILE_RANGE_WAIT_AFTER
+    if _sync_file_range is None or _sync_file_range(fd, offset, length, flags) != 0:
+        os.fdatasync(fd)
+
+
+def device_size(path):
+    """Size in bytes of a block device or regular file."""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        return os.lseek(fd, 0, os.SEEK_END)
+    finally:
+        os.close(fd)
+
+
+def aligned_buffer(size):
+    """Anonymous mapping; always page aligned, which is what O_DIRECT needs."""
+    return mmap.mmap(-1, size)
+
+
+class BufferPool:
+    """Fixed set of aligned buffers handed out as memoryviews and recycled."""
+
+    def __init__(self, count, size):
+        self.size = size
+        self._maps = [aligned_buffer(size) for _ in range(count)]
+        self._free = queue.Queue()
+        for m in self._maps:
+            self._free.put(m)
+
+    def get(self, timeout=None):
+        return memoryview(self._free.get(timeout=timeout))
+
+    def put(self, view):
+        # slices of a pooled view still point at the owning mmap
+        m = view.obj
+        view.release()
+        self._free.put(m)
+
+    def close(self):
+        for m in self._maps:
+            try:
+                m.close()
+            except BufferError:
+                pass
+
+
+# - Patterns -
+# A pattern hands the dispatcher a view for (offset, length) and gets it back
+# through put() once the write has landed. Views are requested strictly in
+# ascending offset order.
+class ZeroPattern:
+    name = "zero"
+
+    def __init__(self, block_size=DEFAULT_BLOCK_SIZE):
+        self._buf = aligned_buffer(block_size)
+        self._view = memoryview(self._buf)
+
+    def get(self, offset, length):
+        return self._view[:length]
+
+    def put(self, view):
+        pass
+
+    def close(self):
+        self._view.release()
+        self._buf.close()
+
+
+class UrandomPattern:
+    """Fills pooled buffers in place from /dev/urandom (readinto, no copies)."""
+    name = "random"
+
+    def __init__(self, block_size=DEFAULT_BLOCK_SIZE, depth=DEFAULT_QUEUE_DEPTH, pool=None):
+        self._owns_pool = pool is None
+        self._pool = pool or BufferPool(depth + 1, block_size)
+        self._src = open("/dev/urandom", "rb", buffering=0)
+
+    def get(self, offset, length):
+        view = self._pool.get()[:length]
+        done = 0
+        while done < length:
+            done += self._src.readinto(view[done:])
+        return view
+
+    def put(self, view):
+        self._pool.put(view)
+
+    def close(self):
+        self._src.close()
+        if self._owns_pool:
+            self._pool.close()
+
+
+class OverwriteEngine:
+    """
+    Overwrites `device` with one or more patterns.
+
+    `progress` receives telemetry.ProgressEvents for the current pass;
+    `cancel` is a threading.Event checked between chunks.
+    """
+
+    def __init__(self, device, block_size=DEFAULT_BLOCK_SIZE, queue_depth=DEFAULT_QUEUE_DEPTH,
+                 direct=True, progress=None, cancel=None):
+        if block_size % ALIGN:
+            raise ValueError(f"block_size must be a multiple of {ALIGN}")
+        self.device = device
+        self.block_size = block_size
+        self.queue_depth = max(1, queue_depth)
+        self.direct = direct
+        self.progress = progress
+        self.cancel = cancel or threading.Event()
+        self.size = 0
+        self._fd = None
+        self._tail_fd = None
+        self._read_fd = None
+        self._read_tail_fd = None
+        self.using_direct = False
+        # write-and-verify outcome of the last pass run with a readback check
+        self.readback = None
+        # sectors that could not be written, across all passes
+        self.bad = badranges.BadRangeMap()
+        self._pool = None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def open(self):
+        flags = os.O_WRONLY
+        if self.direct and hasattr(os, "O_DIRECT"):
+            try:
+                self._fd = os.open(self.device, flags | os.O_DIRECT)
+                self.using_direct = True
+            except OSError:
+                # tmpfs and some USB bridges refuse O_DIRECT
+                self._fd = None
+        if self._fd is None:
+            self._fd = os.open(self.device, flags)
+        self.size = os.lseek(self._fd, 0, os.SEEK_END)
+
+    def close(self):
+        for fd in (self._fd, self._tail_fd, self._read_fd, self._read_tail_fd):
+            if fd is not None:
+                os.close(fd)
+        self._fd = self._tail_fd = self._read_fd = self._read_tail_fd = None
+        if self._pool is not None:
+            self._pool.close()
+            self._pool = None
+
+    def _fd_for(self, offset, length):
+        # O_DIRECT needs aligned offset and length; a ragged tail goes through
+        # a second buffered descriptor.
+        if not self.using_direct or (offset % ALIGN == 0 and length % ALIGN == 0):
+            return self._fd
+        if self._tail_fd is None:
+            self._tail_fd = os.open(self.device, os.O_WRONLY)
+        return self._tail_fd
+
+    def _read_fd_for(self, offset, length):
+        # same split as writes: O_DIRECT reads where aligned, so the data
+        # comes from the device and not from the page cache
+        if self.using_direct and offset % ALIGN == 0 and length % ALIGN == 0:
+            if self._read_fd is None:
+                self._read_fd = os.open(self.device, os.O_RDONLY | os.O_DIRECT)
+            return self._read_fd
+        if self._read_tail_fd is None:
+            self._read_tail_fd = os.open(self.device, os.O_RDONLY)
+        return self._read_tail_fd
+
+    def _flush_window(self, offset, length):
+        """Force [offset, offset+length) to media and out of the page cache."""
+        if self.using_direct:
+            # the data already bypassed the page cache; flush the drive's cache
+            os.fdatasync(self._fd)
+        else:
+            # write the window back, then flush the drive's cache
+            sync_range(self._fd, offset, length)
+            os.fdatasync(self._fd)
+        if self._tail_fd is not None:
+            sync_range(self._tail_fd, offset, length)
+        for fd in (self._fd, self._tail_fd):
+            if fd is not None and hasattr(os, "posix_fadvise"):
+                os.posix_fadvise(fd, offset, length, os.POSIX_FADV_DONTNEED)
+
+    def _readback(self, windows, check, result):
+        """Verifier thread: flush each finished window, read it back and check it."""
+        buf = aligned_buffer(self.block_size)
+        view = memoryview(buf)
+        try:
+            while True:
+                item = windows.get()
+                if item is None:
+                    return
+                if result["error"] is not None or result["first_mismatch"] is not None:
+                    continue
+                lo, hi = item
+                try:
+                    self._flush_window(lo, hi - lo)
+                    off = lo
+                    while off < hi:
+                        n = min(self.block_size, hi - off)
+                        segments = badranges.read_segments(self._read_fd_for, view, off, n,
+                                                           result["unreadable"])
+                        bad = badranges.check_segments(check, view, off, segments)
+                        if bad >= 0:
+                            result["first_mismatch"] = off + bad
+                            break
+                        result["bytes_checked"] += sum(b - a for a, b in segments)
+                        off += n
+                except OSError as e:
+                    result["error"] = e
+        finally:
+            view.release()
+            buf.close()
+
+    def _write_range(self, view, offset):
+        # media errors are bisected down to the sector and mapped in self.bad
+        def op(off, n):
+            rel = off - offset
+            self._write(self._fd_for(off, n), view[rel:rel + n], off)
+
+        badranges.salvage(op, offset, len(view), self.bad)
+
+    def _write(self, fd, view, offset):
+        done = 0
+        while done < len(view):
+            n = os.pwrite(fd, view[done:], offset + done)
+            if n == 0:
+                raise OSError(f"short write at offset {offset + done}")
+            done += n
+
+    def sync(self):
+        os.fsync(self._fd)
+        if self._tail_fd is not None:
+            os.fsync(self._tail_fd)
+
+    def buffer_pool(self, lanes=1, ahead=PRODUCE_AHEAD):
+        """
+        Pool shared by the patterns of one plan: enough for the writes in
+        flight plus every lane's produced-ahead buffers. The engine owns
+        it and closes it with the device.
+        """
+        if self._pool is None:
+            count = 2 * self.queue_depth + lanes * (ahead + 1) + 1
+            self._pool = BufferPool(count, self.block_size + POOL_SLACK)
+        return self._pool
+
+    def run_pass(self, pattern, pass_no=1, passes=1, start=0, end=None, checkpoint=None,
+                 checkpoint_interval=CHECKPOINT_INTERVAL, readback=None, window=READBACK_WINDOW):
+        """
+        Write one pattern over [start, end). Returns False if cancelled.
+
+        `checkpoint(offset)`, if given, is called every `checkpoint_interval`
+        seconds and at the end of the pass with an offset below which every
+        write has completed and been flushed to the device.
+
+        `readback(view, offset)`, if given, turns the pass into
+        write-and-verify. Each `window` of completed writes is flushed to
+        media and read back by a verifier thread while the next window is
+        being written. The check returns the index of the first bad byte,
+        or -1. The outcome ends up in self.readback.
+        """
+        lane = Lane(pattern, pass_no, passes, start,
+                    checkpoint=None if checkpoint is None else (lambda n, offset: checkpoint(offset)))
+        return self._run_lanes([lane], end, checkpoint_interval, readback, window)
+
+    def run_plan(self, patterns, starts=None, end=None, checkpoint=None, overlap=False,
+                 stagger=STAGGER, checkpoint_interval=CHECKPOINT_INTERVAL, readback=None,
+                 window=READBACK_WINDOW):
+        """
+        Run one pass per pattern over the same open device. Returns False if
+        cancelled.
+
+        `starts` gives each pass's resume offset. `checkpoint(pass_no,
+        offset)` works like run_pass's, per pass. `readback` applies to the
+        last pass.
+
+        With `overlap`, pass k+1 does not wait for pass k to finish. It
+        follows it down the device, at least `stagger` bytes behind what
+        pass k has flushed. A
+        region is only handed to the next pass after the device has been
+        flushed, so every pass reaches the media and is not just coalesced
+        in the drive's cache. Without `overlap` the passes run one after
+        the other.
+        """
+        starts = list(starts or [0] * len(patterns))
+        for k in range(1, len(starts)):
+            # a later pass may never be ahead of the one it overwrites
+            starts[k] = min(starts[k], starts[k - 1])
+        lanes = [Lane(p, i, len(patterns), s, checkpoint) for i, (p, s) in enumerate(zip(patterns, starts), 1)]
+        return self._run_lanes(lanes, end, checkpoint_interval, readback, window,
+                               stagger if overlap else None)
+
+    def run(self, patterns):
+        """Run every pattern in order; returns False as soon as one is cancelled."""
+        return self.run_plan(patterns)
+
+    def _run_lanes(self, lanes, end, checkpoint_interval, readback, window, stagger=None):
+        end = self.size if end is None else end
+        work = queue.Queue(maxsize=self.queue_depth)
+        state = {"error": None, "inflight": 0}
+        cv = threading.Condition()
+
+        def writer():
+            while True:
+                item = work.get()
+                if item is None:
+                    return
+                lane, offset, view = item
+                try:
+                    if state["error"] is None:
+                        self._write_range(view, offset)
+                        with cv:
+                            lane.complete(offset, len(view))
+                except OSError as e:
+                    state["error"] = e
+                finally:
+                    lane.pattern.put(view)
+                    with cv:
+                        state["inflight"] -= 1
+                        cv.notify_all()
+
+        threads = [threading.Thread(target=writer, daemon=True) for _ in range(self.queue_depth)]
+        for t in threads:
+            t.start()
+
+        final = lanes[-1]
+        verifier = None
+        if readback is not None:
+            self.readback = {"start": final.start, "end": end, "bytes_checked": 0,
+                             "first_mismatch": None, "error": None,
+                             "unreadable": badranges.BadRangeMap()}
+            # at most two windows waiting: writing cannot run away from the reads
+            windows = queue.Queue(maxsize=2)
+            window = max(window // self.block_size, 1) * self.block_size
+            next_window = final.start
+            verifier = threading.Thread(target=self._readback, args=(windows, readback, self.readback),
+                                        daemon=True)
+            verifier.start()
+
+        for lane in lanes:
+            # passes a resumed plan had already finished
+            lane.finished = lane.start >= end
+        last_checkpoint = time.monotonic()
+
+        def flush(checkpoints):
+            # everything completed before the flush is on stable storage afterwards
+            with cv:
+                marks = [lane.mark for lane in lanes]
+            self.sync()
+            for lane, mark in zip(lanes, marks):
+                lane.durable = mark
+                if checkpoints and lane.checkpoint is not None and lane.start < mark < end:
+                    lane.checkpoint(lane.pass_no, mark)
+
+        def plan_eta():
+            # bytes left in every pass over the rate of those running; serial
+            # passes reduce to the one running lane's rate
+            left = sum(max(0, end - lane.start - lane.done) for lane in lanes)
+            running = [lane.tracker for lane in lanes if lane.tracker is not None and not lane.finished]
+            return left, sum(t.rate for t in running)
+
+        def gate(k):
+            # highest offset lane k may write below
+            if k == 0:
+                return end
+            prev = lanes[k - 1]
+            if prev.durable >= end:
+                return end
+            if stagger is None:
+                return lanes[k].start
+            # stay `stagger` behind what the previous pass has flushed
+            return max(lanes[k].start, prev.durable - stagger)
+
+        try:
+            while state["error"] is None and not self.cancel.is_set():
+                dispatched = False
+                for k, lane in enumerate(lanes):
+                    if lane.offset >= end:
+                        continue
+                    length = min(self.block_size, end - lane.offset)
+                    if lane.offset + length > gate(k):
+                        continue
+                    if lane.tracker is None:
+                        lane.tracker = ProgressTracker(self.progress, self.device, end - lane.start,
+                                                       lane.pass_no, lane.passes, lane.pattern.name,
+                                                       plan=plan_eta)
+                    with cv:
+                        state["inflight"] += 1
+                    work.put((lane, lane.offset, lane.pattern.get(lane.offset, length)))
+                    lane.offset += length
+                    lane.tracker.update(lane.done)
+                    dispatched = True
+                if verifier is not None:
+                    with cv:
+                        mark = final.mark
+                    while mark - next_window >= window:
+                        windows.put((next_window, next_window + window))
+                        next_window += window
+
+                if all(lane.durable >= end for lane in lanes):
+                    break
+                due = time.monotonic() - last_checkpoint >= checkpoint_interval
+                if not dispatched:
+                    # every lane is waiting on the one before it or on its own
+                    # writes; let them land, then release them with a flush
+                    with cv:
+                        cv.wait_for(lambda: state["inflight"] == 0 or state["error"] is not None,
+                                    timeout=0.5)
+                        idle = state["inflight"] == 0
+                    if idle:
+                        flush(due)
+                elif due or (stagger is not None and any(lane.mark - lane.durable >= stagger
+                                                         for lane in lanes[:-1])):
+                    flush(due)
+                else:
+                    continue
+                if due:
+                    last_checkpoint = time.monotonic()
+                for lane in lanes:
+                    if lane.durable >= end and not lane.finished:
+                        lane.finished = True
+                        if lane.checkpoint is not None:
+                            lane.checkpoint(lane.pass_no, end)
+                        lane.tracker.finish(lane.done)
+        finally:
+            for _ in threads:
+                work.put(None)
+            for t in threads:
+                t.join()
+            if verifier is not None:
+                if state["error"] is None and not self.cancel.is_set():
+                    while next_window < end:
+                        windows.put((next_window, min(next_window + window, end)))
+                        next_window += window
+                windows.put(None)
+                verifier.join()
+
+        if state["error"] is not None:
+            raise state["error"]
+        if self.cancel.is_set():
+            flush(True)
+            return False
+        return True
+
+
+class Lane:
+    """One pass of a plan as the dispatcher sees it."""
+
+    def __init__(self, pattern, pass_no, passes, start=0, checkpoint=None):
+        self.pattern = pattern
+        self.pass_no = pass_no
+        self.passes = passes
+        self.start = start
+        self.checkpoint = checkpoint
+        self.tracker = None
+        # next offset to dispatch
+        self.offset = start
+        self.done = 0
+        # contiguous low-water mark of completed writes, and its value at the last flush
+        self.mark = start
+        self.durable = start
+        self.finished = False
+        self._completed = {}
+
+    def complete(self, offset, length):
+        self.done += length
+        self._completed[offset] = offset + length
+        while self.mark in self._completed:
+            self.mark = self._completed.pop(self.mark)
@@ -0,0 +1,170 @@
+"""
+Kernel-offloaded clearing: discard and write-zeroes.
+
+The block layer can hand a whole LBA range to the device in one request.
+BLKZEROOUT becomes WRITE SAME / Write Zeroes on drives that support it.
+BLKDISCARD and BLKSECDISCARD become TRIM / UNMAP / Deallocate, and the
+secure variant also asks the device to purge old copies. What a device
+accepts is read from /sys/block/<disk>/queue. The planner uses that to
+choose between offload and the software overwrite engine. Ranges are
+issued in large chunks, so progress and cancellation still work on
+multi-terabyte devices.
+"""
+import errno
+import fcntl
+import os
+import struct
+from collections import namedtuple
+
+from overwrite import device_size
+from telemetry import ProgressTracker
+
+# linux/fs.h: _IO(0x12, 119 / 125 / 127)
+BLKDISCARD = 0x1277
+BLKSECDISCARD = 0x127D
+BLKZEROOUT = 0x127F
+
+# one ioctl per chunk; the kernel splits further by the queue limits
+CHUNK = 1 << 30
+
+UNSUPPORTED = (errno.EOPNOTSUPP, errno.ENOTTY, errno.EINVAL)
+
+Capabilities = namedtuple("Capabilities", [
+    "device", "size", "logical_sector", "rotational",
+    "discard_max", "discard_granularity", "write_zeroes_max",
+])
+
+
+def _queue_int(name, attr, default=0):
+    try:
+        with open(os.path.join("/sys/class/block", name, "queue", attr)) as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return default
+
+
+def _queue_name(device):
+    # partitions have no queue/ of their own; use their disk's
+    name = os.path.basename(os.path.realpath(device))
+    part = os.path.join("/sys/class/block", name, "partition")
+    if os.path.exists(part):
+        name = os.path.basename(os.path.dirname(os.path.realpath(os.path.join("/sys/class/block", name))))
+    return name
+
+
+def capabilities(device):
+    name = _queue_name(device)
+    return Capabilities(
+        device=device,
+        size=device_size(device),
+        logical_sector=_queue_int(name, "logical_block_size", 512),
+        rotational=_queue_int(name, "rotational", 1) == 1,
+        discard_max=_queue_int(name, "discard_max_bytes"),
+        discard_granularity=_queue_int(name, "discard_granularity"),
+        write_zeroes_max=_queue_int(name, "write_zeroes_max_bytes"),
+    )
+
+
+def describe(caps):
+    return (f"{caps.device}: {caps.size} bytes, {caps.logical_sector}B sectors, "
+            f"{'rotational' if caps.rotational else 'non-rotational'}, "
+            f"discard {'up to ' + str(caps.discard_max) + ' bytes' if caps.discard_max else 'unsupported'}, "
+            f"write-zeroes {'up to ' + str(caps.write_zeroes_max) + ' bytes' if caps.write_zeroes_max else 'unsupported'}")
+
+
+def plan(caps, discard=False):
+    """
+    Ordered steps for clearing the device to zeros:
+    'secure_discard' (falls back to plain discard at run time) when
+    requested and supported, then 'zeroout' if the device offloads
+    write-zeroes, else 'software_zero'.
+    """
+    steps = []
+    if discard and caps.discard_max:
+        steps.append("secure_discard")
+    steps.append("zeroout" if caps.write_zeroes_max else "software_zero")
+    return steps
+
+
+def issue(fd, op, start, length):
+    fcntl.ioctl(fd, op, struct.pack("QQ", start, length))
+
+
+def run_range(fd, op, size, chunk=CHUNK, tracker=None, cancel=None):
+    """Apply `op` to [0, size) chunk by chunk. Returns False if cancelled."""
+    offset = 0
+    while offset < size:
+        if cancel is not None and cancel.is_set():
+            return False
+        length = min(chunk, size - offset)
+        issue(fd, op, offset, length)
+        offset += length
+        if tracker is not None:
+            tracker.update(offset)
+    if tracker is not None:
+        tracker.finish(offset)
+    return True
+
+
+def discard(fd, caps, tracker=None, cancel=None, secure=True, log=lambda text: None):
+    """
+    Discard the whole device, securely if the device accepts it. Returns
+    the op name used, None if discard is not supported, or False on cancel.
+    """
+    ops = [("secure_discard", BLKSECDISCARD)] if secure else []
+    ops.append(("discard", BLKDISCARD))
+    for label, op in ops:
+        try:
+            if tracker is not None:
+                tracker.pattern = label
+            if not run_range(fd, op, caps.size, tracker=tracker, cancel=cancel):
+                return False
+            return label
+        except OSError as e:
+            if e.errno not in UNSUPPORTED:
+                raise
+            log(f"{label} not supported ({os.strerror(e.errno)})")
+    return None
+
+
+def zeroout(fd, caps, tracker=None, cancel=None):
+    """BLKZEROOUT over the whole device. Returns False if cancelled."""
+    return run_range(fd, BLKZEROOUT, caps.size, tracker=tracker, cancel=cancel)
+
+
+def offload_zero(device, log=lambda text: None, progress=None, cancel=None, discard_first=False):
+    """
+    Clear `device` to zeros without streaming data from user space.
+    Returns True when done, False if cancelled, and None when the device
+    does not offload write-zeroes. In that case the caller runs the
+    software zero pass (any requested discard has already been issued).
+    """
+    caps = capabilities(device)
+    log(describe(caps))
+    steps = plan(caps, discard=discard_first)
+    passes = len(steps)
+    fd = os.open(device, os.O_WRONLY)
+    try:
+        for pass_no, step in enumerate(steps, 1):
+            tracker = ProgressTracker(progress, device, caps.size, pass_no, passes, step)
+            if step == "secure_discard":
+                used = discard(fd, caps, tracker, cancel, log=log)
+                if used is False:
+                    return False
+                log(f"{used or 'discard'} {'complete' if used else 'skipped'}")
+            elif step == "zeroout":
+                try:
+                    if not zeroout(fd, caps, tracker, cancel):
+                        return False
+                except OSError as e:
+                    if e.errno not in UNSUPPORTED:
+                        raise
+                    log(f"write-zeroes rejected ({os.strerror(e.errno)})")
+                    return None
+                log("write-zeroes complete")
+            else:
+                return None
+        os.fsync(fd)
+        return True
+    finally:
+        os.close(fd)
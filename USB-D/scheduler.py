@@ -0,0 +1,210 @@
+"""
+Batch wipe scheduler.
+
+Every device becomes a WipeJob with its own cancel token and a small state
+machine (queued -> unmounting -> wiping -> verifying -> certifying -> done).
+Jobs run concurrently; how many may run at once is limited per bus/HBA so a
+single controller or USB hub is not oversubscribed while other controllers
+sit idle.
+"""
+import contextlib
+import os
+import re
+import threading
+import time
+
+QUEUED = "queued"
+UNMOUNTING = "unmounting"
+WIPING = "wiping"
+VERIFYING = "verifying"
+CERTIFYING = "certifying"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+FINAL_STATES = (DONE, FAILED, CANCELLED)
+
+DEFAULT_PER_BUS = 4
+DEFAULT_MAX_JOBS = 32
+
+_PCI_ADDR = re.compile(r"^[0-9a-f]{4}:[0-9a-f]{2}:[0-9a-f]{2}\.[0-9a-f]$")
+
+
+def bus_key(device):
+    """
+    Controller a block device hangs off: the deepest PCI function in its
+    sysfs path (the HBA, NVMe controller or USB host), or the device itself
+    when that cannot be resolved.
+    """
+    name = os.path.basename(device)
+    try:
+        path = os.path.realpath(f"/sys/block/{name}")
+    except OSError:
+        return name
+    key = None
+    for part in path.split(os.sep):
+        if _PCI_ADDR.match(part):
+            key = part
+    return key or name
+
+
+class WipeJob:
+    def __init__(self, device, method, verify):
+        self.device = device
+        self.method = method
+        self.verify = verify
+        self.state = QUEUED
+        self.status = "unknown"
+        self.success = False
+        self.verified_clean = False
+        self.cert_path = None
+        self.error = None
+        # timing.Timeline.as_dict() of the finished job
+        self.timings = None
+        self.bus = bus_key(device)
+        self.cancel = threading.Event()
+        self.history = [(QUEUED, time.time())]
+        self._listeners = []
+        # (release, reacquire) of the scheduler slots while the job runs
+        self._slots = None
+
+    def __repr__(self):
+        return f"<WipeJob {self.device} {self.method}/{self.verify} {self.state}>"
+
+    @property
+    def finished(self):
+        return self.state in FINAL_STATES
+
+    def on_change(self, fn):
+        self._listeners.append(fn)
+
+    @contextlib.contextmanager
+    def waiting(self):
+        """
+        Hand the job's scheduler slots back for the block, for a wait that
+        puts no load on the bus (a frozen drive waiting for a resume), so
+        other jobs on the controller can run. They are taken back after;
+        if the job is cancelled meanwhile it carries on without them.
+        """
+        slots = self._slots
+        if slots is None:
+            yield
+            return
+        release, reacquire = slots
+        release()
+        try:
+            yield
+        finally:
+            reacquire()
+
+    def advance(self, state):
+        if self.finished or state == self.state:
+            return
+        self.state = state
+        self.history.append((state, time.time()))
+        for fn in list(self._listeners):
+            fn(self)
+
+
+class WipeScheduler:
+    """
+    Runs `runner(job)` for every submitted job on its own thread, holding a
+    per-bus slot for the duration except inside job.waiting(). `runner` is expected to move the job
+    through its states and set success / status / verified_clean / cert_path.
+    """
+
+    def __init__(self, runner, per_bus=DEFAULT_PER_BUS, bus_limits=None, max_jobs=DEFAULT_MAX_JOBS):
+        self.runner = runner
+        self.per_bus = per_bus
+        self.bus_limits = dict(bus_limits or {})
+        self._global = threading.BoundedSemaphore(max_jobs)
+        self._bus_slots = {}
+        self._lock = threading.Lock()
+        self.jobs = []
+        self._listeners = []
+
+    def on_change(self, fn):
+        """Called with the job on every state change of any job."""
+        self._listeners.append(fn)
+
+    def _notify(self, job):
+        for fn in list(self._listeners):
+            fn(job)
+
+    def _slot(self, bus):
+        with self._lock:
+            if bus not in self._bus_slots:
+                self._bus_slots[bus] = threading.BoundedSemaphore(self.bus_limits.get(bus, self.per_bus))
+            return self._bus_slots[bus]
+
+    def active(self):
+        return [j for j in self.jobs if not j.finished]
+
+    def submit(self, device, method, verify):
+        with self._lock:
+            if any(j.device == device for j in self.jobs if not j.finished):
+                raise ValueError(f"{device} already has an active job")
+            job = WipeJob(device, method, verify)
+            self.jobs.append(job)
+        job.on_change(self._notify)
+        threading.Thread(target=self._run, args=(job,), daemon=True).start()
+        self._notify(job)
+        return job
+
+    def _acquire(self, sem, job):
+        while not sem.acquire(timeout=0.5):
+            if job.cancel.is_set():
+                return False
+        return True
+
+    def _run(self, job):
+        slot = self._slot(job.bus)
+        held = []
+
+        def acquire():
+            for sem in (slot, self._global):
+                if not self._acquire(sem, job):
+                    return False
+                held.append(sem)
+            return True
+
+        def release():
+            while held:
+                held.pop().release()
+
+        try:
+            if not acquire():
+                job.advance(CANCELLED)
+                return
+            job._slots = (release, acquire)
+            try:
+                self.runner(job)
+            except Exception as e:
+                job.error = e
+                job.status = "exception"
+        finally:
+            job._slots = None
+            release()
+        if job.cancel.is_set():
+            job.advance(CANCELLED)
+        elif job.error is not None or not job.success:
+            job.advance(FAILED)
+        else:
+            job.advance(DONE)
+
+    def forget_finished(self):
+        with self._lock:
+            self.jobs = [j for j in self.jobs if not j.finished]
+
+    def cancel_all(self):
+        for job in self.active():
+            job.cancel.set()
+
+    def wait(self, timeout=None):
+        """Block until every submitted job has finished."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.active():
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(0.1)
+        return True
@@ -0,0 +1,158 @@
+"""
+Progress telemetry for the wipe engines.
+
+Engines report ProgressEvents through a ProgressTracker (bytes done,
+instantaneous and average throughput, ETA, pass number). Consumers that
+redraw (the Tk window, the CLI) wrap their sink in a Coalescer so they see
+at most one event per device and pass per refresh interval, no matter how
+often the engine reports; the final event of a pass is always delivered.
+
+Passes of a plan may run overlapped (see OverwriteEngine.run_plan), so a
+tracker can take its ETA from the whole plan: the bytes left in every pass
+over the combined rate of the passes that are running.
+"""
+import threading
+import time
+
+ENGINE_INTERVAL = 0.2
+UI_INTERVAL = 0.5
+# weight of the newest sample in the instantaneous rate
+RATE_SMOOTHING = 0.3
+
+
+class ProgressEvent:
+    __slots__ = ("device", "phase", "pass_no", "passes", "pattern", "bytes_done", "total_bytes",
+                 "rate", "avg_rate", "eta", "elapsed", "final")
+
+    def __init__(self, device, phase, pass_no, passes, pattern, bytes_done, total_bytes,
+                 rate, avg_rate, eta, elapsed, final=False):
+        self.device = device
+        self.phase = phase
+        self.pass_no = pass_no
+        self.passes = passes
+        self.pattern = pattern
+        self.bytes_done = bytes_done
+        self.total_bytes = total_bytes
+        self.rate = rate
+        self.avg_rate = avg_rate
+        self.eta = eta
+        self.elapsed = elapsed
+        self.final = final
+
+    @property
+    def key(self):
+        """What a Coalescer keeps one event of."""
+        return self.device, self.phase, self.pass_no
+
+    @property
+    def percent(self):
+        return 100.0 * self.bytes_done / self.total_bytes if self.total_bytes else 100.0
+
+    def as_dict(self):
+        return {k: getattr(self, k) for k in self.__slots__}
+
+    def describe(self):
+        eta = "—" if self.eta is None else time.strftime("%H:%M:%S", time.gmtime(self.eta))
+        return (f"{self.phase.capitalize()} pass {self.pass_no}/{self.passes} ({self.pattern}): "
+                f"{self.percent:5.1f}%  {self.rate / (1024**2):7.1f} MB/s "
+                f"(avg {self.avg_rate / (1024**2):.1f})  ETA {eta}")
+
+
+class ProgressTracker:
+    """
+    Turns (bytes_done) samples for one pass into ProgressEvents. `plan`, if
+    given, returns (bytes left in the whole plan, combined rate) for the
+    ETA; otherwise the remaining passes are assumed to follow this one.
+    """
+
+    def __init__(self, sink, device, total_bytes, pass_no=1, passes=1, pattern="", phase="wipe",
+                 interval=ENGINE_INTERVAL, plan=None):
+        self.sink = sink
+        self.device = device
+        self.total = total_bytes
+        self.pass_no = pass_no
+        self.passes = passes
+        self.pattern = pattern
+        self.phase = phase
+        self.interval = interval
+        self.plan = plan
+        self.started = self._last_t = time.monotonic()
+        self._last_done = 0
+        self.rate = 0.0
+
+    def _event(self, done, now, final=False):
+        elapsed = now - self.started
+        avg = done / elapsed if elapsed > 0 else 0.0
+        if self.plan is not None:
+            remaining, basis = self.plan()
+        else:
+            remaining = (self.total - done) + (self.passes - self.pass_no) * self.total
+            basis = self.rate or avg
+        eta = remaining / basis if basis > 0 else None
+        return ProgressEvent(self.device, self.phase, self.pass_no, self.passes, self.pattern,
+                             done, self.total, self.rate, avg, eta, elapsed, final)
+
+    def update(self, done):
+        """Report `done` bytes; emits at most once per interval."""
+        now = time.monotonic()
+        dt = now - self._last_t
+        if self.sink is None or dt < self.interval:
+            return
+        inst = (done - self._last_done) / dt
+        self.rate = inst if not self.rate else RATE_SMOOTHING * inst + (1 - RATE_SMOOTHING) * self.rate
+        self._last_t, self._last_done = now, done
+        self.sink(self._event(done, now))
+
+    def finish(self, done):
+        if self.sink is not None:
+            self.sink(self._event(done, time.monotonic(), final=True))
+
+
+class Coalescer:
+    """
+    Keeps only the newest event per device and pass (ProgressEvent.key) and
+    hands them to `sink` at most every `interval` seconds from a background
+    thread. Final events are queued apart from the pending ones and flushed
+    immediately, so no later event can replace them and pass boundaries are
+    never lost, even with several passes of one device in flight.
+    """
+
+    def __init__(self, sink, interval=UI_INTERVAL):
+        self.sink = sink
+        self.interval = interval
+        self._pending = {}
+        self._finals = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = False
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def push(self, event):
+        with self._lock:
+            if event.final:
+                self._pending.pop(event.key, None)
+                self._finals.append(event)
+            else:
+                self._pending[event.key] = event
+        if event.final:
+            self._wake.set()
+
+    def flush(self):
+        with self._lock:
+            events = list(self._pending.values()) + self._finals
+            self._pending, self._finals = {}, []
+        for ev in events:
+            self.sink(ev)
+
+    def _loop(self):
+        while not self._stop:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
+
+    def close(self):
+        self._stop = True
+        self._wake.set()
+        self._thread.join()
+        self.flush()
@@ -0,0 +1,209 @@
+"""
+Phase timing and opt-in profiling for wipe jobs.
+
+Each job gets a Timeline, bound to the thread that runs it. The job marks
+its phases in order (metadata, unmount, wipe, verify, certificate,
+cert_tool), much like it advances its scheduler state. Anything timed
+from that thread while the timeline is bound is recorded as a span
+inside the current phase. cmdexec uses this for every external command.
+
+Every phase and span also feeds a process-wide histogram per name, with
+power-of-two buckets from 1 ms up. After a batch, histograms() shows
+where the time usually goes across all jobs.
+
+Profiling is opt-in per device (PROFILE_DEVICES). The job then runs
+under cProfile and the stats are saved next to its wipe log as
+<log>.prof (`python3 -m pstats <file>`). cProfile only sees the job's
+own thread; time spent in engine worker threads shows up as waits.
+"""
+import contextlib
+import cProfile
+import math
+import threading
+import time
+
+# bucket upper bounds: 1 ms, 2 ms, 4 ms, ... about 36 hours
+BUCKET_BASE = 0.001
+BUCKETS = 28
+
+# devices whose jobs run under cProfile
+PROFILE_DEVICES = set()
+
+_local = threading.local()
+_hist_lock = threading.Lock()
+_histograms = {}
+
+
+class Histogram:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.buckets = [0] * BUCKETS
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.min = seconds if self.min is None else min(self.min, seconds)
+        self.max = seconds if self.max is None else max(self.max, seconds)
+        i = 0 if seconds <= BUCKET_BASE else math.ceil(math.log2(seconds / BUCKET_BASE))
+        self.buckets[min(i, BUCKETS - 1)] += 1
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-quantile."""
+        if not self.count:
+            return None
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if seen >= q * self.count:
+                return BUCKET_BASE * 2 ** i
+        return self.max
+
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "total_s": round(self.total, 3),
+            "mean_s": round(self.total / self.count, 3) if self.count else None,
+            "min_s": round(self.min, 3) if self.min is not None else None,
+            "max_s": round(self.max, 3) if self.max is not None else None,
+            "p50_le_s": self.quantile(0.5),
+            "p95_le_s": self.quantile(0.95),
+            # upper bound (s) -> count, empty buckets left out
+            "buckets": {f"{BUCKET_BASE * 2 ** i:g}": n for i, n in enumerate(self.buckets) if n},
+        }
+
+
+def observe(name, seconds):
+    with _hist_lock:
+        hist = _histograms.get(name)
+        if hist is None:
+            hist = _histograms[name] = Histogram()
+        hist.add(seconds)
+
+
+def histograms():
+    """Snapshot of every histogram, by name."""
+    with _hist_lock:
+        return {name: h.as_dict() for name, h in sorted(_histograms.items())}
+
+
+def reset():
+    with _hist_lock:
+        _histograms.clear()
+
+
+class Timeline:
+    """Sequential phases of one job plus the spans recorded inside them."""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.phases = []
+        self.spans = []
+        self._phase = None
+        self._lock = threading.Lock()
+
+    def phase(self, name):
+        """End the running phase (if any) and start `name`."""
+        now = time.monotonic()
+        with self._lock:
+            self._close(now)
+            self._phase = (name, now)
+
+    def finish(self):
+        with self._lock:
+            self._close(time.monotonic())
+
+    def _close(self, now):
+        if self._phase is None:
+            return
+        name, start = self._phase
+        self.phases.append((name, start - self.started, now - start))
+        self._phase = None
+        observe(f"phase:{name}", now - start)
+
+    def add_span(self, name, start, duration):
+        with self._lock:
+            phase = self._phase[0] if self._phase else None
+            self.spans.append((name, phase, start - self.started, duration))
+
+    def totals(self):
+        """Seconds per phase, the running one up to now."""
+        with self._lock:
+            out = {}
+            for name, _, duration in self.phases:
+                out[name] = out.get(name, 0.0) + duration
+            if self._phase is not None:
+                name, start = self._phase
+                out[name] = out.get(name, 0.0) + time.monotonic() - start
+        return {name: round(seconds, 3) for name, seconds in out.items()}
+
+    def as_dict(self):
+        with self._lock:
+            spans = list(self.spans)
+        return {
+            "total_s": round(time.monotonic() - self.started, 3),
+            "phases": self.totals(),
+            "spans": [{"name": n, "phase": p, "start_s": round(s, 3), "duration_s": round(d, 3)}
+                      for n, p, s, d in spans],
+        }
+
+
+def current():
+    return getattr(_local, "timeline", None)
+
+
+@contextlib.contextmanager
+def bind(timeline):
+    """Make `timeline` the current one for this thread."""
+    previous = current()
+    _local.timeline = timeline
+    try:
+        yield timeline
+    finally:
+        _local.timeline = previous
+
+
+def record(name, start, duration):
+    """A finished span: into the histogram, and into this thread's timeline if one is bound."""
+    observe(name, duration)
+    timeline = current()
+    if timeline is not None:
+        timeline.add_span(name, start, duration)
+
+
+@contextlib.contextmanager
+def span(name):
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        record(name, start, time.monotonic() - start)
+
+
+def should_profile(device):
+    return device in PROFILE_DEVICES
+
+
+@contextlib.contextmanager
+def profiled(path):
+    """
+    Run the block under cProfile and dump the stats to `path`. Yields the
+    profiler, or None if another profiler is already active (Python 3.12+
+    allows only one per process).
+    """
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        yield None
+        return
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        try:
+            profiler.dump_stats(path)
+        except OSError:
+            pass
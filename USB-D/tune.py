@@ -0,0 +1,211 @@
+"""
+Per-device throughput calibration.
+
+USB sticks, SATA disks and NVMe drives want very different request sizes
+and queue depths. One fixed setting leaves much of the bandwidth of most
+of them unused. Before a software wipe, timed probe writes at the start
+of the device (the region the wipe overwrites anyway) pick the block
+size and queue depth. Timed reads do the same for full verification.
+
+The sweep has two stages: block sizes at a middle queue depth, then
+queue depths at the best block size. Each probe is sized to take about
+PROBE_SECONDS at the speed seen so far. Among settings within TOLERANCE
+of the fastest, the one with the least memory in flight wins. Results
+are cached per transport, model and firmware, so the next drive of the
+same kind skips the probes.
+"""
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+
+import discovery
+from overwrite import OverwriteEngine, ZeroPattern, DEFAULT_BLOCK_SIZE, DEFAULT_QUEUE_DEPTH
+from verify import verify_pipelined, BLOCK_SIZE as READ_BLOCK_SIZE, READ_DEPTH
+
+BLOCK_SIZES = (256 * 1024, 1024 * 1024, 4 * 1024 * 1024, 16 * 1024 * 1024)
+QUEUE_DEPTHS = (1, 2, 4, 8, 16, 32)
+SWEEP_DEPTH = 8
+PROBE_SECONDS = 0.5
+PROBE_MIN = 16 * 1024 * 1024
+PROBE_MAX = 512 * 1024 * 1024
+# settings this close to the fastest count as equally fast
+TOLERANCE = 0.05
+
+CACHE_FILES = ("/var/lib/NullBytes/tuning.json", "/tmp/NullBytes/tuning.json")
+
+# set by callers that want the fixed defaults
+ENABLED = True
+
+Settings = namedtuple("Settings", ["block_size", "queue_depth", "mb_s", "source"])
+
+DEFAULT_WRITE = Settings(DEFAULT_BLOCK_SIZE, DEFAULT_QUEUE_DEPTH, None, "default")
+DEFAULT_READ = Settings(READ_BLOCK_SIZE, READ_DEPTH, None, "default")
+
+_lock = threading.Lock()
+
+
+def cache_key(device):
+    """'transport:model:firmware', or None when the device cannot be identified."""
+    rec = discovery.get(device)
+    if rec is None or not rec.model:
+        return None
+    return f"{rec.transport}:{rec.model}:{rec.firmware}"
+
+
+def _cache_path():
+    for path in CACHE_FILES:
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            return path
+        except OSError:
+            continue
+    return None
+
+
+def load_cache():
+    path = _cache_path()
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, TypeError, ValueError):
+        return {}
+
+
+def _store(key, direction, settings):
+    path = _cache_path()
+    if key is None or path is None:
+        return
+    with _lock:
+        cache = load_cache()
+        cache.setdefault(key, {})[direction] = {
+            "block_size": settings.block_size,
+            "queue_depth": settings.queue_depth,
+            "mb_s": settings.mb_s,
+            "updated": time.time(),
+        }
+        tmp = path + ".tmp"
+        try:
+            with open(tmp, "w") as f:
+                json.dump(cache, f, indent=1)
+            os.replace(tmp, path)
+        except OSError:
+            pass
+
+
+def cached(key, direction):
+    entry = load_cache().get(key, {}).get(direction) if key else None
+    if not entry:
+        return None
+    return Settings(entry["block_size"], entry["queue_depth"], entry.get("mb_s"), "cache")
+
+
+def _drop_cache(device, length):
+    try:
+        fd = os.open(device, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        if hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(fd, 0, length, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+
+
+def measure_write(device, block_size, queue_depth, length):
+    """MB/s of an engine pass writing zeros over [0, length), including the final flush."""
+    with OverwriteEngine(device, block_size=block_size, queue_depth=queue_depth) as engine:
+        pattern = ZeroPattern(block_size)
+        try:
+            started = time.monotonic()
+            engine.run_pass(pattern, end=length)
+            elapsed = time.monotonic() - started
+        finally:
+            pattern.close()
+    return length / elapsed / (1024 ** 2) if elapsed > 0 else 0.0
+
+
+def measure_read(device, block_size, queue_depth, length):
+    """MB/s of a pipelined read of [0, length) with a cold page cache."""
+    _drop_cache(device, length)
+    res = verify_pipelined(device, check=lambda view, offset: -1, block_size=block_size,
+                           depth=queue_depth, end=length)
+    if res.error is not None:
+        raise res.error
+    return res.rate / (1024 ** 2)
+
+
+def sweep(measure, size, block_sizes=BLOCK_SIZES, depths=QUEUE_DEPTHS, log=lambda text: None):
+    """
+    Two-stage sweep of `measure(block_size, queue_depth, length)`. Returns
+    the chosen Settings.
+    """
+    region = min(PROBE_MAX, size) // max(block_sizes) * max(block_sizes)
+    results = {}
+    rate = None
+
+    def probe(bs, qd):
+        nonlocal rate
+        # enough bytes for about PROBE_SECONDS at the best rate seen so far
+        want = PROBE_MIN if rate is None else int(rate * (1024 ** 2) * PROBE_SECONDS)
+        length = max(min(want, region), bs) // bs * bs
+        mb_s = measure(bs, qd, length)
+        results[(bs, qd)] = mb_s
+        rate = max(rate or 0.0, mb_s)
+        log(f"  probe bs={bs // 1024}K qd={qd}: {mb_s:.1f} MB/s")
+
+    for bs in block_sizes:
+        probe(bs, SWEEP_DEPTH)
+    best_bs = max(block_sizes, key=lambda bs: results[(bs, SWEEP_DEPTH)])
+    for qd in depths:
+        if (best_bs, qd) not in results:
+            probe(best_bs, qd)
+
+    top = max(results.values())
+    # least memory in flight among the near-fastest
+    bs, qd = min((k for k, v in results.items() if v >= top * (1 - TOLERANCE)),
+                 key=lambda k: (k[0] * k[1], k[1]))
+    return Settings(bs, qd, round(results[(bs, qd)], 1), "probe")
+
+
+def _settings(device, direction, measure, default, probe, log):
+    if not ENABLED:
+        return default
+    key = cache_key(device)
+    hit = cached(key, direction)
+    if hit is not None:
+        log(f"Tuning ({direction}) for {key} from cache: bs={hit.block_size} qd={hit.queue_depth}")
+        return hit
+    if not probe:
+        return default
+    try:
+        fd = os.open(device, os.O_RDONLY)
+        try:
+            size = os.lseek(fd, 0, os.SEEK_END)
+        finally:
+            os.close(fd)
+        if size < PROBE_MIN:
+            return default
+        log(f"Calibrating {direction} throughput on {device}")
+        chosen = sweep(lambda bs, qd, n: measure(device, bs, qd, n), size, log=log)
+    except OSError as e:
+        log(f"Calibration failed ({e}); using defaults")
+        return default
+    log(f"Tuned {direction}: bs={chosen.block_size} qd={chosen.queue_depth} ({chosen.mb_s} MB/s)")
+    _store(key, direction, chosen)
+    return chosen
+
+
+def write_settings(device, probe=True, log=lambda text: None):
+    """
+    Block size and queue depth for overwriting `device`. Probing writes
+    zeros to the start of the device, so it is only allowed where the
+    caller is about to overwrite that region anyway.
+    """
+    return _settings(device, "write", measure_write, DEFAULT_WRITE, probe, log)
+
+
+def read_settings(device, probe=True, log=lambda text: None):
+    """Block size and queue depth for verifying `device`; probing only reads."""
+    return _settings(device, "read", measure_read, DEFAULT_READ, probe, log)
@@ -0,0 +1,356 @@
+"""
+Post-wipe verification.
+
+Zero detection compares each block against a preallocated zero buffer with
+bytes.startswith(), which CPython runs as a single memcmp, so checking runs
+at memory bandwidth instead of a Python loop per byte. Reads are preadv()
+calls straight into reused, page-aligned mmap buffers.
+
+Full verification is pipelined: reader threads keep several preads in
+flight into a ring of preallocated buffers while checker threads consume
+them, and the page cache is told to drop what has been checked.
+
+Random passes are verified against the keystream they were written with:
+the block is XORed with the regenerated keystream into a scratch buffer and
+the result goes through the same zero check.
+
+Unreadable sectors do not end a verification: the failing block is
+bisected down to the sector (see badranges.py), the rest of it is checked
+as usual, and the sectors that stay unreadable are reported as ranges.
+They still fail the verification: nothing shows they no longer hold data.
+
+Sampled verification is sized statistically: for a target confidence C that
+no more than a fraction p of the device still holds data, it needs
+n = ln(1 - C) / ln(1 - p) clean samples. Samples are stratified across the
+LBA range, neighbours are coalesced into larger reads, and the reads are
+issued concurrently.
+"""
+import math
+import os
+import queue
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import badranges
+from overwrite import aligned_buffer
+
+BLOCK_SIZE = 4 * 1024 * 1024
+SAMPLE_SIZE = 4096
+READ_DEPTH = 8
+CHECKERS = 2
+SAMPLE_CONFIDENCE = 0.99
+SAMPLE_RESIDUAL = 0.001
+COALESCE_GAP = 64 * 1024
+MAX_RUN = 1024 * 1024
+
+_ZEROS = bytes(BLOCK_SIZE)
+
+
+def zeros(size):
+    """Shared all-zero buffer of at least `size` bytes."""
+    global _ZEROS
+    if size > len(_ZEROS):
+        _ZEROS = bytes(size)
+    return _ZEROS
+
+
+def is_zero(view):
+    return zeros(len(view)).startswith(view)
+
+
+def first_nonzero(view):
+    """Index of the first non-zero byte in `view`, or -1."""
+    if is_zero(view):
+        return -1
+    data = bytes(view)
+    return len(data) - len(data.lstrip(b"\0"))
+
+
+def sample_count(confidence=SAMPLE_CONFIDENCE, residual=SAMPLE_RESIDUAL):
+    """Clean samples needed to claim `confidence` that at most `residual` of sectors hold data."""
+    return max(1, math.ceil(math.log(1 - confidence) / math.log(1 - residual)))
+
+
+def achieved_confidence(samples, residual=SAMPLE_RESIDUAL):
+    return 1 - (1 - residual) ** samples
+
+
+def plan_samples(size, samples, sample_size=SAMPLE_SIZE, rng=random):
+    """
+    One sample per equal stratum of the device (plus the first and last
+    sector), merged into sequential (offset, length) runs wherever the gap
+    between neighbours is small. Returns (sample offsets, runs).
+    """
+    slots = max(1, size // sample_size)
+    samples = min(samples, slots)
+    picks = {0, slots - 1}
+    for i in range(samples):
+        lo = i * slots // samples
+        hi = max(lo + 1, (i + 1) * slots // samples)
+        picks.add(rng.randrange(lo, hi))
+
+    runs = []
+    for slot in sorted(picks):
+        off = slot * sample_size
+        length = min(sample_size, size - off)
+        if runs:
+            start, run_len = runs[-1]
+            end = start + run_len
+            if off - end <= COALESCE_GAP and off + length - start <= MAX_RUN:
+                runs[-1] = (start, off + length - start)
+                continue
+        runs.append((off, length))
+    return [slot * sample_size for slot in sorted(picks)], runs
+
+
+def verify_sampled(device, logf, samples=None, expected=None, confidence=SAMPLE_CONFIDENCE,
+                   residual=SAMPLE_RESIDUAL, depth=READ_DEPTH, report=None):
+    """
+    Statistically sized sampled verification. `samples` overrides the count
+    derived from `confidence`/`residual`. If `report` is a dict it receives
+    the sample count, bytes read and the confidence actually achieved.
+
+    Only samples that were read and compared count towards the confidence.
+    A sample that cannot be read fails the verification: the sector it
+    stands for may still hold data.
+    """
+    try:
+        fd = os.open(device, os.O_RDONLY)
+    except OSError as e:
+        logf.write(f"Sampled verify exception: {e}\n")
+        return False
+    check = make_check(expected, MAX_RUN)
+    unreadable = badranges.BadRangeMap()
+    try:
+        size_bytes = os.lseek(fd, 0, os.SEEK_END)
+        wanted = samples or sample_count(confidence, residual)
+        picks, runs = plan_samples(size_bytes, wanted)
+        logf.write(f"[{datetime.now().isoformat()}] Sampled verification: {len(picks)} samples in "
+                   f"{len(runs)} reads{' against keystream' if expected is not None else ''}\n")
+        local = threading.local()
+
+        def read_check(run):
+            off, length = run
+            buf = getattr(local, "buf", None)
+            if buf is None:
+                buf = local.buf = aligned_buffer(MAX_RUN)
+            with memoryview(buf) as view:
+                segments = badranges.read_segments(lambda o, n: fd, view, off, length, unreadable)
+                bad = badranges.check_segments(check, view, off, segments)
+            return off + bad if bad >= 0 else None
+
+        with ThreadPoolExecutor(max_workers=depth) as pool:
+            hits = [h for h in pool.map(read_check, runs) if h is not None]
+        if unreadable:
+            logf.write(f"Unreadable sectors: {unreadable.describe()}\n")
+            if report is not None:
+                report["unreadable"] = unreadable.as_list()
+        if hits:
+            logf.write(f"Unexpected data at {min(hits)}\n")
+            return False
+
+        compared = sum(1 for off in picks
+                       if not unreadable.within(off, min(off + SAMPLE_SIZE, size_bytes)))
+        achieved = achieved_confidence(compared, residual)
+        if report is not None:
+            report.update({
+                "samples": compared,
+                "bytes_read": sum(length for _, length in runs) - unreadable.total,
+                "residual_fraction": residual,
+                "confidence": achieved,
+            })
+        if compared < len(picks):
+            logf.write(f"{len(picks) - compared} of {len(picks)} samples could not be read; "
+                       f"sampled verification failed\n")
+            return False
+        logf.write(f"Sampled verification clean: {achieved:.2%} confidence that less than "
+                   f"{residual:.3%} of the device retains data\n")
+        return True
+    except Exception as e:
+        logf.write(f"Sampled verify exception: {e}\n")
+        return False
+    finally:
+        os.close(fd)
+
+
+def check_zero(view, offset):
+    return first_nonzero(view)
+
+
+def keystream_check(stream, block_size=BLOCK_SIZE):
+    """check(view, offset) for data written from `stream` (a patterns.Keystream)."""
+    local = threading.local()
+
+    def check(view, offset):
+        out = getattr(local, "out", None)
+        if out is None:
+            # update_into() may want a cipher block of slack
+            out = local.out = memoryview(bytearray(block_size + 16))
+        stream.xor_into(view, out, offset)
+        return first_nonzero(out[:len(view)])
+
+    return check
+
+
+def make_check(expected=None, block_size=BLOCK_SIZE):
+    return check_zero if expected is None else keystream_check(expected, block_size)
+
+
+class VerifyResult:
+    def __init__(self):
+        self.ok = False
+        self.bytes_checked = 0
+        self.first_mismatch = None
+        self.error = None
+        self.elapsed = 0.0
+        self.unreadable = badranges.BadRangeMap()
+
+    @property
+    def rate(self):
+        return self.bytes_checked / self.elapsed if self.elapsed else 0.0
+
+    def as_dict(self):
+        return {
+            "ok": self.ok,
+            "bytes_checked": self.bytes_checked,
+            "first_mismatch": self.first_mismatch,
+            "error": str(self.error) if self.error else None,
+            "unreadable": self.unreadable.as_list(),
+            "elapsed": round(self.elapsed, 3),
+            "mb_per_s": round(self.rate / (1024**2), 1),
+        }
+
+
+def _fadvise(fd, offset, length, advice):
+    if hasattr(os, "posix_fadvise"):
+        try:
+            os.posix_fadvise(fd, offset, length, advice)
+        except OSError:
+            pass
+
+
+def verify_pipelined(device, check=check_zero, block_size=BLOCK_SIZE, depth=READ_DEPTH,
+                     checkers=CHECKERS, cancel=None, start=0, end=None):
+    """
+    Read `device` from `start` to `end` (default: end to end) with `depth`
+    reads in flight and `checkers` threads running `check(view, offset)`,
+    which returns the index of the first bad byte in the block or -1. The
+    result carries the exact offset of the first mismatch, even though
+    blocks complete out of order. Unreadable sectors are skipped and
+    collected in result.unreadable; result.ok is False if there are any.
+    """
+    result = VerifyResult()
+    fd = os.open(device, os.O_RDONLY)
+    started = time.monotonic()
+    try:
+        size = os.lseek(fd, 0, os.SEEK_END) if end is None else end
+        _fadvise(fd, start, size - start, getattr(os, "POSIX_FADV_SEQUENTIAL", 2))
+        ring = [aligned_buffer(block_size) for _ in range(depth + checkers)]
+        free = queue.Queue()
+        for m in ring:
+            free.put(m)
+        filled = queue.Queue()
+        lock = threading.Lock()
+        state = {"next": start, "limit": size}
+
+        def next_offset():
+            with lock:
+                off = state["next"]
+                if off >= state["limit"] or result.error or (cancel and cancel.is_set()):
+                    return None
+                state["next"] = off + block_size
+                return off
+
+        def reader():
+            while True:
+                off = next_offset()
+                if off is None:
+                    return
+                m = free.get()
+                n = min(block_size, size - off)
+                try:
+                    with memoryview(m) as view:
+                        segments = badranges.read_segments(lambda o, k: fd, view, off, n, result.unreadable)
+                except Exception as e:
+                    with lock:
+                        result.error = result.error or e.with_traceback(None)
+                    free.put(m)
+                    return
+                filled.put((off, m, n, segments))
+
+        def checker():
+            while True:
+                item = filled.get()
+                if item is None:
+                    return
+                off, m, n, segments = item
+                try:
+                    if result.error is not None:
+                        # keep draining so no reader waits on a buffer forever
+                        continue
+                    with memoryview(m) as view:
+                        bad = badranges.check_segments(check, view, off, segments)
+                except Exception as e:
+                    with lock:
+                        # the traceback's frames still hold views of the ring buffer
+                        result.error = result.error or e.with_traceback(None)
+                    continue
+                finally:
+                    free.put(m)
+                _fadvise(fd, off, n, getattr(os, "POSIX_FADV_DONTNEED", 4))
+                with lock:
+                    if bad >= 0:
+                        hit = off + bad
+                        if result.first_mismatch is None or hit < result.first_mismatch:
+                            result.first_mismatch = hit
+                        # only blocks before the mismatch still matter
+                        state["limit"] = min(state["limit"], off)
+                    else:
+                        result.bytes_checked += sum(b - a for a, b in segments)
+
+        readers = [threading.Thread(target=reader, daemon=True) for _ in range(depth)]
+        workers = [threading.Thread(target=checker, daemon=True) for _ in range(checkers)]
+        for t in readers + workers:
+            t.start()
+        for t in readers:
+            t.join()
+        for _ in workers:
+            filled.put(None)
+        for t in workers:
+            t.join()
+        for m in ring:
+            m.close()
+
+        cancelled = cancel is not None and cancel.is_set()
+        result.ok = (result.first_mismatch is None and result.error is None and not cancelled
+                     and not result.unreadable)
+    finally:
+        os.close(fd)
+        result.elapsed = time.monotonic() - started
+    return result
+
+
+def verify_full(device, logf, block_size=BLOCK_SIZE, cancel=None, expected=None, report=None,
+                depth=READ_DEPTH):
+    logf.write(f"[{datetime.now().isoformat()}] Full verification started"
+               f"{' against keystream' if expected is not None else ''}.\n")
+    try:
+        res = verify_pipelined(device, make_check(expected, block_size),
+                               block_size=block_size, depth=depth, cancel=cancel)
+    except Exception as e:
+        logf.write(f"Full verify failed: {e}\n")
+        return False
+    if res.error:
+        logf.write(f"Full verify failed: {res.error}\n")
+    elif res.first_mismatch is not None:
+        logf.write(f"Unexpected data found during full verification at offset {res.first_mismatch}\n")
+    if res.unreadable:
+        logf.write(f"Unreadable sectors: {res.unreadable.describe()}\n")
+        if report is not None:
+            report["unreadable"] = res.unreadable.as_list()
+    logf.write(f"Full verification: {res.bytes_checked} bytes checked, "
+               f"{res.rate / (1024**2):.1f} MB/s\n")
+    return res.ok
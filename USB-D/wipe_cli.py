@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Headless entry point for the wipe pipeline.
+
+Runs driver.run_wipe_job for one or more block devices through the batch
+scheduler without loading tkinter, and prints one JSON object per line on
+stdout (job state changes, progress, log lines, and a final summary).
+
+    sudo python3 wipe_cli.py /dev/sdb /dev/sdc --method zero --verify sampled
+    sudo python3 wipe_cli.py --jobs jobs.json
+    sudo python3 wipe_cli.py --watch --method zero --yes   # wipe drives as they are inserted
+    sudo python3 wipe_cli.py --android --yes                # every connected phone
+
+A job file is a JSON list (or JSON lines) of {"device", "method", "verify"},
+with an optional "profile": true to run that job under cProfile.
+"""
+import argparse
+import functools
+import json
+import os
+import sys
+import threading
+import time
+
+import ata
+import discovery
+import driver
+import hotplug
+import mounts
+import scheduler
+import timing
+import tune
+from telemetry import Coalescer
+
+PROGRESS_INTERVAL = 1.0
+
+METHODS = ('auto', 'zero', 'random', 'shred', 'quick')
+VERIFY_MODES = ('none', 'sampled', 'full', 'inline')
+
+_out_lock = threading.Lock()
+
+
+def emit(event, **fields):
+    fields = {"ts": round(time.time(), 3), "event": event, **fields}
+    line = json.dumps(fields, default=str)
+    with _out_lock:
+        sys.stdout.write(line + "\n")
+        sys.stdout.flush()
+
+
+def load_jobs(path):
+    with open(path) as f:
+        text = f.read().strip()
+    if text.startswith("["):
+        jobs = json.loads(text)
+    else:
+        jobs = [json.loads(line) for line in text.splitlines() if line.strip()]
+    for job in jobs:
+        if "device" not in job:
+            raise ValueError(f"job without device: {job}")
+    return jobs
+
+
+def emit_progress(ev):
+    emit("progress", **ev.as_dict())
+
+
+def run_job(job, progress=emit_progress):
+    def log(text):
+        emit("log", device=job.device, message=text)
+
+    driver.run_wipe_job(job, log=log, progress=progress)
+
+
+def job_summary(job):
+    return {
+        "device": job.device,
+        "state": job.state,
+        "status": job.status,
+        "verified_clean": job.verified_clean,
+        "certificate": job.cert_path,
+        "error": str(job.error) if job.error else None,
+        "timings": job.timings,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless NIST-aware wipe runner (JSON-lines output)")
+    parser.add_argument("devices", nargs="*", help="Block devices to wipe, e.g. /dev/sdb")
+    parser.add_argument("--jobs", help="JSON / JSON-lines job file")
+    parser.add_argument("--method", choices=METHODS, default="auto")
+    parser.add_argument("--verify", choices=VERIFY_MODES, default="none")
+    parser.add_argument("--per-bus", type=int, default=scheduler.DEFAULT_PER_BUS,
+                        help="Concurrent jobs per controller")
+    parser.add_argument("--progress-interval", type=float, default=PROGRESS_INTERVAL,
+                        help="Seconds between progress events per device")
+    parser.add_argument("--watch", action="store_true",
+                        help="Keep running and enqueue every disk inserted from now on")
+    parser.add_argument("--suspend-frozen", action="store_true",
+                        help="Suspend/resume the host once (rtcwake) to unfreeze ATA drives")
+    parser.add_argument("--no-autotune", action="store_true",
+                        help="Skip block size / queue depth calibration and use the defaults")
+    parser.add_argument("--profile", action="append", default=[], metavar="DEVICE",
+                        help="Run this device's job under cProfile (stats saved next to its wipe log)")
+    parser.add_argument("--android", action="store_true",
+                        help="Wipe every connected Android phone (adb/fastboot) instead of block devices")
+    parser.add_argument("--allow-recovery", action="store_true",
+                        help="Android: factory reset phones with a locked bootloader through recovery")
+    parser.add_argument("--no-reboot", action="store_true",
+                        help="Android: leave erased phones in fastboot")
+    parser.add_argument("--yes", action="store_true", help="Required: confirm data destruction")
+    args = parser.parse_args(argv)
+
+    specs = [{"device": d, "method": args.method, "verify": args.verify} for d in args.devices]
+    if args.jobs:
+        specs += [{"method": args.method, "verify": args.verify, **j} for j in load_jobs(args.jobs)]
+    if not specs and not args.watch and not args.android:
+        parser.error("no devices or job file given")
+    for spec in specs:
+        if spec["method"] not in METHODS or spec["verify"] not in VERIFY_MODES:
+            parser.error(f"bad method/verify in job: {spec}")
+    if not args.yes:
+        parser.error("refusing to wipe without --yes")
+    if not driver.is_root():
+        emit("error", message="must be run as root")
+        return 1
+
+    if args.android:
+        results = driver.wipe_android(allow_recovery=args.allow_recovery, reboot=not args.no_reboot,
+                                      log=lambda text: emit("log", device="android", message=text))
+        emit("summary", phones=results)
+        return 0 if results and all(r["verified_clean"] for r in results) else 2
+
+    ata.AUTO_SUSPEND = args.suspend_frozen
+    tune.ENABLED = not args.no_autotune
+    timing.PROFILE_DEVICES.update(args.profile)
+    timing.PROFILE_DEVICES.update(spec["device"] for spec in specs if spec.get("profile"))
+    progress = Coalescer(emit_progress, interval=args.progress_interval)
+    sched = scheduler.WipeScheduler(functools.partial(run_job, progress=progress.push),
+                                    per_bus=args.per_bus)
+    sched.on_change(lambda job: emit("state", device=job.device, state=job.state))
+    for spec in specs:
+        if not os.path.exists(spec["device"]):
+            emit("error", device=spec["device"], message="device not found")
+            continue
+        sched.submit(spec["device"], spec["method"], spec["verify"])
+
+    if args.watch:
+        def on_event(event):
+            if event.action != "add" or event.devtype != "disk":
+                return
+            device = f"/dev/{event.name}"
+            # only real drives that nothing is using: never a freshly opened
+            # dm-crypt mapping, loop device or md array
+            rec = discovery.get(device)
+            if rec is None or not discovery.is_physical(rec):
+                emit("hotplug", device=device, action=event.action, skipped="not a physical drive")
+                return
+            busy = mounts.in_use(device)
+            if busy:
+                emit("hotplug", device=device, action=event.action, skipped="in use: " + "; ".join(busy))
+                return
+            emit("hotplug", device=device, action=event.action)
+            try:
+                sched.submit(device, args.method, args.verify)
+            except ValueError as e:
+                emit("error", device=device, message=str(e))
+        w = hotplug.watcher()
+        w.subscribe(on_event)
+        emit("watching", mode=w.mode)
+
+    try:
+        if args.watch:
+            while True:
+                time.sleep(1)
+        sched.wait()
+    except KeyboardInterrupt:
+        emit("cancel", message="interrupted, cancelling all jobs")
+        sched.cancel_all()
+        sched.wait()
+
+    progress.close()
+    results = [job_summary(j) for j in sched.jobs]
+    emit("summary", jobs=results, timings=timing.histograms())
+    return 0 if results and all(j.state == scheduler.DONE for j in sched.jobs) else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
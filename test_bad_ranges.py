@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Bad-range handling tests
+Range merging, bisection around failing sectors, and verification of a temp file with unreadable sectors
+"""
+
+import errno
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "USB-D"))
+
+import badranges
+import verify
+from badranges import BadRangeMap, SECTOR, salvage
+
+
+def test_merging():
+    """Touching and overlapping ranges merge; disjoint ones stay apart"""
+    print("🧪 Testing range merging")
+    bad = BadRangeMap()
+    bad.add(100, 200)
+    bad.add(300, 400)
+    assert bad.as_list() == [[100, 200], [300, 400]]
+    bad.add(200, 250)  # touches the first
+    assert bad.as_list() == [[100, 250], [300, 400]]
+    bad.add(240, 310)  # bridges both
+    assert bad.as_list() == [[100, 400]]
+    bad.add(0, 10)
+    bad.add(500, 600)
+    assert bad.as_list() == [[0, 10], [100, 400], [500, 600]]
+    assert bad.total == 10 + 300 + 100
+    assert bad.within(50, 550) == [(100, 400), (500, 550)]
+    assert bad.describe().startswith("3 range(s), 410 bytes")
+    print("✅ Ranges merged as expected")
+
+
+def failing_op(bad_sectors):
+    """op(offset, length) that raises EIO whenever the range covers a bad sector"""
+    calls = []
+
+    def op(offset, length):
+        calls.append((offset, length))
+        for s in bad_sectors:
+            if offset < s + SECTOR and s < offset + length:
+                raise OSError(errno.EIO, "injected media error")
+
+    return op, calls
+
+
+def test_salvage_bisects_to_sectors():
+    """Only the failing sectors end up in the map, merged where they are adjacent"""
+    print("🧪 Testing bisection around bad sectors")
+    bad_sectors = [5 * SECTOR, 6 * SECTOR, 40 * SECTOR]
+    op, calls = failing_op(bad_sectors)
+    bad = BadRangeMap()
+    salvage(op, 0, 64 * SECTOR, bad, retries=1, backoff=0)
+    assert bad.as_list() == [[5 * SECTOR, 7 * SECTOR], [40 * SECTOR, 41 * SECTOR]]
+    # bisection, not a sector-by-sector rescan of the range
+    assert len(calls) < 64, len(calls)
+    print(f"✅ Bad sectors isolated in {len(calls)} attempts")
+
+
+def test_salvage_propagates_other_errors():
+    """Errors that are not media errors are not swallowed"""
+    def op(offset, length):
+        raise OSError(errno.EACCES, "denied")
+
+    try:
+        salvage(op, 0, 8 * SECTOR, BadRangeMap(), retries=0, backoff=0)
+    except OSError as e:
+        assert e.errno == errno.EACCES
+    else:
+        raise AssertionError("EACCES was swallowed")
+
+
+def test_unreadable_sectors_fail_verification():
+    """A zeroed file with unreadable sectors is not verified clean"""
+    print("🧪 Testing verification over unreadable sectors")
+    with tempfile.TemporaryDirectory() as tmp:
+        target = os.path.join(tmp, "target.img")
+        with open(target, "wb") as f:
+            f.truncate(4 * 1024 * 1024)
+        unreadable = 1024 * 1024 + 3 * SECTOR
+        real = badranges.read_segments
+
+        def read_segments(fd_for, view, offset, length, bad, unit=SECTOR):
+            def fd_for_faulty(off, n):
+                if off <= unreadable < off + n:
+                    raise OSError(errno.EIO, "injected media error")
+                return fd_for(off, n)
+            return real(fd_for_faulty, view, offset, length, bad, unit)
+
+        badranges.read_segments = read_segments
+        try:
+            res = verify.verify_pipelined(target, verify.check_zero, block_size=1024 * 1024)
+        finally:
+            badranges.read_segments = real
+        assert res.error is None and res.first_mismatch is None
+        assert res.unreadable.as_list() == [[unreadable, unreadable + SECTOR]]
+        assert res.bytes_checked == 4 * 1024 * 1024 - SECTOR
+        assert not res.ok, "unreadable sectors must fail the verification"
+    print("✅ Unreadable sectors reported and verification failed")
+
+
+if __name__ == "__main__":
+    test_merging()
+    test_salvage_bisects_to_sectors()
+    test_salvage_propagates_other_errors()
+    test_unreadable_sectors_fail_verification()
+    print("🎉 All bad-range tests passed")
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Checkpoint journal tests
+Cancels an overwrite half way through a temp file, then resumes it from the journal
+"""
+
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "USB-D"))
+
+import checkpoint
+import discovery
+import driver
+import tune
+from patterns import Keystream
+from verify import verify_pipelined, keystream_check
+
+SIZE = 64 * 1024 * 1024
+CANCEL_AT = 32 * 1024 * 1024
+
+
+class CancellingPattern:
+    """Hands out blocks of `pattern` and sets `cancel` once it reaches `at`"""
+
+    def __init__(self, pattern, cancel, at):
+        self._pattern = pattern
+        self._cancel = cancel
+        self._at = at
+
+    def get(self, offset, length):
+        if offset >= self._at:
+            self._cancel.set()
+        return self._pattern.get(offset, length)
+
+    def __getattr__(self, name):
+        return getattr(self._pattern, name)
+
+
+def run(target, state, cancel, record, make_pattern=None, ident="TEST-WWN_TEST-SERIAL"):
+    """overwrite_device with its journal and tuning cache under `state`"""
+    saved = (checkpoint.STATE_DIRS, tune.CACHE_FILES, tune.ENABLED, discovery.stable_id, driver.make_pattern)
+    checkpoint.STATE_DIRS = (os.path.join(state, "checkpoints"),)
+    tune.CACHE_FILES = (os.path.join(state, "tuning.json"),)
+    tune.ENABLED = False
+    discovery.stable_id = lambda rec: ident
+    if make_pattern is not None:
+        driver.make_pattern = make_pattern
+    logf = io.StringIO()
+    try:
+        ok, status = driver.overwrite_device(target, "random", logf, cancel=cancel, record=record)
+    finally:
+        (checkpoint.STATE_DIRS, tune.CACHE_FILES, tune.ENABLED, discovery.stable_id,
+         driver.make_pattern) = saved
+    return ok, status, logf.getvalue()
+
+
+def journals(state):
+    directory = os.path.join(state, "checkpoints")
+    if not os.path.isdir(directory):
+        return []
+    return [os.path.join(directory, n) for n in os.listdir(directory) if n.endswith(".json")]
+
+
+def test_resume_after_cancel():
+    """A cancelled pass resumes from its checkpoint with the same seed and verifies clean"""
+    print("🧪 Testing journal resume after cancel")
+    with tempfile.TemporaryDirectory() as tmp:
+        target = os.path.join(tmp, "target.img")
+        with open(target, "wb") as f:
+            f.truncate(SIZE)
+        state = os.path.join(tmp, "state")
+        original = driver.make_pattern
+        cancel = threading.Event()
+
+        def cancelling(kind, engine, seed=None, pool=None):
+            return CancellingPattern(original(kind, engine, seed=seed, pool=pool), cancel, CANCEL_AT)
+
+        ok, status, log = run(target, state, cancel, {}, make_pattern=cancelling)
+        assert not ok and status == "random_cancelled", log
+        [path] = journals(state)
+        with open(path) as f:
+            journal = checkpoint.Journal(path, json.load(f), resumed=True)
+        pass_no, offset = journal.resume_point()
+        assert pass_no == 1 and 0 < offset < SIZE, (pass_no, offset)
+        seed = journal.seed(1)
+        print(f"✅ Cancelled with a checkpoint at {offset} bytes")
+
+        record = {}
+        ok, status, log = run(target, state, threading.Event(), record)
+        assert ok and status == "random_ok", log
+        assert f"Resuming from checkpoint: pass 1/1 at offset {offset}" in log, log
+        assert record["seed"] == seed, "resumed pass must reuse the journalled seed"
+        assert not os.path.exists(path), "finished wipe must remove its journal"
+
+        res = verify_pipelined(target, keystream_check(Keystream(seed)))
+        assert res.ok, res.as_dict()
+    print("✅ Resumed wipe verified against the original keystream")
+
+
+def test_no_identity_no_journal():
+    """A drive without WWN or serial is never journalled, so nothing can be resumed onto another drive"""
+    print("🧪 Testing drives without a stable identity")
+    with tempfile.TemporaryDirectory() as tmp:
+        target = os.path.join(tmp, "target.img")
+        with open(target, "wb") as f:
+            f.truncate(8 * 1024 * 1024)
+        state = os.path.join(tmp, "state")
+        ok, status, log = run(target, state, threading.Event(), {}, ident="")
+        assert ok, log
+        assert "not journalled" in log
+        assert journals(state) == []
+        assert checkpoint.journal_path("", 8 * 1024 * 1024) is None
+    print("✅ No journal written without a WWN/serial")
+
+
+if __name__ == "__main__":
+    test_resume_after_cancel()
+    test_no_identity_no_journal()
+    print("🎉 All checkpoint tests passed")
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Round-trip tests for the overwrite engine
+Writes overlapped multi-pass plans to a temp file and verifies the result
+"""
+
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "USB-D"))
+
+from overwrite import OverwriteEngine, ZeroPattern
+from patterns import Keystream, random_pattern
+from verify import verify_pipelined, keystream_check, check_zero
+
+SIZE = 24 * 1024 * 1024 + 8192  # not a multiple of the block size: exercises the tail
+BLOCK = 1024 * 1024
+
+
+def make_target(directory, size=SIZE):
+    path = os.path.join(directory, "target.img")
+    with open(path, "wb") as f:
+        f.write(os.urandom(4096) * (size // 4096))
+    return path
+
+
+def test_overlapped_plan_round_trip():
+    """Random passes then zeros, overlapped; the device must read back all zero"""
+    print("🧪 Testing overlapped plan (random, random, zero)")
+    with tempfile.TemporaryDirectory() as tmp:
+        target = make_target(tmp)
+        committed = []
+        with OverwriteEngine(target, block_size=BLOCK, queue_depth=4) as engine:
+            pool = engine.buffer_pool(3)
+            patterns = [random_pattern(BLOCK, 4, pool=pool), random_pattern(BLOCK, 4, pool=pool),
+                        ZeroPattern(BLOCK)]
+            try:
+                ok = engine.run_plan(patterns, overlap=True, stagger=4 * BLOCK,
+                                     checkpoint=lambda pass_no, offset: committed.append((pass_no, offset)))
+            finally:
+                for p in patterns:
+                    p.close()
+        assert ok, "plan did not complete"
+        assert not engine.bad, engine.bad.describe()
+        # every pass reports its end as its last checkpoint
+        for pass_no in (1, 2, 3):
+            assert max(off for n, off in committed if n == pass_no) == SIZE
+
+        res = verify_pipelined(target, check_zero, block_size=BLOCK)
+        assert res.ok, res.as_dict()
+        assert res.bytes_checked == SIZE
+    print("✅ Overlapped plan verified clean")
+
+
+class Recording:
+    """ZeroPattern that records the offsets handed out, in order, into a shared list"""
+    name = "zero"
+
+    def __init__(self, pass_no, seen):
+        self._pattern = ZeroPattern(BLOCK)
+        self._pass_no = pass_no
+        self._seen = seen
+
+    def get(self, offset, length):
+        self._seen.append((self._pass_no, offset, length))
+        return self._pattern.get(offset, length)
+
+    def put(self, view):
+        self._pattern.put(view)
+
+    def close(self):
+        self._pattern.close()
+
+
+def test_overlapped_passes_keep_their_distance():
+    """A pass only writes blocks at least `stagger` bytes behind what the pass before it has flushed"""
+    print("🧪 Testing the stagger between overlapped passes")
+    stagger = 8 * BLOCK
+    with tempfile.TemporaryDirectory() as tmp:
+        target = make_target(tmp)
+        seen = []
+        with OverwriteEngine(target, block_size=BLOCK, queue_depth=2) as engine:
+            sync = engine.sync
+
+            def recording_sync():
+                # nothing of pass 1 beyond what it had been handed can be durable after this flush
+                seen.append(("sync", None, None))
+                sync()
+
+            engine.sync = recording_sync
+            assert engine.run_plan([Recording(1, seen), Recording(2, seen)], overlap=True, stagger=stagger)
+        handed = flushed = 0
+        overlapped = False
+        for pass_no, offset, length in seen:
+            if pass_no == "sync":
+                flushed = handed
+            elif pass_no == 1:
+                handed = offset + length
+            elif flushed < SIZE:
+                overlapped = True
+                assert offset + length + stagger <= flushed, (offset, flushed)
+        assert overlapped, "second pass never ran alongside the first"
+    print("✅ Stagger kept")
+
+
+def test_random_pass_verifies_against_keystream():
+    """A seeded random pass verifies against its keystream, and a wrong seed does not"""
+    print("🧪 Testing keystream round trip")
+    with tempfile.TemporaryDirectory() as tmp:
+        target = make_target(tmp)
+        seed = os.urandom(48)
+        with OverwriteEngine(target, block_size=BLOCK, queue_depth=4) as engine:
+            pattern = random_pattern(BLOCK, 4, seed=seed)
+            try:
+                assert engine.run_pass(pattern)
+            finally:
+                pattern.close()
+
+        res = verify_pipelined(target, keystream_check(Keystream(seed), BLOCK), block_size=BLOCK)
+        assert res.ok, res.as_dict()
+        assert res.bytes_checked == SIZE
+
+        wrong = verify_pipelined(target, keystream_check(Keystream(), BLOCK), block_size=BLOCK)
+        assert not wrong.ok
+        assert wrong.first_mismatch == 0
+    print("✅ Keystream pass verified; wrong seed rejected")
+
+
+def test_readback_pass():
+    """Write-and-verify reports every byte checked while writing"""
+    print("🧪 Testing write-and-verify")
+    with tempfile.TemporaryDirectory() as tmp:
+        target = make_target(tmp)
+        with OverwriteEngine(target, block_size=BLOCK, queue_depth=4) as engine:
+            ok = engine.run_pass(ZeroPattern(BLOCK), readback=check_zero, window=4 * BLOCK)
+        assert ok
+        rb = engine.readback
+        assert rb["error"] is None and rb["first_mismatch"] is None
+        assert rb["bytes_checked"] == SIZE and not rb["unreadable"]
+    print("✅ Read-back covered the whole pass")
+
+
+if __name__ == "__main__":
+    test_overlapped_plan_round_trip()
+    test_overlapped_passes_keep_their_distance()
+    test_random_pass_verifies_against_keystream()
+    test_readback_pass()
+    print("🎉 All engine tests passed")